@@ -4,24 +4,40 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import bisect
 import csv
+import difflib
+import email.utils
+import functools
+import hashlib
+import inspect
 import io
 import logging
 import logging.handlers
 import json
+import mmap
 import os
+import random
 import re
+import tempfile
+import threading
 import time
 import urllib.request
-from contextlib import asynccontextmanager
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
 from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
 from typing import Any, cast
 
 logger = logging.getLogger(__name__)
 
+# Model metadata comes from litellm's bundled cost map; without this the
+# first import of litellm fetches it over the network, stalling air-gapped
+# hosts until the request times out.
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
 import anyio
 import anyio.abc
 import anyio.to_thread
@@ -31,6 +47,17 @@ from mcp.types import ToolAnnotations
 # In-memory annotations: {model_id: {metadata: {...}, usage: {...}, annotations: {...}}}
 _annotations: dict[str, dict] = {}
 
+# True when in-memory annotations hold metadata changes not yet written to disk
+_annotations_dirty: bool = False
+
+# Held while annotations are mutated or serialised. Worker threads (refresh,
+# research, notes) and the event loop all touch them, and saves from
+# different threads must not interleave.
+_annotations_lock = threading.RLock()
+
+# When enrichment last completed successfully (None = never recorded)
+_last_refreshed: datetime | None = None
+
 
 def _get_annotations_path() -> Path:
     """Return the annotations file path from env or default."""
@@ -55,21 +82,179 @@ def _load_annotations() -> dict[str, dict]:
 
 
 def _save_annotations(data: dict[str, dict]) -> None:
-    """Save annotations to the JSON file (atomic write via temp + rename)."""
+    """Save annotations to the JSON file (atomic write via temp + rename).
+
+    The snapshot is serialised under _annotations_lock, so concurrent
+    mutations can't corrupt it, and each save writes its own temp file.
+    Blocking — call from a worker thread, or via _persist_annotations.
+    """
+    global _annotations_dirty
+    path = _get_annotations_path()
+    with _annotations_lock:
+        payload = json.dumps(data, indent=2) + "\n"
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False,
+        ) as tmp:
+            tmp.write(payload)
+        try:
+            os.replace(tmp.name, path)
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+        _annotations_dirty = False
+    logger.debug("Saved %d annotations to %s", len(data), path)
+
+
+async def _persist_annotations() -> None:
+    """Save the in-memory annotations without blocking the event loop."""
+    await _run_blocking("interactive", _save_annotations, _annotations)
+
+
+def _get_refresh_stamp_path() -> Path:
+    """Return the file recording when enrichment last refreshed successfully."""
     path = _get_annotations_path()
+    return path.with_name(path.name + ".refreshed")
+
+
+def _load_last_refreshed() -> datetime | None:
+    """Load the last successful enrichment time, or None if never recorded."""
+    path = _get_refresh_stamp_path()
+    try:
+        return datetime.fromisoformat(json.loads(path.read_text())["last_refreshed"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_last_refreshed(when: datetime) -> None:
+    """Record a successful enrichment refresh.
+
+    Kept beside the annotations file rather than in it, so a refresh that
+    changes no model doesn't rewrite the whole annotations file.
+    """
+    global _last_refreshed
+    path = _get_refresh_stamp_path()
     tmp = path.with_suffix(".tmp")
-    tmp.write_text(json.dumps(data, indent=2) + "\n")
+    tmp.write_text(json.dumps({"last_refreshed": when.isoformat()}) + "\n")
     tmp.replace(path)
-    logger.debug("Saved %d annotations to %s", len(data), path)
+    _last_refreshed = when
 
 
-def _track_usage(model_id: str) -> None:
-    """Increment call_count and update last_used for a model."""
-    entry = _annotations.setdefault(model_id, {})
-    usage = entry.setdefault("usage", {"call_count": 0, "last_used": ""})
-    usage["call_count"] = usage.get("call_count", 0) + 1
-    usage["last_used"] = datetime.now(timezone.utc).isoformat()
-    _save_annotations(_annotations)
+def _merge_metadata(model_id: str, fields: dict[str, Any]) -> bool:
+    """Merge fields into a model's metadata in place.
+
+    Only keys whose value actually differs are written. Returns True if the
+    entry changed, and marks the in-memory annotations as needing a save.
+    """
+    global _annotations_dirty
+    with _annotations_lock:
+        current = _annotations.get(model_id, {}).get("metadata")
+        changed = {
+            k: v for k, v in fields.items()
+            if current is None or current.get(k) != v
+        }
+        if current is not None and not changed:
+            return False
+        metadata = _annotations.setdefault(model_id, {}).setdefault("metadata", {})
+        metadata.update(changed)
+        _annotations_dirty = True
+    return True
+
+
+# Completion latencies kept per model (seconds, newest last) for percentiles
+_LATENCY_WINDOW = 20
+
+
+def _running_mean(usage: dict[str, Any], key: str, count_key: str, sample: float) -> None:
+    """Fold a millisecond sample into usage[key], a mean over usage[count_key]."""
+    count = usage.get(count_key, 0) + 1
+    previous = usage.get(key)
+    mean = sample if previous is None else previous + (sample - previous) / count
+    usage[count_key] = count
+    usage[key] = round(mean)
+
+
+def _append_latency(usage: dict[str, Any], latency: float) -> None:
+    """Add a latency sample (seconds) to usage, keeping the newest window."""
+    samples = usage.get("latencies", []) + [round(latency, 2)]
+    usage["latencies"] = samples[-_LATENCY_WINDOW:]
+
+
+def _record_latency(model_id: str, latency: float) -> None:
+    """Record a latency sample for calls that don't count as usage (images, research).
+
+    Updates memory only; the caller persists the annotations.
+    """
+    with _annotations_lock:
+        _append_latency(_annotations.setdefault(model_id, {}).setdefault("usage", {}), latency)
+
+
+def _track_usage(
+    model_id: str,
+    *,
+    ttft: float | None = None,
+    latency: float | None = None,
+    queue_wait: float | None = None,
+) -> None:
+    """Increment call_count and update last_used for a model.
+
+    Streamed calls also pass their time-to-first-token (seconds), which is
+    folded into a running mean ``ttft_ms`` over ``stream_count`` calls.
+    Completions pass their total latency, kept as a short sample window
+    for percentile estimates. Calls to rate-limited models pass the time
+    spent queued, averaged as ``queue_wait_ms`` over ``queued_count`` calls.
+    Updates memory only; the caller persists the annotations.
+    """
+    with _annotations_lock:
+        entry = _annotations.setdefault(model_id, {})
+        usage = entry.setdefault("usage", {"call_count": 0, "last_used": ""})
+        usage["call_count"] = usage.get("call_count", 0) + 1
+        usage["last_used"] = datetime.now(timezone.utc).isoformat()
+        if latency is not None:
+            _append_latency(usage, latency)
+        if ttft is not None:
+            _running_mean(usage, "ttft_ms", "stream_count", ttft * 1000)
+        if queue_wait is not None:
+            _running_mean(usage, "queue_wait_ms", "queued_count", queue_wait * 1000)
+        _update_favourites()
+
+
+def _latency_percentile(model_id: str, percentile: float, min_samples: int = 5) -> float | None:
+    """Nearest-rank latency percentile (seconds) from recorded samples.
+
+    Returns None until the model has at least min_samples recorded calls.
+    """
+    samples = sorted(_annotations.get(model_id, {}).get("usage", {}).get("latencies", []))
+    if len(samples) < min_samples:
+        return None
+    rank = max(1, -(-len(samples) * percentile // 100))
+    return samples[int(rank) - 1]
+
+
+# Timeouts per call kind: (default, floor, ceiling) in seconds. Once a model
+# has enough recorded latencies its timeout is p99 × _TIMEOUT_FACTOR, clamped.
+_TIMEOUT_BOUNDS = {
+    "completion": (60.0, 15.0, 600.0),
+    "image": (120.0, 30.0, 600.0),
+    "research": (1800.0, 300.0, 3600.0),
+}
+_TIMEOUT_FACTOR = 2.0
+
+
+def _adaptive_timeout(model_id: str, kind: str, override: float | None = None) -> float:
+    """Timeout for a call: the override if given, else derived from latency.
+
+    Fast models that hang fail in a few multiples of their usual time;
+    slow reasoning models get as long as they normally need.
+    """
+    if override is not None:
+        if override <= 0:
+            raise ValueError("Timeout must be positive")
+        return override
+    default, floor, ceiling = _TIMEOUT_BOUNDS[kind]
+    p99 = _latency_percentile(model_id, 99)
+    if p99 is None:
+        return default
+    return min(ceiling, max(floor, p99 * _TIMEOUT_FACTOR))
 
 
 def _get_favourites(annotations: dict[str, dict]) -> list[str]:
@@ -86,27 +271,29 @@ def _get_favourites(annotations: dict[str, dict]) -> list[str]:
 def _needs_refresh(annotations: dict[str, dict]) -> bool:
     """Check if enriched model metadata is stale or missing.
 
-    Only considers entries that have a 'metadata' sub-object (i.e. have been
-    through enrichment before). Usage-only entries are ignored — they'll get
-    metadata on the next enrichment cycle.
+    Freshness comes from the time of the last successful refresh, which is
+    recorded even when nothing changed. Files written before that stamp
+    existed fall back to the newest per-entry ``last_updated``; usage-only
+    entries are ignored.
     """
     if not annotations:
         return True
-    enriched = [e for e in annotations.values() if "metadata" in e]
-    if not enriched:
+    newest = _last_refreshed
+    if newest is None:
+        for entry in annotations.values():
+            last = entry.get("metadata", {}).get("last_updated")
+            if not last:
+                continue
+            try:
+                updated_at = datetime.fromisoformat(last)
+            except (ValueError, TypeError):
+                continue
+            if newest is None or updated_at > newest:
+                newest = updated_at
+    if newest is None:
         return True
-    now = datetime.now(timezone.utc)
-    for entry in enriched:
-        last = entry["metadata"].get("last_updated")
-        if not last:
-            return True
-        try:
-            updated_at = datetime.fromisoformat(last)
-            if (now - updated_at).total_seconds() > _cache_ttl_minutes * 60:
-                return True
-        except (ValueError, TypeError):
-            return True
-    return False
+    age = (datetime.now(timezone.utc) - newest).total_seconds()
+    return age > _cache_ttl_minutes * 60
 
 
 def _unhealthy_providers() -> set[str]:
@@ -138,12 +325,31 @@ _provider_registry: dict[str, str] = {}
 # Cache: {provider_name: (model_ids, timestamp)}
 _model_cache: dict[str, tuple[list[str], float]] = {}
 
+# Canonical alias index: {normalized_name: {model_id, ...}} across providers
+_canonical_index: dict[str, set[str]] = {}
+
 # Cache TTL in seconds (default 6 hours)
 _cache_ttl_minutes: int = 360
 
+# Background enrichment cadence in minutes (defaults to the cache TTL)
+_enrichment_ttl_minutes: int = 360
+
 # Whether to filter OpenRouter models to ZDR-compatible only (default: on)
 _zero_data_retention: bool = True
 
+# Hedged completions: send to a fallback when the primary is slow or fails
+_hedging_enabled: bool = False
+
+# Configured hedge fallbacks: {full_model: alternate_model}
+_hedge_alternates: dict[str, str] = {}
+
+# Choose among equivalent provider routes per call (PROVIDER_ROUTING)
+_provider_routing: bool = False
+
+# Directories attachments may be read from (ATTACHMENT_ROOTS); empty = the
+# working directory
+_attachment_roots: list[Path] = []
+
 # Provider health: None = healthy, str = error message
 _provider_errors: dict[str, str | None] = {}
 
@@ -174,6 +380,7 @@ class ResearchJob:
     result: str | None = None
     citations: list[str] = field(default_factory=list)
     error: str = ""
+    model_timeout: float | None = None  # None = derive from recorded latency
     _task_scope: anyio.CancelScope | None = field(default=None, repr=False)
 
 
@@ -203,6 +410,521 @@ class JobStore:
         return list(self._jobs.values())
 
 
+# ---------------------------------------------------------------------------
+# Worker thread capacity
+# ---------------------------------------------------------------------------
+
+# Max worker threads per workload class. Each class has its own limiter so a
+# burst of long research jobs or refreshes can't take the threads that
+# interactive tool calls need (anyio's shared default limiter is 40).
+_WORKLOAD_LIMITS = {
+    "interactive": 8,  # search, annotate, image API calls
+    "research": 4,  # deep research jobs (minutes to half an hour each)
+    "refresh": 2,  # provider discovery and enrichment
+    "image": 2,  # image decode/resize/save
+}
+
+_limiters: dict[str, anyio.CapacityLimiter] = {}
+_limiters_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _limiter(workload: str) -> anyio.CapacityLimiter:
+    """Return the capacity limiter for a workload class.
+
+    Limiters are bound to the running event loop, so they are created on
+    first use and recreated if the loop changes (e.g. between test runs).
+    """
+    global _limiters_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _limiters_loop:
+        _limiters.clear()
+        _limiters_loop = loop
+    if workload not in _limiters:
+        _limiters[workload] = anyio.CapacityLimiter(_WORKLOAD_LIMITS[workload])
+    return _limiters[workload]
+
+
+async def _run_blocking(workload: str, fn: Any, *args: Any) -> Any:
+    """Run a blocking callable in a worker thread under a workload's limiter."""
+    return await anyio.to_thread.run_sync(fn, *args, limiter=_limiter(workload))
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class RateLimit:
+    """Client-side limits for a provider or a single model (None = unlimited)."""
+
+    rpm: float | None = None  # requests per minute
+    tpm: float | None = None  # tokens per minute
+    concurrent: int | None = None  # calls in flight at once
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at per_minute / 60 per second.
+
+    Waiters are served strictly in arrival order (anyio locks are FIFO), so
+    a large request can't be starved by a stream of small ones. Balances may
+    go negative when actual usage is charged after the fact; later callers
+    then wait for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = anyio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await anyio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def charge(self, amount: float) -> None:
+        """Deduct tokens without waiting (e.g. output tokens after a call)."""
+        self._refill()
+        self.tokens -= amount
+
+    def wait_estimate(self, amount: float = 1) -> float:
+        """Seconds until amount would be available, ignoring queued waiters."""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+
+class Throttle:
+    """The buckets and concurrency cap enforcing one RateLimit."""
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.requests = TokenBucket(limit.rpm) if limit.rpm else None
+        self.tokens = TokenBucket(limit.tpm) if limit.tpm else None
+        self.slots = anyio.CapacityLimiter(limit.concurrent) if limit.concurrent else None
+
+    def wait_estimate(self, prompt_tokens: Callable[[], int]) -> float:
+        """Seconds a call would queue here now; infinite if no slot is free.
+
+        prompt_tokens is only called when a token bucket needs it.
+        """
+        if self.slots and self.slots.available_tokens < 1:
+            return float("inf")
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_estimate())
+        if self.tokens:
+            waits.append(self.tokens.wait_estimate(prompt_tokens()))
+        return max(waits)
+
+
+# Configured limits, keyed by provider ('openai') or full model ID
+_rate_limits: dict[str, RateLimit] = {}
+
+_throttles: dict[str, Throttle] = {}
+_throttles_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _throttles_for(full_model: str) -> list[Throttle]:
+    """Throttles that apply to a call: the model's own, then its provider's.
+
+    Like the worker limiters, throttles hold loop-bound primitives and are
+    rebuilt if the event loop changes.
+    """
+    global _throttles_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _throttles_loop:
+        _throttles.clear()
+        _throttles_loop = loop
+    throttles = []
+    for key in (full_model, full_model.split("/")[0]):
+        if key in _rate_limits:
+            if key not in _throttles:
+                _throttles[key] = Throttle(_rate_limits[key])
+            throttles.append(_throttles[key])
+    return throttles
+
+
+# Flat per-image token estimate; images are billed by size, not base64 length
+_IMAGE_TOKEN_ESTIMATE = 1000
+
+
+# Tokens litellm adds per message and per request for chat formatting
+_MESSAGE_TOKEN_OVERHEAD = 4
+_REQUEST_TOKEN_OVERHEAD = 3
+
+
+def _split_content(messages: list[dict[str, Any]]) -> tuple[tuple[tuple[str, str], ...], int]:
+    """A prompt's (role, text) pairs and its number of attached images."""
+    images = 0
+    text_messages = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            images += sum(1 for part in content if part.get("type") == "image_url")
+            content = "\n".join(part["text"] for part in content if part.get("type") == "text")
+        text_messages.append((message["role"], content))
+    return tuple(text_messages), images
+
+
+@functools.lru_cache(maxsize=16)  # a few in-flight prompts; keys hold their text
+def _count_text_tokens(full_model: str, text_messages: tuple[tuple[str, str], ...]) -> int:
+    """litellm's token count for a prompt (roughly, by characters, if it can't count).
+
+    Memoised, so routing, the context check and rate limiting of one request
+    share a single count of a large prompt.
+    """
+    import litellm
+
+    messages = [{"role": role, "content": content} for role, content in text_messages]
+    try:
+        return litellm.token_counter(model=full_model, messages=messages)
+    except Exception:
+        return sum(len(content) for _, content in text_messages) // 4
+
+
+def _estimate_tokens(full_model: str, messages: list[dict[str, Any]]) -> int:
+    """Prompt token count for rate limiting and context preflight (blocking).
+
+    Text is counted with litellm's tokenizer, which takes seconds for
+    megabytes of text: call through _run_blocking from async code. Attached
+    images add a flat estimate each.
+    """
+    text_messages, images = _split_content(messages)
+    return _count_text_tokens(full_model, text_messages) + images * _IMAGE_TOKEN_ESTIMATE
+
+
+def _token_bound(messages: list[dict[str, Any]]) -> int:
+    """Upper bound on a prompt's tokens, without tokenising.
+
+    Every token covers at least one byte of UTF-8, so the byte count plus
+    chat formatting overhead is never below the real count.
+    """
+    text_messages, images = _split_content(messages)
+    text = sum(len(content.encode()) for _, content in text_messages)
+    overhead = _MESSAGE_TOKEN_OVERHEAD * len(text_messages) + _REQUEST_TOKEN_OVERHEAD
+    return text + overhead + images * _IMAGE_TOKEN_ESTIMATE
+
+
+@asynccontextmanager
+async def _throttled(
+    full_model: str, messages: list[dict[str, Any]] | None = None
+) -> AsyncIterator[float | None]:
+    """Wait for rate-limit headroom before a model call.
+
+    Takes one request, the estimated prompt tokens and a concurrency slot
+    from each applicable throttle, queuing (not failing) until they're free.
+    Yields the seconds spent queued, or None if no limits apply.
+    """
+    throttles = _throttles_for(full_model)
+    if not throttles:
+        yield None
+        return
+    started = time.monotonic()
+    prompt_tokens = None
+    async with AsyncExitStack() as stack:
+        for throttle in throttles:
+            if throttle.requests:
+                await throttle.requests.acquire()
+            if throttle.tokens and messages:
+                if prompt_tokens is None:
+                    prompt_tokens = await _run_blocking(
+                        "interactive", _estimate_tokens, full_model, messages
+                    )
+                await throttle.tokens.acquire(prompt_tokens)
+            if throttle.slots:
+                await stack.enter_async_context(throttle.slots)
+        wait = time.monotonic() - started
+        if wait >= 0.01:
+            logger.info("Queued %.2fs for rate limits on %s", wait, full_model)
+        yield wait
+
+
+def _charge_output_tokens(full_model: str, response: Any) -> None:
+    """Charge a response's completion tokens to the token buckets."""
+    used = getattr(getattr(response, "usage", None), "completion_tokens", None)
+    if not used:
+        return
+    for throttle in _throttles_for(full_model):
+        if throttle.tokens:
+            throttle.tokens.charge(used)
+
+
+# ---------------------------------------------------------------------------
+# Provider routing
+# ---------------------------------------------------------------------------
+
+# Recorded calls needed before a route's median latency is trusted
+_ROUTE_MIN_SAMPLES = 3
+
+
+async def _choose_route(full_model: str, messages: list[dict[str, Any]]) -> str:
+    """Pick the provider for a call among routes to the same model.
+
+    The requested ID and its equivalents on other healthy providers (e.g.
+    'openai/gpt-5.2' and 'openrouter/openai/gpt-5.2') are ranked: routes
+    that can start without queuing for rate limits first, then by median
+    recorded latency. Routes without enough recorded calls come after
+    measured ones; among those (and any exact ties), routes that have won
+    more races (see _race_completion) go first, then the original order
+    (direct provider first).
+    """
+    routes = _provider_alternatives(full_model)
+    if not routes:
+        return full_model
+    if full_model.split("/")[0] not in _unhealthy_providers():
+        routes.insert(0, full_model)
+
+    tokens = 0
+    if any(t.tokens for route in routes for t in _throttles_for(route)):
+        tokens = await _run_blocking("interactive", _estimate_tokens, full_model, messages)
+
+    def _key(item: tuple[int, str]) -> tuple[bool, bool, float, int, int]:
+        index, route = item
+        wait = max((t.wait_estimate(lambda: tokens) for t in _throttles_for(route)), default=0.0)
+        latency = _latency_percentile(route, 50, min_samples=_ROUTE_MIN_SAMPLES)
+        wins = _annotations.get(route, {}).get("usage", {}).get("race_wins", 0)
+        return (wait > 0, latency is None, wait + (latency or 0.0), -wins, index)
+
+    _, choice = min(enumerate(routes), key=_key)
+    if choice != full_model:
+        logger.info("Routed %s via %s", full_model, choice)
+    return choice
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+
+class ResponseCache:
+    """On-disk cache of completion responses, one JSON file per request key.
+
+    Entries expire ttl_seconds after they were written. A file's mtime is
+    bumped on every hit, so when the directory grows past max_bytes the
+    least recently used entries are evicted first. Blocking — call from a
+    worker thread.
+    """
+
+    def __init__(self, directory: Path, ttl_seconds: float, max_bytes: int) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response text, or None on a miss or expiry."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+            if time.time() - entry["created"] > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                raise KeyError(key)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["text"]
+
+    def put(self, key: str, full_model: str, text: str) -> None:
+        """Store a response (atomic write), then evict down to max_bytes."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"model": full_model, "created": time.time(), "text": text}))
+        tmp.replace(path)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+        return f"{self.hits} hits, {self.misses} misses ({rate} hit rate), {self.evictions} evictions"
+
+
+# None until configured by _load_config
+_response_cache: ResponseCache | None = None
+
+
+def _request_key(*parts: Any) -> str:
+    """Stable hash identifying a request (JSON-serialisable parts)."""
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Background refresh
+# ---------------------------------------------------------------------------
+
+# Refresh sources, in the order they run (enrichment matches cached models)
+_REFRESH_SOURCES = ("providers", "enrichment")
+
+# How often the scheduler wakes to check for due sources
+_REFRESH_TICK_SECONDS = 60
+
+
+def _refresh_intervals() -> dict[str, float]:
+    """Return each refresh source's cadence in seconds."""
+    return {
+        "providers": _cache_ttl_minutes * 60,
+        "enrichment": _enrichment_ttl_minutes * 60,
+    }
+
+
+def _refresh_source(source: str) -> None:
+    """Run one refresh source to completion (blocking)."""
+    if source == "providers":
+        _refresh_provider_models()
+    elif source == "enrichment":
+        _fetch_enrichment()
+    else:
+        raise ValueError(f"Unknown refresh source: {source}")
+
+
+@dataclass
+class RefreshRun:
+    """Tracks one background refresh of one or more sources."""
+
+    refresh_id: int
+    sources: list[str]
+    trigger: str  # startup | scheduled | manual
+    status: str = "in_progress"  # in_progress | completed | failed | cancelled
+    started: str = ""
+    ended: str = ""
+    error: str = ""
+
+
+class RefreshScheduler:
+    """Refreshes provider models and enrichment in the background.
+
+    Each source is re-run when its own interval has elapsed. Manual
+    refreshes go through the same path, so a source is never refreshed
+    twice concurrently — a trigger for a source that is already running
+    returns the in-flight run instead.
+    """
+
+    def __init__(self, task_group: anyio.abc.TaskGroup) -> None:
+        self.task_group = task_group
+        self._runs: dict[int, RefreshRun] = {}
+        self._next_id: int = 1
+        self._last_run: dict[str, float] = {}
+        self._active: dict[str, RefreshRun] = {}
+        self._scopes: set[anyio.CancelScope] = set()
+        self._stopped = False
+
+    def mark_fresh(self, sources: Iterable[str]) -> None:
+        """Record sources as just refreshed (e.g. annotations loaded fresh)."""
+        now = time.time()
+        for source in sources:
+            self._last_run[source] = now
+
+    def due_sources(self, now: float | None = None) -> list[str]:
+        """Return sources whose interval has elapsed and that aren't running."""
+        now = time.time() if now is None else now
+        intervals = _refresh_intervals()
+        return [
+            s for s in _REFRESH_SOURCES
+            if s not in self._active
+            and now - self._last_run.get(s, 0.0) >= intervals[s]
+        ]
+
+    def trigger(self, sources: Iterable[str], trigger: str) -> RefreshRun:
+        """Start a background refresh of the given sources and return its run."""
+        wanted = [s for s in _REFRESH_SOURCES if s in set(sources)]
+        pending = [s for s in wanted if s not in self._active]
+        if not pending:
+            return self._active[wanted[0]]
+        run = RefreshRun(
+            refresh_id=self._next_id,
+            sources=pending,
+            trigger=trigger,
+            started=datetime.now(timezone.utc).strftime("%H:%M"),
+        )
+        self._runs[run.refresh_id] = run
+        self._next_id += 1
+        for source in pending:
+            self._active[source] = run
+        self.task_group.start_soon(self._execute, run)
+        return run
+
+    def get_run(self, refresh_id: int) -> RefreshRun | None:
+        return self._runs.get(refresh_id)
+
+    def active_run(self, source: str) -> RefreshRun | None:
+        """Return the in-flight run refreshing a source, if any."""
+        return self._active.get(source)
+
+    async def _execute(self, run: RefreshRun) -> None:
+        logger.info("Refresh %d starting (%s): %s", run.refresh_id, run.trigger, run.sources)
+        scope = anyio.CancelScope()
+        self._scopes.add(scope)
+        try:
+            with scope:
+                for source in run.sources:
+                    await anyio.to_thread.run_sync(
+                        _refresh_source, source,
+                        abandon_on_cancel=True, limiter=_limiter("refresh"),
+                    )
+                    self._last_run[source] = time.time()
+            run.status = "cancelled" if scope.cancelled_caught else "completed"
+            logger.info("Refresh %d %s", run.refresh_id, run.status)
+        except Exception as exc:
+            run.status = "failed"
+            run.error = str(exc)
+            logger.warning("Refresh %d failed: %s", run.refresh_id, exc)
+        finally:
+            self._scopes.discard(scope)
+            run.ended = datetime.now(timezone.utc).strftime("%H:%M")
+            for source in run.sources:
+                self._active.pop(source, None)
+
+    async def run_forever(self) -> None:
+        """Periodically start refreshes for sources that are due."""
+        scope = anyio.CancelScope()
+        self._scopes.add(scope)
+        with scope:
+            while not self._stopped:
+                await anyio.sleep(_REFRESH_TICK_SECONDS)
+                due = self.due_sources()
+                if due:
+                    self.trigger(due, "scheduled")
+
+    def stop(self) -> None:
+        """Cancel the scheduler loop and any in-flight refresh."""
+        self._stopped = True
+        for scope in list(self._scopes):
+            scope.cancel()
+
+
 @asynccontextmanager
 async def _lifespan(server: FastMCP) -> AsyncIterator[dict[str, Any]]:
     """Lifespan context: populate caches and enrich on startup.
@@ -211,11 +933,22 @@ async def _lifespan(server: FastMCP) -> AsyncIterator[dict[str, Any]]:
     making the server responsive to MCP `initialize` even on cold starts.
     Without this, slow GitHub/HuggingFace fetches can blow CDA's stdio
     handshake timeout and trigger "Could not attach to MCP server".
+    After startup the scheduler keeps each source fresh on its own cadence.
     """
     async with anyio.create_task_group() as tg:
+        scheduler = RefreshScheduler(tg)
         if _needs_refresh(_annotations):
-            tg.start_soon(anyio.to_thread.run_sync, _startup_enrich)
-        yield {"job_store": JobStore(tg)}
+            scheduler.trigger(_REFRESH_SOURCES, "startup")
+        else:
+            # The model catalog lives in memory only; discover it even when
+            # persisted enrichment is still fresh.
+            scheduler.mark_fresh(["enrichment"])
+            scheduler.trigger(["providers"], "startup")
+        tg.start_soon(scheduler.run_forever)
+        try:
+            yield {"job_store": JobStore(tg), "refresh_scheduler": scheduler}
+        finally:
+            scheduler.stop()
 
 
 # ---------------------------------------------------------------------------
@@ -256,6 +989,93 @@ def _parse_provider_config(var_name: str, value: str) -> tuple[str, str]:
     return suffix.lower(), value
 
 
+def _parse_hedge_alternates(value: str) -> dict[str, str]:
+    """Parse HEDGE_ALTERNATES: comma-separated 'model=alternate' pairs."""
+    alternates: dict[str, str] = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        model, sep, alternate = pair.partition("=")
+        if not sep or not model.strip() or not alternate.strip():
+            raise ValueError(
+                f"Invalid HEDGE_ALTERNATES entry: '{pair.strip()}'. "
+                "Expected 'model=alternate', e.g. 'openai/gpt-5.2=gemini/gemini-3-pro-preview'"
+            )
+        alternates[model.strip()] = alternate.strip()
+    return alternates
+
+
+def _parse_attachment_roots(value: str) -> list[Path]:
+    """Parse ATTACHMENT_ROOTS: directories separated by os.pathsep.
+
+    Roots are resolved so that symlinked paths compare correctly; ~ and
+    $HOME-style variables are expanded, as in the extension's default.
+    """
+    return [
+        Path(os.path.expandvars(entry.strip())).expanduser().resolve()
+        for entry in value.split(os.pathsep)
+        if entry.strip()
+    ]
+
+
+def _parse_rate_limits(value: str) -> dict[str, RateLimit]:
+    """Parse RATE_LIMITS: 'target:key=value,...' entries separated by ';'.
+
+    target is a provider ('openai') or full model ID ('openai/gpt-5.2');
+    keys are rpm, tpm and concurrent.
+    """
+    limits: dict[str, RateLimit] = {}
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        target, sep, spec = entry.strip().rpartition(":")
+        limit = RateLimit()
+        try:
+            if not sep or not target:
+                raise ValueError
+            for item in spec.split(","):
+                key, _, number = item.strip().partition("=")
+                if key in ("rpm", "tpm"):
+                    setattr(limit, key, float(number))
+                elif key == "concurrent":
+                    limit.concurrent = int(number)
+                else:
+                    raise ValueError
+        except ValueError:
+            raise ValueError(
+                f"Invalid RATE_LIMITS entry: '{entry.strip()}'. "
+                "Expected 'target:rpm=N,tpm=N,concurrent=N', e.g. 'openai:rpm=500,tpm=200000'"
+            ) from None
+        limits[target] = limit
+    return limits
+
+
+def _parse_auto_policy(value: str) -> AutoPolicy:
+    """Parse AUTO_POLICY: comma-separated 'key=value' pairs.
+
+    Keys are prefer (latency or price), min_elo and margin (Elo below the
+    best candidate still considered adequate when min_elo is unset).
+    """
+    policy = AutoPolicy()
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        key, _, setting = item.strip().partition("=")
+        try:
+            if key == "prefer" and setting in ("latency", "price"):
+                policy.prefer = setting
+            elif key in ("min_elo", "margin"):
+                setattr(policy, key, float(setting))
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(
+                f"Invalid AUTO_POLICY entry: '{item.strip()}'. Expected prefer=latency|price, "
+                "min_elo=N or margin=N, e.g. 'prefer=price,min_elo=1350'"
+            ) from None
+    return policy
+
+
 def _get_family(model_id: str) -> str:
     """Extract family from a model identifier (all path segments except the last)."""
     return model_id.rsplit("/", 1)[0]
@@ -302,7 +1122,10 @@ def _configure_logging() -> None:
 
 def _load_config() -> None:
     """Scan environment and populate provider registry and cache TTL."""
-    global _provider_registry, _cache_ttl_minutes, _zero_data_retention, _annotations, _provider_errors, _provider_auth_errors
+    global _provider_registry, _cache_ttl_minutes, _enrichment_ttl_minutes, _zero_data_retention, _annotations, _provider_errors, _provider_auth_errors
+    global _last_refreshed
+    global _hedging_enabled, _hedge_alternates, _rate_limits, _response_cache, _auto_policy
+    global _provider_routing, _attachment_roots
 
     _configure_logging()
 
@@ -324,13 +1147,48 @@ def _load_config() -> None:
     except ValueError:
         raise ValueError(f"Invalid CACHE_TTL_MINUTES value: {ttl_str}")
 
+    enrich_ttl_str = os.environ.get("ENRICHMENT_TTL_MINUTES", "")
+    try:
+        _enrichment_ttl_minutes = int(enrich_ttl_str) if enrich_ttl_str else _cache_ttl_minutes
+    except ValueError:
+        raise ValueError(f"Invalid ENRICHMENT_TTL_MINUTES value: {enrich_ttl_str}")
+
     zdr_val = os.environ.get("ZERO_DATA_RETENTION", "").lower()
     if zdr_val:
         _zero_data_retention = zdr_val in ("1", "true", "yes")
     else:
         _zero_data_retention = True
 
+    _rate_limits = _parse_rate_limits(os.environ.get("RATE_LIMITS", ""))
+
+    cache_ttl_str = os.environ.get("RESPONSE_CACHE_TTL_MINUTES", "1440")
+    cache_mb_str = os.environ.get("RESPONSE_CACHE_MAX_MB", "50")
+    try:
+        cache_ttl = int(cache_ttl_str) * 60
+    except ValueError:
+        raise ValueError(f"Invalid RESPONSE_CACHE_TTL_MINUTES value: {cache_ttl_str}")
+    try:
+        cache_bytes = int(float(cache_mb_str) * 1024 * 1024)
+    except ValueError:
+        raise ValueError(f"Invalid RESPONSE_CACHE_MAX_MB value: {cache_mb_str}")
+    _response_cache = ResponseCache(
+        Path(os.environ.get("RESPONSE_CACHE_DIR", os.path.expanduser("~/.ask-another-cache"))),
+        cache_ttl,
+        cache_bytes,
+    )
+
+    hedge_val = os.environ.get("HEDGING", "").lower()
+    _hedging_enabled = hedge_val in ("1", "true", "yes")
+    _hedge_alternates = _parse_hedge_alternates(os.environ.get("HEDGE_ALTERNATES", ""))
+    _auto_policy = _parse_auto_policy(os.environ.get("AUTO_POLICY", ""))
+    routing_val = os.environ.get("PROVIDER_ROUTING", "").lower()
+    _provider_routing = routing_val in ("1", "true", "yes")
+    _attachment_roots = _parse_attachment_roots(os.environ.get("ATTACHMENT_ROOTS", ""))
+
     _annotations = _load_annotations()
+    _last_refreshed = _load_last_refreshed()
+    _index_models(_annotations)
+    _rebuild_resolution_table()
 
     logger.info(
         "Config loaded: %d providers, %d annotations, ZDR=%s, cache_ttl=%dm",
@@ -351,6 +1209,89 @@ def _normalise_model_id(model_id: str, provider: str) -> str:
     return model_id
 
 
+def _cache_key(provider: str, zdr: bool) -> str:
+    """Return the _model_cache key for a provider (OpenRouter is keyed by ZDR)."""
+    return f"{provider}:zdr={zdr}" if provider == "openrouter" else provider
+
+
+def _cache_models(cache_key: str, models: list[str], cached_at: float | None = None) -> None:
+    """Store a provider's model list in the cache and index its canonical names.
+
+    Direct-provider models also pick up offline metadata from litellm's
+    bundled cost table, so they get pricing and context length without
+    waiting for the network enrichment pass. The list for the configured
+    ZDR policy becomes the provider's catalog for model resolution.
+    """
+    _model_cache[cache_key] = (models, time.time() if cached_at is None else cached_at)
+    _index_models(models)
+    _apply_litellm_metadata(models)
+    provider = cache_key.split(":", 1)[0]
+    if cache_key == _cache_key(provider, _zero_data_retention):
+        _set_catalog(provider, models)
+
+
+def _format_token_price(cost: float) -> str:
+    """Render a per-token USD cost as a plain decimal string (OpenRouter style)."""
+    return f"{cost:.12f}".rstrip("0").rstrip(".") or "0"
+
+
+def _litellm_model_info(model_id: str) -> dict[str, Any]:
+    """A direct-provider model's raw entry in litellm's bundled model_cost map.
+
+    Tries the full ID first (e.g. 'gemini/gemini-2.5-pro'), then the bare
+    name when litellm lists it under the same provider (e.g. 'gpt-4o' for
+    openai). Returns {} for OpenRouter models — their metadata comes from
+    the OpenRouter API — and for models litellm doesn't know.
+    """
+    import litellm
+
+    provider, _, name = model_id.partition("/")
+    if provider == "openrouter" or not name:
+        return {}
+    info = litellm.model_cost.get(model_id)
+    if info is None:
+        bare = litellm.model_cost.get(name)
+        if bare is not None and bare.get("litellm_provider") == provider:
+            info = bare
+    return info or {}
+
+
+def _litellm_model_metadata(model_id: str) -> dict[str, Any]:
+    """Annotation metadata for a direct-provider model from litellm's model map."""
+    info = _litellm_model_info(model_id)
+    if not info:
+        return {}
+
+    meta: dict[str, Any] = {}
+    context = info.get("max_input_tokens") or info.get("max_tokens")
+    if context:
+        meta["context_length"] = int(context)
+    if info.get("input_cost_per_token") is not None:
+        meta["pricing_in"] = _format_token_price(info["input_cost_per_token"])
+    if info.get("output_cost_per_token") is not None:
+        meta["pricing_out"] = _format_token_price(info["output_cost_per_token"])
+    modalities = info.get("supported_modalities")
+    if not modalities and info.get("supports_vision"):
+        modalities = ["text", "image"]
+    if modalities:
+        meta["modalities"] = list(modalities)
+    if info.get("supported_output_modalities"):
+        meta["output_modalities"] = list(info["supported_output_modalities"])
+    return meta
+
+
+def _apply_litellm_metadata(models: Iterable[str]) -> int:
+    """Merge offline litellm metadata into annotations. Returns models changed."""
+    changed = 0
+    for model_id in models:
+        meta = _litellm_model_metadata(model_id)
+        if meta and _merge_metadata(model_id, meta):
+            changed += 1
+    if changed:
+        logger.debug("Merged litellm model_cost metadata for %d models", changed)
+    return changed
+
+
 def _fetch_openrouter_models(
     api_key: str, *, zdr: bool = False
 ) -> tuple[list[str], dict[str, dict]]:
@@ -447,7 +1388,7 @@ def _get_models(provider: str | None = None, *, zdr: bool | None = None) -> list
         if _provider_errors.get(p):
             continue
 
-        cache_key = f"{p}:zdr={effective_zdr}" if p == "openrouter" else p
+        cache_key = _cache_key(p, effective_zdr)
 
         if cache_key in _model_cache:
             cached_models, cached_at = _model_cache[cache_key]
@@ -459,7 +1400,7 @@ def _get_models(provider: str | None = None, *, zdr: bool | None = None) -> list
         try:
             models = _fetch_models(p, _provider_registry[p], zdr=effective_zdr)
             if models:
-                _model_cache[cache_key] = (models, now)
+                _cache_models(cache_key, models, now)
                 all_models.extend(models)
         except Exception as exc:
             logger.warning("Model fetch failed for provider %s: %s", p, exc)
@@ -471,18 +1412,17 @@ def _refresh_provider_models() -> None:
     """Scan all configured providers and populate the model cache."""
     for provider, api_key in _provider_registry.items():
         effective_zdr = _zero_data_retention
-        cache_key = f"{provider}:zdr={effective_zdr}" if provider == "openrouter" else provider
+        cache_key = _cache_key(provider, effective_zdr)
         try:
             if provider == "openrouter":
                 models, or_metadata = _fetch_openrouter_models(api_key, zdr=effective_zdr)
                 # Merge OpenRouter metadata into annotations
                 for model_id, meta in or_metadata.items():
-                    entry = _annotations.setdefault(model_id, {})
-                    entry.setdefault("metadata", {}).update(meta)
+                    _merge_metadata(model_id, meta)
             else:
                 models = _fetch_models(provider, api_key, zdr=effective_zdr)
             if models:
-                _model_cache[cache_key] = (models, time.time())
+                _cache_models(cache_key, models)
                 _provider_errors[provider] = None
                 logger.info("Cached %d models for %s", len(models), provider)
             else:
@@ -510,19 +1450,18 @@ def _retry_unhealthy_providers(search: str, *, zdr: bool | None = None) -> str |
         if search.lower() not in provider.lower() and provider.lower() not in search.lower():
             continue
         # Retry
-        cache_key = f"{provider}:zdr={effective_zdr}" if provider == "openrouter" else provider
+        cache_key = _cache_key(provider, effective_zdr)
         try:
             if provider == "openrouter":
                 models, or_metadata = _fetch_openrouter_models(
                     _provider_registry[provider], zdr=effective_zdr
                 )
                 for model_id, meta in or_metadata.items():
-                    entry = _annotations.setdefault(model_id, {})
-                    entry.setdefault("metadata", {}).update(meta)
+                    _merge_metadata(model_id, meta)
             else:
                 models = _fetch_models(provider, _provider_registry[provider], zdr=effective_zdr)
             if models:
-                _model_cache[cache_key] = (models, time.time())
+                _cache_models(cache_key, models)
                 _provider_errors[provider] = None
                 logger.info("Retry succeeded for %s: %d models", provider, len(models))
             else:
@@ -535,13 +1474,6 @@ def _retry_unhealthy_providers(search: str, *, zdr: bool | None = None) -> str |
     return "\n".join(warnings) if warnings else None
 
 
-def _startup_enrich() -> None:
-    """Refresh provider models and fetch benchmark data."""
-    _refresh_provider_models()
-    _fetch_enrichment()
-    logger.info("Startup enrichment complete")
-
-
 # ---------------------------------------------------------------------------
 # Enrichment
 # ---------------------------------------------------------------------------
@@ -552,11 +1484,13 @@ _DATE_SUFFIX_RE = re.compile(r"-\d{4}-?\d{2}-?\d{2}$")
 _STRIP_SUFFIXES = ("-preview", "-latest", "-experimental", "-exp")
 
 
+@functools.lru_cache(maxsize=None)
 def _normalize_model_name(name: str) -> str:
     """Normalize a model name for matching arena keys to provider IDs.
 
     Strips provider prefix, date suffixes, and common suffixes like -preview.
-    Does NOT strip version suffixes like -v3 or -v3.2.
+    Does NOT strip version suffixes like -v3 or -v3.2. Memoized — each
+    distinct name is normalized once per process.
     """
     # Lowercase
     name = name.lower()
@@ -573,6 +1507,22 @@ def _normalize_model_name(name: str) -> str:
     return name
 
 
+def _index_models(model_ids: Iterable[str]) -> None:
+    """Add model IDs to the canonical alias index."""
+    for model_id in model_ids:
+        _canonical_index.setdefault(_normalize_model_name(model_id), set()).add(model_id)
+
+
+def _equivalent_models(model_id: str) -> list[str]:
+    """Return every known ID for the same underlying model, most direct first.
+
+    Includes model_id itself. E.g. 'openai/gpt-5.2' and
+    'openrouter/openai/gpt-5.2' share the canonical name 'gpt-5.2'.
+    """
+    aliases = _canonical_index.get(_normalize_model_name(model_id), set()) | {model_id}
+    return sorted(aliases, key=lambda m: (m.count("/"), m))
+
+
 _ARENA_CATALOG_URL = (
     "https://raw.githubusercontent.com/lmarena/arena-catalog/main/data/leaderboard-text.json"
 )
@@ -648,7 +1598,12 @@ def _discover_latest_arena_csv() -> str:
 
 
 def _fetch_enrichment() -> None:
-    """Fetch arena Elo and metadata, merge into annotations."""
+    """Fetch arena Elo and metadata, merge into annotations.
+
+    The annotations file is only rewritten when an entry actually changed
+    (or earlier provider metadata merges are still unsaved), so a refresh
+    against unchanged sources performs no disk write.
+    """
     now = datetime.now(timezone.utc).isoformat()
 
     # --- Source 1: Arena Elo ratings ---
@@ -674,31 +1629,63 @@ def _fetch_enrichment() -> None:
         logger.warning("Failed to fetch arena metadata: %s", exc)
 
     # --- Merge into annotations ---
-    all_cached_models = [m for models, _ in _model_cache.values() for m in models]
-    for model_id in all_cached_models:
-        entry = _annotations.setdefault(model_id, {})
-        metadata = entry.setdefault("metadata", {})
+    changed = _apply_enrichment(arena_elo, arena_meta, now)
+    logger.info("Enrichment changed %d models", len(changed))
+    if changed or _annotations_dirty:
+        _save_annotations(_annotations)
+    if arena_elo or arena_meta:
+        _save_last_refreshed(datetime.fromisoformat(now))
 
-        # Stamp first_seen only for newly discovered models
-        if "first_seen" not in metadata:
-            metadata["first_seen"] = now
 
-        # Match arena data by normalized name — apply to ALL matching providers
-        norm = _normalize_model_name(model_id)
-        if norm in arena_elo:
-            metadata["arena_elo"] = arena_elo[norm]
-        if norm in arena_meta:
-            for field in ("knowledge_cutoff", "organization", "license"):
-                val = arena_meta[norm].get(field)
-                if val is not None:
-                    metadata[field] = val
+_ARENA_META_FIELDS = ("knowledge_cutoff", "organization", "license")
 
-        # Remove stale livebench_avg if present (old source is dead)
-        metadata.pop("livebench_avg", None)
 
-        metadata["last_updated"] = now
+def _apply_enrichment(
+    arena_elo: dict[str, float],
+    arena_meta: dict[str, dict],
+    now: str,
+) -> list[str]:
+    """Merge arena data into annotations for new or changed models only.
 
-    _save_annotations(_annotations)
+    A model is touched when it has never been enriched, when its arena
+    values differ from what is already stored, or when it still carries
+    the dead livebench_avg field. Unchanged entries keep their
+    last_updated stamp. Returns the IDs of the models that were updated.
+    """
+    all_cached_models = dict.fromkeys(
+        m for models, _ in _model_cache.values() for m in models
+    )
+    changed: list[str] = []
+    with _annotations_lock:
+        for model_id in all_cached_models:
+            # Match arena data by normalized name — apply to ALL matching providers
+            norm = _normalize_model_name(model_id)
+            updates: dict[str, Any] = {}
+            if norm in arena_elo:
+                updates["arena_elo"] = arena_elo[norm]
+            if norm in arena_meta:
+                for key in _ARENA_META_FIELDS:
+                    val = arena_meta[norm].get(key)
+                    if val is not None:
+                        updates[key] = val
+
+            metadata = _annotations.get(model_id, {}).get("metadata", {})
+            is_new = "first_seen" not in metadata
+            # Remove stale livebench_avg if present (old source is dead)
+            has_stale = "livebench_avg" in metadata
+            differs = any(metadata.get(k) != v for k, v in updates.items())
+            if not (is_new or has_stale or differs):
+                continue
+
+            metadata = _annotations.setdefault(model_id, {}).setdefault("metadata", {})
+            # Stamp first_seen only for newly discovered models
+            metadata.setdefault("first_seen", now)
+            metadata.update(updates)
+            metadata.pop("livebench_avg", None)
+            metadata["last_updated"] = now
+            changed.append(model_id)
+    _invalidate_resolution(changed)
+    return changed
 
 
 # ---------------------------------------------------------------------------
@@ -706,61 +1693,443 @@ def _fetch_enrichment() -> None:
 # ---------------------------------------------------------------------------
 
 
-def _resolve_model(model: str) -> tuple[str, str]:
-    """Resolve a model identifier or shorthand to (full_id, api_key).
-
-    Resolution order:
-    1. Shorthand via favourites (most-used match wins)
-    2. Full identifier: route directly by matching provider prefix
-    3. Shorthand via all discovered models (highest Elo wins, else first alphabetically)
-    """
-    # Try shorthand resolution against favourites first
-    favourites = _get_favourites(_annotations)
-    matches = [fav for fav in favourites if fav.startswith(f"{model}/")]
+# Resolution table. Shorthands are path prefixes of model IDs ('openai',
+# 'openrouter/deepseek'). Each prefix maps to its candidate models ranked
+# best-first; ranks are recomputed lazily, and only for prefixes whose
+# members changed (catalog, usage or Elo), so _resolve_model is a handful
+# of dict lookups and never fetches.
+_catalog: dict[str, set[str]] = {}
+_prefix_members: dict[str, set[str]] = {}
+_resolution_table: dict[str, list[str]] = {}
+_stale_prefixes: set[str] = set()
+_favourite_rank: dict[str, int] = {}
+
+# Validation: per-provider sorted catalog for suggestion lookups, and a
+# negative cache of rejected IDs (cleared when that provider's catalog changes)
+_suggestion_index: dict[str, list[str]] = {}
+_invalid_models: dict[str, str] = {}
+
+
+def _model_prefixes(model_id: str) -> list[str]:
+    """Return every shorthand prefix of a model ID ('a/b/c' -> ['a', 'a/b'])."""
+    parts = model_id.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def _invalidate_resolution(model_ids: Iterable[str]) -> None:
+    """Mark the prefixes of these models for re-ranking, adding them as members."""
+    _auto_ranked.clear()
+    for model_id in model_ids:
+        for prefix in _model_prefixes(model_id):
+            _prefix_members.setdefault(prefix, set()).add(model_id)
+            _stale_prefixes.add(prefix)
+
+
+def _set_catalog(provider: str, models: list[str]) -> None:
+    """Replace a provider's discovered model set used for resolution."""
+    old = _catalog.get(provider, set())
+    new = set(models)
+    _catalog[provider] = new
+    _invalidate_resolution(old ^ new)
+    if old != new:
+        _suggestion_index[provider] = sorted(new)
+        for model_id in [m for m in _invalid_models if m.startswith(f"{provider}/")]:
+            del _invalid_models[model_id]
+
+
+def _update_favourites() -> None:
+    """Recompute favourites and re-rank prefixes of models whose rank moved."""
+    global _favourite_rank
+    new_rank = {m: i for i, m in enumerate(_get_favourites(_annotations))}
+    if new_rank != _favourite_rank:
+        _invalidate_resolution(set(new_rank) | set(_favourite_rank))
+        _favourite_rank = new_rank
+
+
+def _rebuild_resolution_table() -> None:
+    """Rebuild the resolution table from scratch (after loading config)."""
+    global _favourite_rank
+    _prefix_members.clear()
+    _resolution_table.clear()
+    _stale_prefixes.clear()
+    _catalog.clear()
+    _suggestion_index.clear()
+    _invalid_models.clear()
+    _favourite_rank = {m: i for i, m in enumerate(_get_favourites(_annotations))}
+    _invalidate_resolution(_favourite_rank)
+    for provider in _provider_registry:
+        cached = _model_cache.get(_cache_key(provider, _zero_data_retention))
+        if cached:
+            _set_catalog(provider, cached[0])
+
+
+def _resolution_rank(model_id: str) -> tuple[int, int, float, str]:
+    """Sort key: favourites by usage rank, then highest Elo, then alphabetical."""
+    fav = _favourite_rank.get(model_id)
+    if fav is not None:
+        return (0, fav, 0.0, model_id)
+    elo = _annotations.get(model_id, {}).get("metadata", {}).get("arena_elo", 0)
+    return (1, 0, -elo, model_id)
+
+
+def _ranked_candidates(prefix: str) -> list[str]:
+    """Return a prefix's members ranked best-first, re-ranking only if stale."""
+    if prefix in _stale_prefixes or prefix not in _resolution_table:
+        _resolution_table[prefix] = sorted(
+            _prefix_members.get(prefix, ()), key=_resolution_rank
+        )
+        _stale_prefixes.discard(prefix)
+    return _resolution_table[prefix]
 
-    if matches:
-        # Multiple matches? Pick the most-used (favourites are sorted by call_count desc)
-        fav = matches[0]
-        for provider, api_key in _provider_registry.items():
-            if fav.startswith(f"{provider}/"):
-                logger.debug("Resolved shorthand '%s' -> %s (provider=%s)", model, fav, provider)
-                return fav, api_key
 
-    # Full identifier: route directly
-    if "/" in model:
-        for provider, api_key in _provider_registry.items():
-            if model.startswith(f"{provider}/"):
-                logger.debug("Resolved full model ID '%s' (provider=%s)", model, provider)
-                return model, api_key
-
-    # Shorthand fallback: search all discovered models for the prefix
-    all_models = _get_models()
-    candidates = [m for m in all_models if m.startswith(f"{model}/")]
-    if candidates:
-        # Pick highest Elo, falling back to first alphabetically
-        def _elo(m: str) -> float:
-            return _annotations.get(m, {}).get("metadata", {}).get("arena_elo", 0)
-        best = sorted(candidates, key=lambda m: (-_elo(m), m))[0]
-        for provider, api_key in _provider_registry.items():
-            if best.startswith(f"{provider}/"):
-                logger.debug(
-                    "Resolved shorthand '%s' -> %s via discovery (provider=%s)",
-                    model, best, provider,
-                )
-                return best, api_key
+def _suggest_models(full_model: str, provider: str, limit: int = 5) -> list[str]:
+    """Suggest catalog IDs close to an unknown one.
 
-    logger.warning("Model resolution failed for '%s'", model)
-    raise ValueError(
-        f"No models found matching '{model}'. "
-        f"Use search_models to find valid model identifiers."
+    Bisects the provider's sorted catalog to the unknown ID's position and
+    ranks only that neighbourhood, by shared prefix then edit similarity.
+    """
+    names = _suggestion_index.get(provider, [])
+    pos = bisect.bisect_left(names, full_model)
+    window = names[max(0, pos - limit * 2): pos + limit * 2]
+    floor = len(provider) + 2  # share at least one character of the model name
+
+    def _shared(m: str) -> int:
+        return len(os.path.commonprefix([m, full_model]))
+
+    ranked = sorted(
+        (m for m in window if _shared(m) >= floor),
+        key=lambda m: (
+            -_shared(m),
+            -difflib.SequenceMatcher(None, m, full_model).ratio(),
+            m,
+        ),
     )
+    return ranked[:limit]
 
 
-# ---------------------------------------------------------------------------
-# Startup
-# ---------------------------------------------------------------------------
+def _validate_model(full_model: str) -> None:
+    """Reject IDs missing from their provider's discovered catalog.
 
-_load_config()
+    Set membership against the in-memory catalog — never fetches. Providers
+    whose catalog hasn't been discovered yet are not validated. Rejections
+    are remembered until the provider's catalog changes.
+    """
+    cached = _invalid_models.get(full_model)
+    if cached:
+        raise ValueError(cached)
+    provider = full_model.split("/")[0]
+    known = _catalog.get(provider)
+    if not known or full_model in known:
+        return
+    suggestions = _suggest_models(full_model, provider)
+    msg = f"Model '{full_model}' not found in {provider}'s model list."
+    if suggestions:
+        msg += f" Similar models: {', '.join(suggestions)}"
+    msg += " Use search_models to find valid identifiers."
+    msg += " If this seems like a bug, call the feedback tool to report it."
+    logger.warning("Model validation failed: %s (known: %d models)", full_model, len(known))
+    _invalid_models[full_model] = msg
+    raise ValueError(msg)
+
+
+def _provider_alternatives(full_model: str) -> list[str]:
+    """Return other routable IDs for the same model on other providers.
+
+    E.g. 'openai/gpt-5.2' → ['openrouter/openai/gpt-5.2'] when OpenRouter is
+    registered, healthy and lists it. Most direct route first.
+    """
+    unhealthy = _unhealthy_providers()
+    alternatives = []
+    for alias in _equivalent_models(full_model):
+        provider = alias.split("/")[0]
+        if (
+            alias != full_model
+            and provider in _provider_registry
+            and provider not in unhealthy
+            and alias in _catalog.get(provider, ())
+        ):
+            alternatives.append(alias)
+    return alternatives
+
+
+def _context_length(model_id: str) -> int | None:
+    """Known context window (tokens) for a model, from enrichment metadata."""
+    return _annotations.get(model_id, {}).get("metadata", {}).get("context_length")
+
+
+# Tokens kept free for the reply when checking a prompt against the context
+# window, unless litellm knows the model's max output. Either way at most a
+# quarter of the window is reserved.
+_OUTPUT_RESERVE_TOKENS = 4_096
+
+
+def _output_reserve(model_id: str) -> int:
+    """Tokens of a model's context window to leave for its response."""
+    limit = _context_length(model_id) or 0
+    reserve = _litellm_model_info(model_id).get("max_output_tokens") or _OUTPUT_RESERVE_TOKENS
+    return min(int(reserve), limit // 4)
+
+
+# Name markers of models that don't answer a chat prompt with text, even
+# where litellm lists them as chat models (e.g. realtime sessions)
+_NON_CHAT_MARKERS = ("realtime", "tts", "transcribe", "audio", "embedding", "image")
+
+
+def _is_chat_model(model_id: str) -> bool:
+    """Whether a model takes a chat prompt and answers in text.
+
+    Uses recorded output modalities, litellm's mode for direct-provider
+    models (ruling out responses-only and speech models), and name markers.
+    """
+    meta = _annotations.get(model_id, {}).get("metadata", {})
+    if "text" not in meta.get("output_modalities", ["text"]):
+        return False
+    name = model_id.lower()
+    if any(marker in name for marker in _NON_CHAT_MARKERS):
+        return False
+    return _litellm_model_info(model_id).get("mode", "chat") == "chat"
+
+
+def _larger_context_models(full_model: str, needed: int) -> list[str]:
+    """Routable models whose context window fits needed tokens, best first.
+
+    The same model via other providers comes first, then chat siblings in
+    the same family (e.g. other 'openai/...' models) by favourite rank and
+    Elo, with unrated ones last.
+    """
+    def _fits(model_id: str) -> bool:
+        return (_context_length(model_id) or 0) - _output_reserve(model_id) >= needed
+
+    equivalents = [m for m in _provider_alternatives(full_model) if _fits(m)]
+    family = _get_family(full_model)
+    provider = full_model.split("/")[0]
+    siblings = sorted(
+        (
+            m for m in _catalog.get(provider, ())
+            if _get_family(m) == family and m != full_model and _fits(m) and _is_chat_model(m)
+        ),
+        key=_resolution_rank,
+    )
+    if provider in _unhealthy_providers():
+        siblings = []
+    return equivalents + siblings
+
+
+async def _preflight_context(
+    full_model: str, messages: list[dict[str, Any]], fit: bool
+) -> str:
+    """Check the prompt fits the model's context window before calling it.
+
+    Room for the response (_output_reserve) is kept free, so a prompt that
+    only just fits the window isn't sent to fail at the provider. Prompts
+    whose byte count already fits skip tokenising; others are counted off
+    the event loop. Returns the model to call: full_model, or with fit=True
+    a larger-context alternative when it doesn't fit. Raises ValueError if
+    it can't fit. Models without a known context_length are not checked.
+    """
+    limit = _context_length(full_model)
+    if not limit:
+        return full_model
+    reserve = _output_reserve(full_model)
+    if _token_bound(messages) <= limit - reserve:
+        return full_model
+    tokens = await _run_blocking("interactive", _estimate_tokens, full_model, messages)
+    if tokens <= limit - reserve:
+        return full_model
+    alternatives = _larger_context_models(full_model, tokens)
+    if fit and alternatives:
+        logger.info(
+            "Prompt (~%d tokens) exceeds %s's %d-token context; using %s",
+            tokens, full_model, limit, alternatives[0],
+        )
+        return alternatives[0]
+    msg = (
+        f"Prompt is ~{tokens:,} tokens but {full_model} has a {limit:,}-token "
+        f"context window with {reserve:,} kept for the response."
+    )
+    if alternatives:
+        msg += (
+            f" Models that fit: {', '.join(alternatives[:5])}."
+            " Pass fit_context=true to switch automatically."
+        )
+    else:
+        msg += " Shorten the prompt or pick a larger-context model via search_models."
+    raise ValueError(msg)
+
+
+def _resolve_model(model: str) -> tuple[str, str]:
+    """Resolve a model identifier or shorthand to (full_id, api_key).
+
+    Resolution order:
+    0. 'auto' / 'auto:<family>' via _select_auto (Elo floor, then latency or price)
+    1. Shorthand via favourites (most-used match wins)
+    2. Full identifier: route directly by matching provider prefix
+    3. Shorthand via all discovered models (highest Elo wins, else first alphabetically)
+
+    Served from the resolution table — never fetches model lists.
+    """
+    if _is_auto(model):
+        model = _select_auto(model)
+    candidates = _ranked_candidates(model)
+
+    # Favourites rank first in the table
+    if candidates and candidates[0] in _favourite_rank:
+        fav = candidates[0]
+        provider = fav.split("/", 1)[0]
+        if provider in _provider_registry:
+            logger.debug("Resolved shorthand '%s' -> %s (provider=%s)", model, fav, provider)
+            return fav, _provider_registry[provider]
+
+    # Full identifier: route directly
+    provider = model.split("/", 1)[0]
+    if "/" in model and provider in _provider_registry:
+        logger.debug("Resolved full model ID '%s' (provider=%s)", model, provider)
+        return model, _provider_registry[provider]
+
+    # Shorthand fallback: best discovered model from a healthy provider
+    for best in candidates:
+        provider = best.split("/", 1)[0]
+        if (
+            provider in _provider_registry
+            and not _provider_errors.get(provider)
+            and best in _catalog.get(provider, ())
+        ):
+            logger.debug(
+                "Resolved shorthand '%s' -> %s via discovery (provider=%s)",
+                model, best, provider,
+            )
+            return best, _provider_registry[provider]
+
+    logger.warning("Model resolution failed for '%s'", model)
+    msg = f"No models found matching '{model}'. "
+    if not _catalog:
+        msg += "Model discovery is still running — try again shortly or pass a full model ID. "
+    raise ValueError(msg + "Use search_models to find valid model identifiers.")
+
+
+# ---------------------------------------------------------------------------
+# Automatic model selection
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class AutoPolicy:
+    """How 'auto' targets pick a model: a quality floor, then what to optimise."""
+
+    prefer: str = "latency"  # latency | price
+    min_elo: float | None = None  # None = within margin of the best candidate
+    margin: float = 50.0
+
+
+_auto_policy = AutoPolicy()
+
+# Recorded calls needed before a model's median latency is trusted
+_AUTO_MIN_SAMPLES = 3
+
+
+def _model_price(model_id: str) -> float | None:
+    """Combined input + output price per token, or None if unknown."""
+    meta = _annotations.get(model_id, {}).get("metadata", {})
+    try:
+        prices = [float(meta["pricing_in"]), float(meta["pricing_out"])]
+    except (KeyError, TypeError, ValueError):
+        return None
+    # OpenRouter lists variable-priced routers as -1
+    return None if min(prices) < 0 else sum(prices)
+
+
+# Rated text models per family ('' = all), best Elo first, as
+# (provider, model_id). Built on first use and cleared by
+# _invalidate_resolution whenever the catalog, Elo or favourites change;
+# provider health is applied per call.
+_auto_ranked: dict[str, list[tuple[str, str]]] = {}
+
+
+def _is_auto(model: str) -> bool:
+    """Whether a model argument asks for automatic selection."""
+    return model == "auto" or model.startswith("auto:")
+
+
+def _reject_auto(model: str, kind: str) -> None:
+    """Refuse 'auto' in tools that need something other than a text chat model."""
+    if _is_auto(model):
+        raise ValueError(
+            f"'{model}' only picks text chat models; pass {kind} model ID instead "
+            "(search_models lists them)."
+        )
+
+
+def _auto_candidates(family: str | None) -> list[str]:
+    """Routable text models with an arena Elo rating, best first, optionally in one family."""
+    key = family or ""
+    ranked = _auto_ranked.get(key)
+    if ranked is None:
+        ranked = []
+        for provider, models in _catalog.items():
+            if provider not in _provider_registry:
+                continue
+            for model_id in models:
+                if family and not model_id.startswith(f"{family}/"):
+                    continue
+                meta = _annotations.get(model_id, {}).get("metadata", {})
+                if meta.get("arena_elo") and _is_chat_model(model_id):
+                    ranked.append((provider, model_id))
+        ranked.sort(key=lambda entry: (-_annotations[entry[1]]["metadata"]["arena_elo"], entry[1]))
+        _auto_ranked[key] = ranked
+    unhealthy = _unhealthy_providers()
+    return [model_id for provider, model_id in ranked if provider not in unhealthy]
+
+
+def _select_auto(target: str) -> str:
+    """Pick the model for 'auto' or 'auto:<family>' under _auto_policy.
+
+    Models below the Elo floor are excluded; of the rest, the one with the
+    lowest median latency (or price) wins. Models without enough recorded
+    calls (or without pricing) rank after measured ones, by Elo.
+    """
+    _, _, family = target.partition(":")
+    candidates = _auto_candidates(family or None)
+    if not candidates:
+        raise ValueError(
+            f"No Elo-rated models available for '{target}'. Pass a model ID or "
+            "shorthand instead, or use search_models to see what is rated."
+        )
+
+    def _elo(model_id: str) -> float:
+        return _annotations[model_id]["metadata"]["arena_elo"]
+
+    policy = _auto_policy
+    best = _elo(candidates[0])
+    floor = policy.min_elo if policy.min_elo is not None else best - policy.margin
+    adequate = [m for m in candidates if _elo(m) >= floor]
+    if not adequate:
+        raise ValueError(
+            f"No model for '{target}' meets the Elo floor of {floor:g} "
+            f"(best available is {best:g}). Lower min_elo in AUTO_POLICY."
+        )
+
+    def _measure(model_id: str) -> float | None:
+        if policy.prefer == "price":
+            return _model_price(model_id)
+        return _latency_percentile(model_id, 50, min_samples=_AUTO_MIN_SAMPLES)
+
+    def _key(model_id: str) -> tuple[bool, float, float, str]:
+        measure = _measure(model_id)
+        return (measure is None, measure or 0.0, -_elo(model_id), model_id)
+
+    choice = min(adequate, key=_key)
+    logger.info(
+        "Auto-selected %s for '%s' (prefer=%s, Elo floor %g, %d adequate of %d)",
+        choice, target, policy.prefer, floor, len(adequate), len(candidates),
+    )
+    return choice
+
+
+# ---------------------------------------------------------------------------
+# Startup
+# ---------------------------------------------------------------------------
+
+_load_config()
 
 
 def _build_instructions() -> str:
@@ -774,6 +2143,18 @@ def _build_instructions() -> str:
         "    Shorthand is a provider name (e.g. 'openai') that resolves to your",
         "    most-used model from that provider. This is not guessing — shorthands",
         "    are resolved deterministically from your usage history.",
+        "  - For opinions from several models at once, use completion_many — the",
+        "    models are called concurrently. For one merged answer from several",
+        "    models, use ensemble with a judge model.",
+        "  - For input longer than a model's context, use map_reduce — chunks are",
+        "    processed concurrently and the partial answers combined.",
+        "  - To send the same long document to models repeatedly, register it once",
+        "    with register_context and pass the handle as completion's context.",
+        "  - For a back-and-forth with one model, use start_session, then",
+        "    continue_session for each follow-up — the server keeps the history.",
+        "  - For routine queries where any good model will do, pass model='auto'",
+        "    (or 'auto:<family>', e.g. 'auto:openai') to use the fastest or",
+        "    cheapest well-rated model.",
         "  - To find any model, use search_models — results include descriptions",
         "    from the model catalog when available.",
         "  - For deep research tasks, use start_research. If it is interrupted or",
@@ -875,7 +2256,7 @@ def _zdr_warning(zdr: bool | None, result: str) -> str:
 
 
 @mcp.tool()
-def search_families(
+async def search_families(
     search: str | None = None,
     zdr: bool | None = None,
 ) -> str:
@@ -889,6 +2270,11 @@ def search_families(
              only. Defaults to the server's ZERO_DATA_RETENTION setting.
              Set explicitly to override.
     """
+    return await _run_blocking("interactive", _search_families_sync, search, zdr)
+
+
+def _search_families_sync(search: str | None, zdr: bool | None) -> str:
+    """Blocking body of search_families (may fetch model lists)."""
     retry_warning = None
     if search:
         retry_warning = _retry_unhealthy_providers(search, zdr=zdr)
@@ -907,7 +2293,7 @@ def search_families(
 
 
 @mcp.tool()
-def search_models(
+async def search_models(
     search: str | None = None,
     zdr: bool | None = None,
 ) -> str:
@@ -920,6 +2306,11 @@ def search_models(
              only. Defaults to the server's ZERO_DATA_RETENTION setting.
              Set explicitly to override.
     """
+    return await _run_blocking("interactive", _search_models_sync, search, zdr)
+
+
+def _search_models_sync(search: str | None, zdr: bool | None) -> str:
+    """Blocking body of search_models (may fetch model lists)."""
     retry_warning = None
     if search:
         retry_warning = _retry_unhealthy_providers(search, zdr=zdr)
@@ -943,6 +2334,11 @@ def search_models(
             desc_parts.append(f"{meta['context_length'] // 1000}k ctx")
         if meta.get("pricing_in"):
             desc_parts.append(f"${meta['pricing_in']}/tok in")
+        if "image" in meta.get("modalities", ()):
+            desc_parts.append("image input")
+        ttft_ms = entry.get("usage", {}).get("ttft_ms")
+        if ttft_ms is not None:
+            desc_parts.append(f"first token ~{ttft_ms}ms")
         if note:
             desc_parts.append(note)
         if desc_parts:
@@ -957,7 +2353,7 @@ def search_models(
 
 
 @mcp.tool()
-def annotate_models(
+async def annotate_models(
     model: str,
     note: str,
 ) -> str:
@@ -968,24 +2364,78 @@ def annotate_models(
         model: Full model identifier (e.g. 'openai/gpt-5.2').
         note: Your note about this model. Overwrites any existing note.
     """
-    entry = _annotations.setdefault(model, {})
-    annotations = entry.setdefault("annotations", {})
-    annotations["note"] = note
+    return await _run_blocking("interactive", _annotate_models_sync, model, note)
+
+
+def _annotate_models_sync(model: str, note: str) -> str:
+    """Blocking body of annotate_models (writes the annotations file)."""
+    with _annotations_lock:
+        entry = _annotations.setdefault(model, {})
+        entry.setdefault("annotations", {})["note"] = note
     _save_annotations(_annotations)
     logger.debug("Annotation saved for %s", model)
     return f"Note saved for {model}."
 
 
 @mcp.tool()
-def refresh_models() -> str:
+async def refresh_models(
+    refresh_id: int | None = None,
+    ctx: Context | None = None,
+) -> str:
     """Force a re-scan of all configured providers and re-fetch enrichment
     data from LMArena arena-catalog and LMArena metadata. Use this if
     model data seems stale or after adding a new provider.
+
+    The refresh runs in the background and this tool returns immediately
+    with a refresh_id. Call refresh_models again with that refresh_id to
+    check whether it has finished.
+
+    Args:
+        refresh_id: A refresh to check on. Omit to start a new refresh.
     """
-    _refresh_provider_models()
-    _fetch_enrichment()
-    cached_count = sum(len(models) for models, _ in _model_cache.values())
-    return f"Refreshed {cached_count} models across {len(_provider_registry)} providers."
+    scheduler = _get_refresh_scheduler(ctx)
+
+    if refresh_id is not None:
+        run = scheduler.get_run(refresh_id)
+        if not run:
+            return f"No refresh found with refresh_id={refresh_id}."
+        if run.status == "in_progress":
+            return f"Refresh {run.refresh_id} is still in progress (started {run.started})."
+        if run.status == "failed":
+            return f"Refresh {run.refresh_id} failed: {run.error}"
+        if run.status == "cancelled":
+            return (
+                f"Refresh {run.refresh_id} was cancelled at {run.ended} before it "
+                "finished. Call refresh_models to start a new one."
+            )
+        cached_count = sum(len(models) for models, _ in _model_cache.values())
+        result = (
+            f"Refresh {run.refresh_id} completed at {run.ended}. "
+            f"{cached_count} models across {len(_provider_registry)} providers."
+        )
+        if _response_cache is not None:
+            result += f" Response cache: {_response_cache.stats()}."
+        return result
+
+    run = scheduler.trigger(_REFRESH_SOURCES, "manual")
+    # Sources already refreshing stay with their in-flight run, which may
+    # not be the one returned.
+    elsewhere: dict[int, list[str]] = {}
+    for source in _REFRESH_SOURCES:
+        covering = scheduler.active_run(source)
+        if covering is not None and covering is not run:
+            elsewhere.setdefault(covering.refresh_id, []).append(source)
+    result = (
+        f"Refresh of {', '.join(run.sources)} running in the background "
+        f"(refresh_id={run.refresh_id}). "
+        f"Call refresh_models with refresh_id={run.refresh_id} to check progress."
+    )
+    for other_id, sources in elsewhere.items():
+        result += (
+            f" {', '.join(sources)} was already refreshing under refresh_id={other_id}"
+            " — check that refresh_id for it."
+        )
+    return result
 
 
 @mcp.tool(
@@ -1026,11 +2476,22 @@ def feedback(
 
 
 @mcp.tool()
-def completion(
+async def completion(
     model: str,
     prompt: str,
     system: str | None = None,
     temperature: float | None = None,
+    stream: bool = False,
+    race: bool = False,
+    alternates: list[str] | None = None,
+    hedge: bool | None = None,
+    timeout: float | None = None,
+    cache: bool | None = None,
+    fit_context: bool = False,
+    files: list[str] | None = None,
+    context: str | None = None,
+    route: bool | None = None,
+    ctx: Context | None = None,
 ) -> str:
     """Call a model for a quick completion. Use this for standard prompts that
     return in seconds — use start_research instead for deep research tasks
@@ -1048,134 +2509,243 @@ def completion(
         system: Optional system prompt
         temperature: Sampling temperature (0.0-2.0). Omit to use model default.
                      Some models reject non-default values — omit unless needed.
+        stream: Stream the response, forwarding partial text as progress
+                notifications (or log messages if the client sent no
+                progress token) while it is generated. The full text is
+                still returned at the end.
+        race: Send the prompt to several models at once and return the first
+              successful answer, cancelling the rest. Races against
+              `alternates` if given, otherwise against the same model on
+              other providers (e.g. openrouter/openai/gpt-5.2).
+        alternates: Models to race against `model` when race is set.
+        hedge: If the model is slower than its usual p95 latency, or fails
+               with a retryable error (429/5xx/connection), send the same
+               request to a fallback and return whichever answers first.
+               Omit to use the server default (HEDGING).
+        timeout: Seconds to wait for the model. Omit to derive it from the
+                 model's recorded latency (60s until enough calls are seen).
+        cache: Reuse a stored answer to the identical request (same model,
+               system, prompt and temperature) and store new answers.
+               Omit to cache only when temperature is 0; False to always
+               call the model.
+        fit_context: If the prompt is too long for the model's context
+                     window, switch to a larger-context alternative (the
+                     same model via another provider, or a sibling from
+                     the same family) instead of failing.
+        files: Paths of local files to include with the prompt, read
+               directly by the server. Text files (up to 10 MB each) are
+               inlined; images (.png/.jpg/.gif/.webp, up to 20 MB) are sent
+               to vision models. Use absolute paths.
+        context: Handle from register_context. The registered text is sent
+                 ahead of the system prompt as a cacheable prefix, so
+                 repeated calls with the same context are billed and
+                 processed at the provider's cached rate where supported.
+        route: Treat the same model on other providers (e.g. openai/gpt-5.2
+               and openrouter/openai/gpt-5.2) as one and pick the provider
+               for this call by health, rate-limit headroom and latency.
+               Omit to use the server default (PROVIDER_ROUTING).
     """
-    import litellm
-    from litellm.exceptions import AuthenticationError
-    from litellm.types.utils import Choices, ModelResponse
+    blob = _get_context(context) if context else None
+    attachments = None
+    if files:
+        attachments = await _run_blocking("interactive", _read_attachments, files)
+
+    async def _prepare(
+        target: str, fit: bool = False, routed: bool | None = False
+    ) -> tuple[str, dict[str, Any]]:
+        # Race contenders and hedge fallbacks name their provider explicitly,
+        # so only the primary request is routed.
+        return await _prepare_completion(
+            target, prompt, system, temperature, timeout, fit,
+            attachments=attachments, context=blob, route=routed,
+        )
+
+    full_model, kwargs = await _prepare(model, fit_context, route)
+
+    async def _complete() -> str:
+        response_cache = _response_cache
+        if response_cache is None or not (temperature == 0 if cache is None else cache):
+            _, text = await _dispatch_completion(
+                full_model, kwargs, _prepare,
+                stream=stream, race=race, alternates=alternates, hedge=hedge, ctx=ctx,
+            )
+            return text
+        key = _request_key(full_model, kwargs["messages"], temperature)
+        cached = await _run_blocking("interactive", response_cache.get, key)
+        if cached is not None:
+            logger.info("Response cache hit for %s (%s)", full_model, response_cache.stats())
+            return cached
+        answered_by, text = await _dispatch_completion(
+            full_model, kwargs, _prepare,
+            stream=stream, race=race, alternates=alternates, hedge=hedge, ctx=ctx,
+        )
+        if answered_by != full_model:
+            # A race or hedge answered from another model; the key is
+            # full_model's, so storing it would serve that answer later as
+            # if full_model had given it.
+            return text
+        try:
+            await _run_blocking("interactive", response_cache.put, key, full_model, text)
+        except OSError as exc:
+            # The answer is already paid for; a full or read-only cache
+            # directory mustn't lose it.
+            logger.warning("Could not cache response from %s: %s", full_model, exc)
+        return text
+
+    # A streaming caller wants its own partial-text notifications, so only
+    # non-streaming requests share an in-flight call.
+    if stream:
+        return await _complete()
+    # Options that change how the call behaves are part of the key, so a
+    # caller is never attached to a call with a different timeout or cache rule.
+    flight_key = _request_key(
+        full_model, kwargs["messages"], temperature, race, alternates, hedge,
+        kwargs["timeout"], cache, fit_context,
+    )
+    return await _coalesced(flight_key, _complete)
+
+
+async def _dispatch_completion(
+    full_model: str,
+    kwargs: dict[str, Any],
+    prepare: Callable[[str], Awaitable[tuple[str, dict[str, Any]]]],
+    *,
+    stream: bool,
+    race: bool,
+    alternates: list[str] | None,
+    hedge: bool | None,
+    ctx: Context | None,
+) -> tuple[str, str]:
+    """Run a prepared completion in the requested mode (plain, hedged or raced).
 
+    prepare builds the same request for another model, for hedge fallbacks
+    and race contenders. Returns (model, text): the model that answered may
+    be a fallback or contender rather than full_model.
+    """
+    if stream and hedge:
+        raise ValueError("stream and hedge cannot be combined")
+    if not race:
+        if stream or not (_hedging_enabled if hedge is None else hedge):
+            return full_model, await _run_completion(full_model, kwargs, stream=stream, ctx=ctx)
+        fallback = await _hedge_fallback(full_model, prepare)
+        if fallback is None:
+            return full_model, await _run_completion(full_model, kwargs)
+        return await _hedged_completion((full_model, kwargs), fallback)
+
+    if stream:
+        raise ValueError("stream and race cannot be combined")
+    contenders = [(full_model, kwargs)]
+    for alternate in alternates or _provider_alternatives(full_model):
+        contender = await prepare(alternate)
+        if contender[0] not in {m for m, _ in contenders}:
+            contenders.append(contender)
+    return await _race_completion(contenders)
+
+
+async def _prepare_completion(
+    model: str,
+    prompt: str,
+    system: str | None,
+    temperature: float | None,
+    timeout: float | None = None,
+    fit_context: bool = False,
+    attachments: Attachments | None = None,
+    context: ContextBlob | None = None,
+    history: list[dict[str, str]] | None = None,
+    route: bool | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """Resolve and validate a model and build the litellm.acompletion kwargs.
+
+    A registered context goes first in the system message as a cacheable
+    prefix, followed by any earlier session turns; attached files are added
+    to the user message. With route (default PROVIDER_ROUTING) the call may
+    go to the same model on another provider. The prompt is checked
+    against the model's context window; with fit_context a larger-context
+    model may be substituted.
+    """
     full_model, api_key = _resolve_model(model)
 
     if temperature is not None and not 0.0 <= temperature <= 2.0:
         raise ValueError("Temperature must be between 0.0 and 2.0")
 
     # Validate model exists in discovered models
-    provider = full_model.split("/")[0]
-    known_models = _get_models(provider)
-    if known_models and full_model not in known_models:
-        model_name = full_model.split("/", 1)[1] if "/" in full_model else full_model
-        suggestions = [
-            m for m in known_models
-            if model_name.split("-")[0] in m.lower()
-        ][:5]
-        msg = f"Model '{full_model}' not found in {provider}'s model list."
-        if suggestions:
-            msg += f" Similar models: {', '.join(suggestions)}"
-        msg += " Use search_models to find valid identifiers."
-        msg += " If this seems like a bug, call the feedback tool to report it."
-        logger.warning("Model validation failed: %s (known: %d models)", full_model, len(known_models))
-        raise ValueError(msg)
-
-    messages = []
-    if system:
-        messages.append({"role": "system", "content": system})
-    messages.append({"role": "user", "content": prompt})
+    _validate_model(full_model)
+
+    messages: list[dict[str, Any]] = []
+    system_message = _system_message(full_model, system, context)
+    if system_message:
+        messages.append(system_message)
+    messages.extend(history or [])
+    content: Any = prompt
+    if attachments is not None:
+        if attachments.text:
+            content = f"{attachments.text}\n\n{prompt}"
+        if attachments.images:
+            if not _supports_vision(full_model):
+                raise ValueError(
+                    f"{full_model} does not accept image input. Attach images only "
+                    "to vision models (search_models marks them 'image input')."
+                )
+            content = [{"type": "text", "text": content}, *attachments.images]
+    messages.append({"role": "user", "content": content})
+
+    if _provider_routing if route is None else route:
+        routed = await _choose_route(full_model, messages)
+        if routed != full_model:
+            full_model, api_key = _resolve_model(routed)
+            if context is not None:
+                messages[0] = _system_message(full_model, system, context)
+
+    fitted = await _preflight_context(full_model, messages, fit_context)
+    if fitted != full_model:
+        full_model, api_key = _resolve_model(fitted)
 
     kwargs: dict = {
         "model": full_model,
         "messages": messages,
         "api_key": api_key,
-        "timeout": 60,
+        "timeout": _adaptive_timeout(full_model, "completion", timeout),
     }
     if temperature is not None:
         kwargs["temperature"] = temperature
+    return full_model, kwargs
 
-    logger.debug("Calling litellm.completion(model=%s)", full_model)
-    try:
-        response = cast(ModelResponse, litellm.completion(**kwargs))
-    except AuthenticationError as exc:
-        _provider_errors[provider] = str(exc)
-        _provider_auth_errors.add(provider)
-        logger.warning("Auth failed for %s, provider marked unhealthy: %s", provider, exc)
-        raise
-    except Exception as exc:
-        logger.warning(
-            "litellm.completion raised for %s: %s: %s",
-            full_model, type(exc).__name__, exc,
-        )
-        raise
-    logger.debug("Completion response received from %s", full_model)
-
-    # Track usage
-    _track_usage(full_model)
-
-    choice = cast(Choices, response.choices[0])
-    return choice.message.content or ""
-
-
-@mcp.tool()
-def generate_image(
-    model: str,
-    prompt: str,
-    size: str | None = None,
-    quality: str | None = None,
-) -> list:
-    """Generate an image from a text prompt. The image is saved to disk
-    (~/Pictures/ask-another by default), opened in the system default
-    image viewer, and a preview is also returned in the tool result.
-
-    Where to view the generated image:
-    - It pops open in your system image viewer automatically. Disable
-      with OPEN_GENERATED_IMAGES=false if you don't want that.
-    - The full-resolution file is at the path shown in the "Saved to:"
-      message (open it directly for full quality).
-    - In Claude Desktop, the inline preview lives inside the collapsed
-      tool-use details — click to expand the tool call to see it. The
-      chat does not render the preview as a top-level message.
 
-    Two model types are supported — the tool picks the right path automatically:
-    - Dedicated image models (gpt-image-1, dall-e-3, imagen-4): best control
-      over size and quality.
-    - Native image-output models (gemini-*-image / "Nano Banana"): can
-      interleave text and images, good for diagrams or annotated visuals.
+async def _run_completion(
+    full_model: str,
+    kwargs: dict[str, Any],
+    *,
+    stream: bool = False,
+    ctx: Context | None = None,
+    retries: bool = True,
+) -> str:
+    """Call litellm for a prepared completion, tracking usage and auth failures.
 
-    Args:
-        model: Model to use (e.g. 'openai/gpt-image-1',
-               'gemini/gemini-2.5-flash-image'). Use search_models with
-               'image' to find available image models.
-        prompt: Text description of the image to generate.
-        size: Image dimensions. Only used by dedicated image models — ignored
-              by native image-output models. Common values: '1024x1024' (square),
-              '1536x1024' (landscape), '1024x1536' (portrait). Valid options
-              depend on the model. Omit to use the model's default.
-        quality: Image quality. Only used by dedicated image models — ignored
-                 by native image-output models. For gpt-image-1: 'low',
-                 'medium', 'high'. For dall-e-3: 'standard', 'hd'. Omit for
-                 the model's default.
+    Transient errors are retried with backoff unless retries is False (as
+    for a hedged primary, which fails over instead).
     """
     import litellm
     from litellm.exceptions import AuthenticationError
-    from litellm.types.utils import Choices, ImageResponse, ModelResponse
-
-    from mcp.types import ImageContent, TextContent
+    from litellm.types.utils import Choices, ModelResponse
 
-    full_model, api_key = _resolve_model(model)
     provider = full_model.split("/")[0]
-
-    if _is_native_image_model(full_model):
-        # Completion path with image modalities (Nano Banana, etc.)
-        kwargs: dict = {
-            "model": full_model,
-            "messages": [{"role": "user", "content": prompt}],
-            "modalities": ["image", "text"],
-            "api_key": api_key,
-            "timeout": 120,
-        }
-        logger.debug(
-            "Calling litellm.completion(model=%s, modalities=[image,text])",
-            full_model,
-        )
+    logger.debug("Calling litellm.acompletion(model=%s, stream=%s)", full_model, stream)
+    ttft: float | None = None
+    async with _throttled(full_model, kwargs["messages"]) as queue_wait:
+        started = time.monotonic()
         try:
-            response = cast(ModelResponse, litellm.completion(**kwargs))
+            policy = _COMPLETION_RETRY if retries else _NO_RETRY
+            if stream:
+                content, ttft = await _stream_completion(kwargs, ctx, policy)
+            else:
+                response = cast(ModelResponse, await _retrying(
+                    lambda: litellm.acompletion(**kwargs), policy, full_model,
+                ))
+                content = cast(Choices, response.choices[0]).message.content or ""
+                _charge_output_tokens(full_model, response)
+                details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+                if getattr(details, "cached_tokens", None):
+                    logger.debug("%s served %d prompt tokens from cache", full_model, details.cached_tokens)
         except AuthenticationError as exc:
             _provider_errors[provider] = str(exc)
             _provider_auth_errors.add(provider)
@@ -1183,70 +2753,527 @@ def generate_image(
             raise
         except Exception as exc:
             logger.warning(
-                "litellm.completion (image modalities) raised for %s: %s: %s",
+                "litellm.acompletion raised for %s: %s: %s",
                 full_model, type(exc).__name__, exc,
             )
             raise
-        logger.debug(
-            "Image completion response received from %s; choices=%d",
-            full_model, len(response.choices) if response.choices else 0,
-        )
+        latency = time.monotonic() - started
+    logger.debug("Completion response received from %s", full_model)
 
-        if not response.choices:
-            raise ValueError(
-                f"Model {full_model} returned no response choices "
-                "(likely filtered by safety policy). Try rephrasing the prompt."
-            )
+    # Track usage
+    _track_usage(full_model, ttft=ttft, latency=latency, queue_wait=queue_wait)
+    await _persist_annotations()
 
-        result_blocks: list = []
+    return content
 
-        choice = cast(Choices, response.choices[0])
-        text: str | None = choice.message.content
-        if text:
-            result_blocks.append(TextContent(type="text", text=text))
 
-        images: list = getattr(choice.message, "images", None) or []
-        if not images:
-            raise ValueError(
-                f"Model {full_model} returned no images. "
-                "Try making the image request more explicit in your prompt."
-            )
+@mcp.tool()
+async def register_context(
+    content: str | None = None,
+    files: list[str] | None = None,
+    label: str | None = None,
+) -> str:
+    """Register a large block of context once and get a handle to reuse it.
+    Pass the handle as `context` to completion instead of re-sending the
+    same document or brief each time — the server sends it as a cached
+    prefix, so repeat calls are cheaper and faster on providers with
+    prompt caching.
 
-        for img_item in images:
-            url = img_item["image_url"]["url"]
-            b64_data, mime_type = _extract_image_b64(None, url)
-            filepath = _save_image(b64_data, mime_type, prompt)
-            logger.debug("Image saved to %s (raw_b64=%d, mime=%s)", filepath, len(b64_data), mime_type)
-            opened = _open_image_externally(filepath)
-            preview_b64, preview_mime, resized = _make_inline_preview(b64_data, mime_type)
-            result_blocks.append(
-                ImageContent(type="image", data=preview_b64, mimeType=preview_mime)
-            )
-            saved_msg = f"Saved to: {filepath}"
-            if opened:
-                saved_msg += " (opened in your image viewer)"
-            if resized:
-                saved_msg += " — inline preview is downsized; open the saved file for full resolution"
-            result_blocks.append(TextContent(type="text", text=saved_msg))
+    Registering identical text again returns the same handle. Handles live
+    in server memory and are lost on restart.
 
-        try:
-            total_size = sum(len(b.model_dump_json()) for b in result_blocks)
-            logger.debug(
-                "generate_image NATIVE returning %d blocks, total JSON size=%d",
-                len(result_blocks), total_size,
+    Args:
+        content: Text to register (e.g. a long document or system brief)
+        files: Paths of local text files to register, read directly by the
+               server. Combined with content if both are given.
+        label: Optional name to identify the context in logs
+    """
+    if not content and not files:
+        raise ValueError("Provide content or files to register")
+    parts = []
+    if files:
+        attachments = await _run_blocking("interactive", _read_attachments, files)
+        if attachments.images:
+            raise ValueError(
+                "Only text can be registered as context. "
+                "Attach images to a completion with its files parameter."
             )
-        except Exception:
-            pass
+        parts.append(attachments.text)
+    if content:
+        parts.append(content)
+    blob = _register_context("\n\n".join(parts), label or "")
+    logger.info("Registered context %s (%s, %d bytes)", blob.handle, blob.label, blob.size)
+    return (
+        f"context={blob.handle} (~{len(blob.text) // 4:,} tokens). "
+        f"Pass context='{blob.handle}' to completion to reuse it."
+    )
 
-        return result_blocks
 
-    # Dedicated image generation API (gpt-image-1, dall-e-3, imagen, etc.)
-    kwargs = {
+@mcp.tool()
+async def start_session(
+    model: str,
+    system: str | None = None,
+    temperature: float | None = None,
+    context: str | None = None,
+) -> str:
+    """Start a multi-turn conversation with a model. The server keeps the
+    history, so each follow-up via continue_session sends only the new turn
+    instead of re-pasting the whole exchange into a completion prompt.
+
+    History is trimmed to half the model's context window; older turns are
+    summarised by the model and kept as a note in the system prompt.
+
+    Args:
+        model: Full model identifier or favourite shorthand. Shorthand is
+               resolved once, so the session stays on the same model.
+        system: Optional system prompt for every turn
+        temperature: Sampling temperature (0.0-2.0). Omit to use model default.
+        context: Optional handle from register_context, sent as a cached
+                 prefix on every turn
+    """
+    full_model, _ = _resolve_model(model)
+    _validate_model(full_model)
+    if temperature is not None and not 0.0 <= temperature <= 2.0:
+        raise ValueError("Temperature must be between 0.0 and 2.0")
+    if context:
+        _get_context(context)
+    session = Session(
+        session_id="sess_" + os.urandom(6).hex(),
+        model=full_model,
+        system=system,
+        temperature=temperature,
+        context=context,
+    )
+    _add_session(session)
+    logger.info("Started session %s with %s", session.session_id, full_model)
+    return (
+        f"session_id={session.session_id} with {full_model} "
+        f"(history budget ~{_history_budget(full_model):,} tokens). "
+        f"Send turns with continue_session(session_id='{session.session_id}', prompt=...)."
+    )
+
+
+@mcp.tool()
+async def continue_session(
+    session_id: str,
+    prompt: str,
+    files: list[str] | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Send the next turn of a session started with start_session and return
+    the model's reply. Earlier turns are sent by the server — include only
+    what is new.
+
+    Args:
+        session_id: Session ID returned by start_session
+        prompt: The next user message
+        files: Paths of local files to include with this turn, as for
+               completion. Text files stay in the history; images are sent
+               with this turn only.
+        timeout: Seconds to wait for the model. Omit to derive it from the
+                 model's recorded latency.
+    """
+    session = _get_session(session_id)
+    attachments = None
+    if files:
+        attachments = await _run_blocking("interactive", _read_attachments, files)
+    pending = f"{attachments.text}\n\n{prompt}" if attachments and attachments.text else prompt
+    # Turns of one session are sent in order; other sessions are unaffected.
+    async with session._lock:
+        await _trim_history(session, pending)
+        blob = _get_context(session.context) if session.context else None
+        full_model, kwargs = await _prepare_completion(
+            session.model, prompt, _session_system(session), session.temperature, timeout,
+            attachments=attachments, context=blob, history=session.turns,
+        )
+        reply = await _run_completion(full_model, kwargs)
+        session.turns.append({"role": "user", "content": pending})
+        session.turns.append({"role": "assistant", "content": reply})
+    return reply
+
+
+@mcp.tool()
+async def end_session(session_id: str) -> str:
+    """End a session and discard its history.
+
+    Args:
+        session_id: Session ID returned by start_session
+    """
+    session = _get_session(session_id)
+    del _sessions[session_id]
+    kept = len(session.turns) // 2  # a turn is a prompt and its reply
+    summarised = f", {session.summarised_turns} summarised" if session.summarised_turns else ""
+    return (
+        f"Ended session {session_id} "
+        f"({kept} turn{'' if kept == 1 else 's'} kept{summarised})."
+    )
+
+
+# Upper bound on models per fan-out call, so one request can't open dozens
+# of concurrent provider connections.
+_MAX_FANOUT = 8
+
+
+@mcp.tool()
+async def completion_many(
+    models: list[str],
+    prompt: str,
+    system: str | None = None,
+    temperature: float | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Send the same prompt to several models at once and return every answer.
+    Use this for second opinions — the calls run concurrently, so the total
+    wait is the slowest model rather than the sum of all of them.
+
+    Each model gets its own deadline; a model that times out or errors is
+    reported as such without affecting the others.
+
+    Args:
+        models: Model identifiers or favourite shorthands, as for completion
+                (at most 8).
+        prompt: The user prompt to send to every model
+        system: Optional system prompt
+        temperature: Sampling temperature (0.0-2.0). Omit to use model default.
+        timeout: Per-model deadline in seconds. Omit to derive each model's
+                 deadline from its recorded latency (60s until enough calls
+                 are seen).
+    """
+    models = list(dict.fromkeys(models))
+    if not models:
+        raise ValueError("Provide at least one model")
+    if len(models) > _MAX_FANOUT:
+        raise ValueError(f"At most {_MAX_FANOUT} models per call (got {len(models)})")
+    if timeout is not None and timeout <= 0:
+        raise ValueError("Timeout must be positive")
+
+    results: list[CompletionResult] = [CompletionResult(model=m) for m in models]
+
+    async with anyio.create_task_group() as tg:
+        for result in results:
+            tg.start_soon(_complete_one, result, prompt, system, temperature, timeout)
+
+    return _format_results(results)
+
+
+@mcp.tool()
+async def ensemble(
+    models: list[str],
+    prompt: str,
+    judge: str,
+    judge_instructions: str | None = None,
+    system: str | None = None,
+    temperature: float | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Get one synthesised answer from several models in a single call.
+    The prompt runs on every model concurrently, then a judge model merges
+    the candidate answers into the best single answer. Use completion_many
+    instead when you want to compare the answers yourself.
+
+    Returns the synthesis, then each candidate with its status and latency,
+    then the time spent in each stage.
+
+    Args:
+        models: Candidate models, as for completion (at most 8)
+        prompt: The user prompt to send to every candidate
+        judge: Model that aggregates the candidates into one answer
+        judge_instructions: Optional extra guidance for the judge (e.g.
+                            'Prefer the most conservative estimate')
+        system: Optional system prompt for the candidates
+        temperature: Sampling temperature (0.0-2.0) for the candidates.
+                     Omit to use model default.
+        timeout: Per-call deadline in seconds. Omit for the adaptive timeout.
+    """
+    models = list(dict.fromkeys(models))
+    if not models:
+        raise ValueError("Provide at least one model")
+    if len(models) > _MAX_FANOUT:
+        raise ValueError(f"At most {_MAX_FANOUT} models per call (got {len(models)})")
+    # Fail on a bad judge before spending calls on candidates.
+    judge_model, _ = _resolve_model(judge)
+    _validate_model(judge_model)
+
+    results = [CompletionResult(model=m) for m in models]
+    started = time.monotonic()
+    async with anyio.create_task_group() as tg:
+        for result in results:
+            tg.start_soon(_complete_one, result, prompt, system, temperature, timeout)
+    candidate_seconds = time.monotonic() - started
+
+    if not any(r.status == "ok" for r in results):
+        raise RuntimeError("Every candidate model failed:\n\n" + _format_results(results))
+
+    verdict = CompletionResult(model=judge_model)
+    await _complete_one(
+        verdict, _judge_prompt(prompt, results, judge_instructions), _JUDGE_SYSTEM, None, timeout,
+    )
+    if verdict.status != "ok":
+        raise RuntimeError(
+            f"Judge {judge_model} failed: {verdict.error}\n\n" + _format_results(results)
+        )
+
+    return (
+        f"{verdict.text}\n\n---\n"
+        f"Timings: candidates {candidate_seconds:.1f}s (concurrent), "
+        f"judge {judge_model} {verdict.latency:.1f}s\n\n"
+        f"# Candidates\n\n{_format_results(results)}"
+    )
+
+
+@mcp.tool()
+async def map_reduce(
+    model: str,
+    map_prompt: str,
+    reduce_prompt: str,
+    content: str | None = None,
+    files: list[str] | None = None,
+    chunk_tokens: int | None = None,
+    reduce_model: str | None = None,
+    system: str | None = None,
+    temperature: float | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Analyse input too large for one call: split it into chunks, run a
+    map prompt over every chunk concurrently, then combine the partial
+    answers with a reduce prompt. Use this for long documents instead of
+    chunking by hand and calling completion repeatedly.
+
+    Returns the reduced answer followed by per-chunk status and latency.
+
+    Args:
+        model: Model for the map calls (full ID or favourite shorthand)
+        map_prompt: Instruction applied to each chunk (e.g. 'List every
+                    deadline mentioned in this section')
+        reduce_prompt: Instruction for combining the partial answers (e.g.
+                       'Merge these lists, removing duplicates')
+        content: Text to process
+        files: Paths of local text files to process, read directly by the
+               server. Combined with content if both are given.
+        chunk_tokens: Maximum tokens per chunk. Omit to use a quarter of
+                      the model's context window (4,000 if unknown).
+        reduce_model: Model for the reduce call. Omit to use model.
+        system: Optional system prompt for every call
+        temperature: Sampling temperature (0.0-2.0). Omit to use model default.
+        timeout: Per-call deadline in seconds. Omit for the adaptive timeout.
+    """
+    if not content and not files:
+        raise ValueError("Provide content or files to process")
+    full_model, _ = _resolve_model(model)
+    _validate_model(full_model)
+    # Fail on a bad reduce model before spending calls on chunks.
+    reducer = full_model
+    if reduce_model:
+        reducer, _ = _resolve_model(reduce_model)
+        _validate_model(reducer)
+    parts = []
+    if files:
+        attachments = await _run_blocking("interactive", _read_attachments, files)
+        if attachments.images:
+            raise ValueError("map_reduce processes text only; images can't be chunked")
+        parts.append(attachments.text)
+    if content:
+        parts.append(content)
+
+    budget = _chunk_budget(full_model, chunk_tokens)
+    chunks = await _run_blocking(
+        "interactive", _split_chunks, full_model, "\n\n".join(parts), budget,
+    )
+    if len(chunks) > _MAX_CHUNKS:
+        raise ValueError(
+            f"Input splits into {len(chunks)} chunks of {budget:,} tokens; at most "
+            f"{_MAX_CHUNKS} are allowed. Raise chunk_tokens or use a larger-context model."
+        )
+
+    results = [CompletionResult(model=full_model) for _ in chunks]
+    limiter = anyio.CapacityLimiter(_MAP_CONCURRENCY)
+
+    async def _map(index: int) -> None:
+        prompt = (
+            f"{map_prompt}\n\n<chunk index=\"{index + 1}\" of=\"{len(chunks)}\">\n"
+            f"{chunks[index]}\n</chunk>"
+        )
+        async with limiter:
+            await _complete_one(results[index], prompt, system, temperature, timeout)
+
+    started = time.monotonic()
+    async with anyio.create_task_group() as tg:
+        for index in range(len(chunks)):
+            tg.start_soon(_map, index)
+    map_seconds = time.monotonic() - started
+
+    partials = [
+        f"<partial chunk=\"{index}\">\n{result.text}\n</partial>"
+        for index, result in enumerate(results, 1) if result.status == "ok"
+    ]
+    report = _format_chunk_latencies(results)
+    if not partials:
+        raise RuntimeError(f"Every map call failed:\n{report}")
+
+    started = time.monotonic()
+    reduced = CompletionResult(model=reducer)
+    await _complete_one(
+        reduced, f"{reduce_prompt}\n\n" + "\n\n".join(partials), system, temperature, timeout,
+    )
+    if reduced.status != "ok":
+        raise RuntimeError(f"Reduce call to {reduced.model} failed: {reduced.error}\n{report}")
+    reduce_seconds = time.monotonic() - started
+
+    latencies = sorted(r.latency for r in results if r.status == "ok")
+    return (
+        f"{reduced.text}\n\n---\n"
+        f"Map: {len(chunks)} chunks of ≤{budget:,} tokens with {full_model}, "
+        f"{len(partials)} ok, {map_seconds:.1f}s wall "
+        f"(median {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s per chunk)\n"
+        f"{report}\n"
+        f"Reduce: {reduced.model}, {reduce_seconds:.1f}s"
+    )
+
+
+@mcp.tool()
+async def generate_image(
+    model: str,
+    prompt: str,
+    size: str | None = None,
+    quality: str | None = None,
+    timeout: float | None = None,
+) -> list:
+    """Generate an image from a text prompt. The image is saved to disk
+    (~/Pictures/ask-another by default), opened in the system default
+    image viewer, and a preview is also returned in the tool result.
+
+    Where to view the generated image:
+    - It pops open in your system image viewer automatically. Disable
+      with OPEN_GENERATED_IMAGES=false if you don't want that.
+    - The full-resolution file is at the path shown in the "Saved to:"
+      message (open it directly for full quality).
+    - In Claude Desktop, the inline preview lives inside the collapsed
+      tool-use details — click to expand the tool call to see it. The
+      chat does not render the preview as a top-level message.
+
+    Two model types are supported — the tool picks the right path automatically:
+    - Dedicated image models (gpt-image-1, dall-e-3, imagen-4): best control
+      over size and quality.
+    - Native image-output models (gemini-*-image / "Nano Banana"): can
+      interleave text and images, good for diagrams or annotated visuals.
+
+    Args:
+        model: Model to use (e.g. 'openai/gpt-image-1',
+               'gemini/gemini-2.5-flash-image'). Use search_models with
+               'image' to find available image models.
+        prompt: Text description of the image to generate.
+        size: Image dimensions. Only used by dedicated image models — ignored
+              by native image-output models. Common values: '1024x1024' (square),
+              '1536x1024' (landscape), '1024x1536' (portrait). Valid options
+              depend on the model. Omit to use the model's default.
+        quality: Image quality. Only used by dedicated image models — ignored
+                 by native image-output models. For gpt-image-1: 'low',
+                 'medium', 'high'. For dall-e-3: 'standard', 'hd'. Omit for
+                 the model's default.
+        timeout: Seconds to wait for the image. Omit to derive it from the
+                 model's recorded latency (120s until enough calls are seen).
+    """
+    import litellm
+    from litellm.exceptions import AuthenticationError
+    from litellm.types.utils import Choices, ImageResponse, ModelResponse
+
+    from mcp.types import ImageContent, TextContent
+
+    _reject_auto(model, "an image")
+    full_model, api_key = _resolve_model(model)
+    provider = full_model.split("/")[0]
+    image_timeout = _adaptive_timeout(full_model, "image", timeout)
+    started = time.monotonic()
+
+    if _is_native_image_model(full_model):
+        # Completion path with image modalities (Nano Banana, etc.)
+        kwargs: dict = {
+            "model": full_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "modalities": ["image", "text"],
+            "api_key": api_key,
+            "timeout": image_timeout,
+        }
+        logger.debug(
+            "Calling litellm.acompletion(model=%s, modalities=[image,text])",
+            full_model,
+        )
+        try:
+            async with _throttled(full_model, kwargs["messages"]):
+                response = cast(ModelResponse, await _retrying(
+                    lambda: litellm.acompletion(**kwargs), _IMAGE_RETRY, full_model,
+                ))
+        except AuthenticationError as exc:
+            _provider_errors[provider] = str(exc)
+            _provider_auth_errors.add(provider)
+            logger.warning("Auth failed for %s, provider marked unhealthy: %s", provider, exc)
+            raise
+        except Exception as exc:
+            logger.warning(
+                "litellm.acompletion (image modalities) raised for %s: %s: %s",
+                full_model, type(exc).__name__, exc,
+            )
+            raise
+        logger.debug(
+            "Image completion response received from %s; choices=%d",
+            full_model, len(response.choices) if response.choices else 0,
+        )
+        _record_latency(full_model, time.monotonic() - started)
+        await _persist_annotations()
+
+        if not response.choices:
+            raise ValueError(
+                f"Model {full_model} returned no response choices "
+                "(likely filtered by safety policy). Try rephrasing the prompt."
+            )
+
+        result_blocks: list = []
+
+        choice = cast(Choices, response.choices[0])
+        text: str | None = choice.message.content
+        if text:
+            result_blocks.append(TextContent(type="text", text=text))
+
+        images: list = getattr(choice.message, "images", None) or []
+        if not images:
+            raise ValueError(
+                f"Model {full_model} returned no images. "
+                "Try making the image request more explicit in your prompt."
+            )
+
+        for img_item in images:
+            url = img_item["image_url"]["url"]
+            filepath, opened, preview_b64, preview_mime, resized = await _run_blocking(
+                "image", _process_image, None, url, prompt
+            )
+            result_blocks.append(
+                ImageContent(type="image", data=preview_b64, mimeType=preview_mime)
+            )
+            saved_msg = f"Saved to: {filepath}"
+            if opened:
+                saved_msg += " (opened in your image viewer)"
+            if resized:
+                saved_msg += " — inline preview is downsized; open the saved file for full resolution"
+            result_blocks.append(TextContent(type="text", text=saved_msg))
+
+        try:
+            total_size = sum(len(b.model_dump_json()) for b in result_blocks)
+            logger.debug(
+                "generate_image NATIVE returning %d blocks, total JSON size=%d",
+                len(result_blocks), total_size,
+            )
+        except Exception:
+            pass
+
+        return result_blocks
+
+    # Dedicated image generation API (gpt-image-1, dall-e-3, imagen, etc.)
+    kwargs = {
         "prompt": prompt,
         "model": full_model,
         "n": 1,
         "api_key": api_key,
-        "timeout": 120,
+        "timeout": image_timeout,
     }
     if size is not None:
         kwargs["size"] = size
@@ -1255,7 +3282,11 @@ def generate_image(
 
     logger.debug("Calling litellm.image_generation(model=%s)", full_model)
     try:
-        response = cast(ImageResponse, litellm.image_generation(**kwargs))
+        async with _throttled(full_model):
+            response = cast(ImageResponse, await _retrying(
+                lambda: _run_blocking("interactive", lambda: litellm.image_generation(**kwargs)),
+                _IMAGE_RETRY, full_model,
+            ))
     except AuthenticationError as exc:
         _provider_errors[provider] = str(exc)
         _provider_auth_errors.add(provider)
@@ -1271,17 +3302,17 @@ def generate_image(
         "Image generation response received from %s; data_count=%d",
         full_model, len(response.data) if response.data else 0,
     )
+    _record_latency(full_model, time.monotonic() - started)
+    await _persist_annotations()
 
     if not response.data:
         logger.warning("Model %s returned no image data.", full_model)
         raise ValueError(f"Model {full_model} returned no image data.")
     img_obj = response.data[0]
-    b64_data, mime_type = _extract_image_b64(
-        getattr(img_obj, "b64_json", None),
-        getattr(img_obj, "url", None),
+    filepath, opened, preview_b64, preview_mime, resized = await _run_blocking(
+        "image", _process_image,
+        getattr(img_obj, "b64_json", None), getattr(img_obj, "url", None), prompt,
     )
-    filepath = _save_image(b64_data, mime_type, prompt)
-    logger.debug("Image saved to %s", filepath)
 
     result_blocks = []
     revised = getattr(img_obj, "revised_prompt", None)
@@ -1289,8 +3320,6 @@ def generate_image(
         result_blocks.append(
             TextContent(type="text", text=f"Revised prompt: {revised}")
         )
-    opened = _open_image_externally(filepath)
-    preview_b64, preview_mime, resized = _make_inline_preview(b64_data, mime_type)
     result_blocks.append(
         ImageContent(type="image", data=preview_b64, mimeType=preview_mime)
     )
@@ -1318,11 +3347,887 @@ def _get_job_store(ctx: Context | None) -> JobStore:
     return ctx.request_context.lifespan_context["job_store"]
 
 
+def _get_refresh_scheduler(ctx: Context | None) -> RefreshScheduler:
+    """Extract the RefreshScheduler from a tool's Context."""
+    if ctx is None:
+        raise RuntimeError("Context required for refresh operations")
+    return ctx.request_context.lifespan_context["refresh_scheduler"]
+
+
 def _is_openai_research(model: str) -> bool:
     """Check if a model needs web_search_preview tools for research."""
     return model.startswith("openai/") and "deep-research" in model
 
 
+# ---------------------------------------------------------------------------
+# Retries
+# ---------------------------------------------------------------------------
+
+# HTTP statuses worth retrying on another route (rate limits, 5xx)
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Whether an error is transient — worth retrying or failing over.
+
+    Our own timeouts are not: the adaptive timeout is the budget for the
+    whole call, and retrying would multiply it.
+    """
+    from litellm.exceptions import APIConnectionError, Timeout
+
+    if isinstance(exc, (TimeoutError, Timeout)):
+        return False
+    if isinstance(exc, APIConnectionError):
+        return True
+    return getattr(exc, "status_code", None) in _RETRYABLE_STATUS
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    """Seconds the provider asked us to wait (Retry-After header), if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    """How transient model-call failures are retried.
+
+    Backoff is exponential with full jitter unless the provider sends
+    Retry-After. No retry starts once deadline seconds have passed since
+    the first attempt (or would pass during the wait).
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: float = 120.0
+
+    def next_delay(self, exc: BaseException, attempt: int, elapsed: float) -> float | None:
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt >= self.max_attempts or not _is_retryable(exc):
+            return None
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if elapsed + delay >= self.deadline:
+            return None
+        return delay
+
+
+_COMPLETION_RETRY = RetryPolicy(deadline=120)
+_IMAGE_RETRY = RetryPolicy(deadline=240)
+_RESEARCH_RETRY = RetryPolicy(deadline=1800)
+_NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+async def _retrying(call: Callable[[], Awaitable[Any]], policy: RetryPolicy, label: str) -> Any:
+    """Await call(), retrying transient failures according to policy."""
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await call()
+        except Exception as exc:
+            delay = policy.next_delay(exc, attempt, time.monotonic() - started)
+            if delay is None:
+                raise
+            logger.info(
+                "%s attempt %d failed (%s: %s); retrying in %.1fs",
+                label, attempt, type(exc).__name__, exc, delay,
+            )
+        await anyio.sleep(delay)
+
+
+def _retrying_sync(call: Callable[[], Any], policy: RetryPolicy, label: str) -> Any:
+    """Blocking counterpart of _retrying, for calls made in worker threads."""
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return call()
+        except Exception as exc:
+            delay = policy.next_delay(exc, attempt, time.monotonic() - started)
+            if delay is None:
+                raise
+            logger.info(
+                "%s attempt %d failed (%s: %s); retrying in %.1fs",
+                label, attempt, type(exc).__name__, exc, delay,
+            )
+        time.sleep(delay)
+
+
+# ---------------------------------------------------------------------------
+# File attachments
+# ---------------------------------------------------------------------------
+
+_ATTACHMENT_MAX_BYTES = 10 * 1024 * 1024  # per text file
+_IMAGE_MAX_BYTES = 20 * 1024 * 1024  # per image (common provider limit)
+_ATTACHMENTS_MAX_TOTAL = 32 * 1024 * 1024
+# Files at least this large are memory-mapped and decoded straight from the
+# mapping instead of being read into an intermediate bytes copy.
+_MMAP_THRESHOLD = 1024 * 1024
+
+_IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+@dataclass
+class Attachments:
+    """Local files read for a completion, ready to add to the user message."""
+
+    text: str = ""  # text files rendered as <file> blocks
+    images: list[dict[str, Any]] = field(default_factory=list)  # image_url parts
+
+
+def _with_file_buffer(path: Path, size: int, fn: Callable[[Any], Any]) -> Any:
+    """Call fn with the file's contents as a buffer (mmap for large files)."""
+    with open(path, "rb") as f:
+        if size and size >= _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return fn(mapped)
+        return fn(f.read())
+
+
+def _decode_text(data: Any, path: Path) -> str:
+    """Decode a text file: BOM-marked UTF-16, else UTF-8, else Windows-1252."""
+    head = data[:8192]
+    if head[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return str(data, "utf-16")
+    if b"\x00" in head:
+        raise ValueError(
+            f"{path} looks like a binary file. Only text files and images "
+            f"({', '.join(sorted(_IMAGE_MIME_TYPES))}) can be attached."
+        )
+    try:
+        return str(data, "utf-8-sig")
+    except UnicodeDecodeError:
+        return str(data, "cp1252", errors="replace")
+
+
+def _read_attachments(paths: list[str]) -> Attachments:
+    """Read local files for a completion (blocking).
+
+    Text files are inlined as <file path="..."> blocks; images become
+    base64 image_url parts. Only files under the attachment roots can be
+    read, checked after symlinks are resolved. Enforces per-file and total
+    size limits.
+    """
+    attachments = Attachments()
+    blocks = []
+    total = 0
+    roots = _attachment_roots or [Path.cwd().resolve()]
+    for raw in paths:
+        path = Path(raw).expanduser().resolve()
+        if not any(path.is_relative_to(root) for root in roots):
+            raise ValueError(
+                f"{raw} is outside the directories attachments may be read from "
+                f"({', '.join(str(root) for root in roots)}). Set ATTACHMENT_ROOTS to allow others."
+            )
+        if not path.is_file():
+            raise ValueError(f"Attachment not found or not a file: {raw}")
+        size = path.stat().st_size
+        mime = _IMAGE_MIME_TYPES.get(path.suffix.lower())
+        limit = _IMAGE_MAX_BYTES if mime else _ATTACHMENT_MAX_BYTES
+        if size > limit:
+            raise ValueError(
+                f"{raw} is {size / 1024 / 1024:.1f} MB; the limit is "
+                f"{limit // 1024 // 1024} MB per {'image' if mime else 'text file'}."
+            )
+        total += size
+        if total > _ATTACHMENTS_MAX_TOTAL:
+            raise ValueError(
+                f"Attachments exceed {_ATTACHMENTS_MAX_TOTAL // 1024 // 1024} MB in total."
+            )
+        if mime:
+            encoded = _with_file_buffer(path, size, lambda data: base64.b64encode(data).decode())
+            attachments.images.append(
+                {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{encoded}"}}
+            )
+        else:
+            text = _with_file_buffer(path, size, lambda data: _decode_text(data, path))
+            blocks.append(f'<file path="{path}">\n{text}\n</file>')
+    attachments.text = "\n\n".join(blocks)
+    logger.debug(
+        "Read %d attachment(s): %d text, %d image, %d bytes",
+        len(paths), len(blocks), len(attachments.images), total,
+    )
+    return attachments
+
+
+def _supports_vision(full_model: str) -> bool:
+    """Whether a model accepts image input.
+
+    Uses recorded modalities, then litellm's model map; models neither
+    knows about are given the benefit of the doubt.
+    """
+    modalities = _annotations.get(full_model, {}).get("metadata", {}).get("modalities")
+    if modalities is not None:
+        return "image" in modalities
+    if not _litellm_model_metadata(full_model):
+        return True
+    import litellm
+
+    return litellm.supports_vision(model=full_model)
+
+
+# ---------------------------------------------------------------------------
+# Context handles
+# ---------------------------------------------------------------------------
+
+# Registered context blobs are kept in memory up to this many bytes in
+# total; the least recently used are dropped beyond that.
+_CONTEXT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class ContextBlob:
+    """A registered block of context that completions can reference by handle."""
+
+    handle: str
+    text: str
+    label: str = ""
+    size: int = 0
+
+
+# Registered contexts by handle, least recently used first
+_contexts: OrderedDict[str, ContextBlob] = OrderedDict()
+
+
+def _register_context(text: str, label: str = "") -> ContextBlob:
+    """Store a context blob under a content-derived handle.
+
+    Registering identical text again returns the existing handle, so the
+    handle (and the provider-side cached prefix) stays stable.
+    """
+    handle = "ctx_" + hashlib.sha256(text.encode()).hexdigest()[:12]
+    blob = _contexts.get(handle)
+    if blob is None:
+        blob = ContextBlob(handle=handle, text=text, label=label, size=len(text.encode()))
+        _contexts[handle] = blob
+    _contexts.move_to_end(handle)
+    total = sum(b.size for b in _contexts.values())
+    while total > _CONTEXT_MAX_BYTES and len(_contexts) > 1:
+        _, evicted = _contexts.popitem(last=False)
+        total -= evicted.size
+        logger.info("Evicted context %s (%d bytes)", evicted.handle, evicted.size)
+    return blob
+
+
+def _get_context(handle: str) -> ContextBlob:
+    """Look up a registered context, raising a helpful error if unknown."""
+    blob = _contexts.get(handle)
+    if blob is None:
+        raise ValueError(
+            f"Unknown context handle '{handle}'. Handles are kept in memory "
+            "and are lost when the server restarts — call register_context again."
+        )
+    _contexts.move_to_end(handle)
+    return blob
+
+
+def _supports_prompt_caching(full_model: str) -> bool:
+    """Whether litellm knows the model supports provider prompt caching."""
+    import litellm
+
+    try:
+        return litellm.utils.supports_prompt_caching(model=full_model)
+    except Exception:
+        return False
+
+
+def _system_message(
+    full_model: str, system: str | None, context: ContextBlob | None
+) -> dict[str, Any] | None:
+    """Build the system message, putting any context first as a cacheable prefix.
+
+    Where supported the context block is marked with cache_control so the
+    provider caches it; litellm drops the marker for providers (like
+    OpenAI) that cache long prefixes automatically.
+    """
+    if context is None:
+        return {"role": "system", "content": system} if system else None
+    block: dict[str, Any] = {"type": "text", "text": context.text}
+    if _supports_prompt_caching(full_model):
+        block["cache_control"] = {"type": "ephemeral"}
+    content = [block]
+    if system:
+        content.append({"type": "text", "text": system})
+    return {"role": "system", "content": content}
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+# A session's history is trimmed to this share of the model's context
+# window, leaving the rest for the new turn and the reply.
+_HISTORY_FRACTION = 0.5
+
+# History budget (tokens) for models without a known context_length
+_DEFAULT_HISTORY_TOKENS = 16_000
+
+# Sessions kept in memory; the least recently used are dropped beyond this.
+_MAX_SESSIONS = 50
+
+_SUMMARY_SYSTEM = (
+    "Summarise the conversation you are given so it can replace the original "
+    "turns. Keep facts, decisions, names, numbers and open questions; drop "
+    "pleasantries. Reply with the summary only."
+)
+
+
+@dataclass
+class Session:
+    """A multi-turn conversation whose history is kept server-side."""
+
+    session_id: str
+    model: str
+    system: str | None = None
+    temperature: float | None = None
+    context: str | None = None  # register_context handle
+    turns: list[dict[str, str]] = field(default_factory=list)
+    summary: str = ""
+    summarised_turns: int = 0  # prompt/reply pairs folded into the summary
+    _lock: anyio.Lock = field(default_factory=anyio.Lock, repr=False)
+
+
+# Open sessions by id, least recently used first
+_sessions: OrderedDict[str, Session] = OrderedDict()
+
+
+def _add_session(session: Session) -> None:
+    """Store a new session, dropping the least recently used beyond the cap."""
+    _sessions[session.session_id] = session
+    while len(_sessions) > _MAX_SESSIONS:
+        _, evicted = _sessions.popitem(last=False)
+        logger.info("Evicted session %s (%d turns)", evicted.session_id, len(evicted.turns))
+
+
+def _get_session(session_id: str) -> Session:
+    """Look up an open session, raising a helpful error if unknown."""
+    session = _sessions.get(session_id)
+    if session is None:
+        raise ValueError(
+            f"Unknown session '{session_id}'. Sessions are kept in memory and "
+            "are lost when the server restarts — call start_session again."
+        )
+    _sessions.move_to_end(session_id)
+    return session
+
+
+def _history_budget(full_model: str) -> int:
+    """Tokens of system prompt, history and new turn a session may send."""
+    limit = _context_length(full_model)
+    return int(limit * _HISTORY_FRACTION) if limit else _DEFAULT_HISTORY_TOKENS
+
+
+def _session_system(session: Session) -> str | None:
+    """The session's system prompt with any summary of dropped turns appended."""
+    if not session.summary:
+        return session.system
+    note = f"Summary of the earlier conversation:\n{session.summary}"
+    return f"{session.system}\n\n{note}" if session.system else note
+
+
+async def _trim_history(session: Session, pending: str) -> None:
+    """Drop the oldest turns until the next request fits the history budget.
+
+    Dropped turns are summarised by the session's model into a note that
+    rides along in the system prompt. If summarising fails the turns are
+    simply dropped and the previous summary is kept.
+    """
+    budget = _history_budget(session.model)
+    # Count each prompt/reply pair once, then drop from the front until the
+    # rest fits, rather than re-counting the whole history per dropped pair.
+    total = _estimate_tokens(session.model, [
+        {"role": "system", "content": _session_system(session) or ""},
+        {"role": "user", "content": pending},
+    ])
+    pairs = [session.turns[i:i + 2] for i in range(0, len(session.turns), 2)]
+    costs = [_estimate_tokens(session.model, pair) for pair in pairs]
+    total += sum(costs)
+    drop = 0
+    while drop < len(pairs) and total > budget:
+        total -= costs[drop]
+        drop += 1
+    if not drop:
+        return
+    dropped = session.turns[:drop * 2]
+    del session.turns[:drop * 2]
+    transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in dropped)
+    if session.summary:
+        transcript = f"Summary so far:\n{session.summary}\n\n{transcript}"
+    try:
+        full_model, kwargs = await _prepare_completion(
+            session.model, transcript, _SUMMARY_SYSTEM, None
+        )
+        session.summary = await _run_completion(full_model, kwargs)
+    except Exception as exc:
+        logger.warning(
+            "Could not summarise session %s; dropped %d turns: %s",
+            session.session_id, drop, exc,
+        )
+        return
+    session.summarised_turns += drop
+    logger.info(
+        "Session %s: folded %d turns into the summary to fit %d tokens",
+        session.session_id, drop, budget,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+# Partial text is batched so a fast model doesn't emit one notification per
+# token: flush whenever this much time has passed or this much text is queued.
+_STREAM_FLUSH_SECONDS = 0.25
+_STREAM_FLUSH_CHARS = 200
+
+# Progress notifications only carry a message in newer mcp releases; with an
+# older one, partial text is sent as log messages instead.
+_PROGRESS_MESSAGES = "message" in inspect.signature(Context.report_progress).parameters
+
+
+async def _send_partial(ctx: Context | None, text: str, received: int) -> None:
+    """Forward a batch of streamed text to the client.
+
+    Uses a progress notification (progress = characters received so far)
+    when the client asked for progress and mcp supports progress messages,
+    otherwise an info log message.
+    """
+    if ctx is None:
+        return
+    meta = ctx.request_context.meta
+    if _PROGRESS_MESSAGES and meta is not None and meta.progressToken is not None:
+        await ctx.report_progress(received, message=text)
+    else:
+        await ctx.info(text)
+
+
+async def _stream_completion(
+    kwargs: dict[str, Any], ctx: Context | None, policy: RetryPolicy = _NO_RETRY
+) -> tuple[str, float | None]:
+    """Run a streaming litellm completion, forwarding partial text via ctx.
+
+    Opening the stream is retried per policy; once text has been forwarded
+    a failure is raised as-is. Returns the full response text and the
+    time-to-first-token in seconds (None if the model produced no content).
+    """
+    import litellm
+
+    started = time.monotonic()
+    ttft: float | None = None
+    parts: list[str] = []
+    pending: list[str] = []
+    pending_chars = 0
+    received = 0
+    last_flush = started
+
+    stream = await _retrying(
+        lambda: litellm.acompletion(**kwargs, stream=True), policy, kwargs["model"],
+    )
+    async for chunk in stream:  # type: ignore[union-attr]
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        now = time.monotonic()
+        if ttft is None:
+            ttft = now - started
+        parts.append(delta)
+        pending.append(delta)
+        pending_chars += len(delta)
+        received += len(delta)
+        if now - last_flush >= _STREAM_FLUSH_SECONDS or pending_chars >= _STREAM_FLUSH_CHARS:
+            await _send_partial(ctx, "".join(pending), received)
+            pending.clear()
+            pending_chars = 0
+            last_flush = now
+    if pending:
+        await _send_partial(ctx, "".join(pending), received)
+
+    return "".join(parts), ttft
+
+
+# ---------------------------------------------------------------------------
+# Request coalescing
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class InFlight:
+    """A request being executed on behalf of every identical caller."""
+
+    done: anyio.Event
+    result: str | None = None
+    error: Exception | None = None
+
+
+# In-flight requests by request key; entries live only while the call runs
+_in_flight: dict[str, InFlight] = {}
+
+
+async def _coalesced(key: str, call: Callable[[], Awaitable[str]]) -> str:
+    """Run call() once for all concurrent callers with the same key.
+
+    The first caller leads and makes the call; later callers wait for its
+    result or error. If the leader is cancelled, a waiting caller takes
+    over and makes the call itself.
+    """
+    while (flight := _in_flight.get(key)) is not None:
+        logger.debug("Coalescing onto in-flight request")
+        await flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        if flight.result is not None:
+            return flight.result
+
+    flight = InFlight(done=anyio.Event())
+    _in_flight[key] = flight
+    try:
+        flight.result = await call()
+        return flight.result
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        del _in_flight[key]
+        flight.done.set()
+
+
+# ---------------------------------------------------------------------------
+# Multi-model completion
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class CompletionResult:
+    """Outcome of one model's completion within a multi-model call."""
+
+    model: str
+    status: str = "pending"  # pending | ok | timeout | error
+    text: str = ""
+    error: str = ""
+    latency: float = 0.0
+
+
+async def _complete_one(
+    result: CompletionResult,
+    prompt: str,
+    system: str | None,
+    temperature: float | None,
+    timeout: float | None,
+) -> None:
+    """Run one completion under a deadline, recording the outcome in result.
+
+    Never raises (other than cancellation), so a failing model can't tear
+    down the task group its siblings run in.
+    """
+    from litellm.exceptions import Timeout
+
+    started = time.monotonic()
+    deadline = timeout
+    try:
+        full_model, kwargs = await _prepare_completion(
+            result.model, prompt, system, temperature, timeout,
+        )
+        result.model = full_model
+        deadline = kwargs["timeout"]
+        with anyio.fail_after(deadline):
+            result.text = await _run_completion(full_model, kwargs)
+        result.status = "ok"
+    except (TimeoutError, Timeout):
+        result.status = "timeout"
+        result.error = f"no response within {deadline:g}s"
+    except Exception as exc:
+        result.status = "error"
+        result.error = f"{type(exc).__name__}: {exc}"
+    result.latency = time.monotonic() - started
+
+
+async def _race_completion(contenders: list[tuple[str, dict[str, Any]]]) -> tuple[str, str]:
+    """Run prepared completions concurrently and return the first success.
+
+    Returns (model, text) for the winner. The remaining calls are cancelled
+    as soon as one model answers. The
+    winner's ``race_wins`` usage counter is incremented so routing can
+    prefer models that tend to answer first.
+    """
+    if len(contenders) == 1:
+        return contenders[0][0], await _run_completion(*contenders[0])
+
+    winner: tuple[str, str] | None = None
+    failures: list[str] = []
+
+    async def _contend(full_model: str, kwargs: dict[str, Any]) -> None:
+        nonlocal winner
+        try:
+            text = await _run_completion(full_model, kwargs)
+        except Exception as exc:
+            failures.append(f"{full_model}: {type(exc).__name__}: {exc}")
+            return
+        if winner is None:
+            winner = (full_model, text)
+            tg.cancel_scope.cancel()
+
+    async with anyio.create_task_group() as tg:
+        for full_model, kwargs in contenders:
+            tg.start_soon(_contend, full_model, kwargs)
+
+    if winner is None:
+        raise RuntimeError("Every raced model failed: " + "; ".join(failures))
+    full_model, text = winner
+    with _annotations_lock:
+        usage = _annotations.setdefault(full_model, {}).setdefault("usage", {})
+        usage["race_wins"] = usage.get("race_wins", 0) + 1
+    await _persist_annotations()
+    logger.info("Race won by %s against %d other model(s)", full_model, len(contenders) - 1)
+    return full_model, text
+
+
+_JUDGE_SYSTEM = (
+    "You are given a question and candidate answers from different models. "
+    "Write the single best answer: keep what the candidates get right, "
+    "resolve their disagreements on the merits, and drop errors. Reply with "
+    "the answer only, without referring to the candidates."
+)
+
+
+def _judge_prompt(
+    prompt: str, results: list[CompletionResult], instructions: str | None
+) -> str:
+    """Build the aggregator prompt from the question and successful candidates.
+
+    Candidates are labelled by letter rather than model name so the judge
+    weighs the answers, not the brands.
+    """
+    answers = [r for r in results if r.status == "ok"]
+    parts = [f"<question>\n{prompt}\n</question>"]
+    for letter, result in zip("ABCDEFGH", answers):
+        parts.append(f"<candidate id=\"{letter}\">\n{result.text}\n</candidate>")
+    if instructions:
+        parts.append(instructions)
+    return "\n\n".join(parts)
+
+
+def _format_results(results: list[CompletionResult]) -> str:
+    """Render multi-model results as one section per model."""
+    sections = []
+    for result in results:
+        header = f"## {result.model} — {result.status} ({result.latency:.1f}s)"
+        body = result.text if result.status == "ok" else result.error
+        sections.append(f"{header}\n\n{body}")
+    return "\n\n".join(sections)
+
+
+# ---------------------------------------------------------------------------
+# Map-reduce
+# ---------------------------------------------------------------------------
+
+# Chunk size (tokens) when the model's context_length is unknown; with a
+# known window chunks default to a quarter of it, up to the maximum.
+_DEFAULT_CHUNK_TOKENS = 4_000
+_MAX_CHUNK_TOKENS = 32_000
+
+# Upper bounds on chunks per call and on map calls in flight at once.
+# Provider rate limits (RATE_LIMITS) still apply to every call.
+_MAX_CHUNKS = 64
+_MAP_CONCURRENCY = 8
+
+
+def _chunk_budget(full_model: str, requested: int | None) -> int:
+    """Tokens per chunk: the requested size, else derived from the context window."""
+    if requested is not None:
+        if requested < 100:
+            raise ValueError("chunk_tokens must be at least 100")
+        return requested
+    limit = _context_length(full_model)
+    if not limit:
+        return _DEFAULT_CHUNK_TOKENS
+    return min(_MAX_CHUNK_TOKENS, limit // 4)
+
+
+def _text_tokens(full_model: str, text: str) -> int:
+    """Token count of a plain text string for the model."""
+    return _estimate_tokens(full_model, [{"role": "user", "content": text}])
+
+
+def _slice_to_fit(full_model: str, piece: str, budget: int) -> list[str]:
+    """Cut text into consecutive slices of at most budget tokens.
+
+    Slices start at about 4 characters per token and are narrowed until
+    they fit, so dense text (CJK, base64, long identifiers) is cut finer.
+    """
+    slices: list[str] = []
+    width = budget * 4
+    start = 0
+    while start < len(piece):
+        part = piece[start:start + width]
+        tokens = _text_tokens(full_model, part)
+        while tokens > budget and width > 1:
+            width = max(1, min(width // 2, width * budget // tokens))
+            part = piece[start:start + width]
+            tokens = _text_tokens(full_model, part)
+        slices.append(part)
+        start += len(part)
+    return slices
+
+
+def _pack(full_model: str, pieces: list[str], budget: int, separator: str) -> list[str]:
+    """Greedily join pieces into chunks of at most budget tokens.
+
+    A piece that is too large on its own is split on lines, then on
+    characters as a last resort.
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    used = 0
+    for piece in pieces:
+        tokens = _text_tokens(full_model, piece)
+        if tokens > budget and len(piece) > 1:
+            if "\n" in piece.strip():
+                smaller = piece.split("\n")
+                sep = "\n"
+            else:
+                smaller = _slice_to_fit(full_model, piece, budget)
+                sep = ""
+            if current:
+                chunks.append(separator.join(current))
+                current, used = [], 0
+            chunks.extend(_pack(full_model, smaller, budget, sep))
+            continue
+        if current and used + tokens > budget:
+            chunks.append(separator.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _split_chunks(full_model: str, text: str, budget: int) -> list[str]:
+    """Split text into chunks of at most budget tokens on paragraph boundaries."""
+    paragraphs = [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+    return _pack(full_model, paragraphs, budget, "\n\n")
+
+
+def _format_chunk_latencies(results: list[CompletionResult]) -> str:
+    """One line per map call with its status and latency."""
+    lines = []
+    for index, result in enumerate(results, 1):
+        line = f"- chunk {index} — {result.status} ({result.latency:.1f}s)"
+        if result.status != "ok":
+            line += f": {result.error}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# Hedging and failover
+# ---------------------------------------------------------------------------
+
+# Hedge delay used until a model has enough recorded latencies for a p95
+_DEFAULT_HEDGE_DELAY = 15.0
+
+
+async def _hedge_fallback(
+    full_model: str, prepare: Callable[[str], Awaitable[tuple[str, dict[str, Any]]]]
+) -> tuple[str, dict[str, Any]] | None:
+    """Prepare the fallback request for a hedged completion.
+
+    A configured alternate (HEDGE_ALTERNATES) wins; otherwise the same model
+    via another provider. Returns None if there is nothing usable to hedge to.
+    """
+    candidates = _provider_alternatives(full_model)
+    if full_model in _hedge_alternates:
+        candidates.insert(0, _hedge_alternates[full_model])
+    for candidate in candidates:
+        try:
+            return await prepare(candidate)
+        except ValueError as exc:
+            logger.warning("Hedge fallback %s for %s unusable: %s", candidate, full_model, exc)
+    return None
+
+
+async def _hedged_completion(
+    primary: tuple[str, dict[str, Any]], fallback: tuple[str, dict[str, Any]]
+) -> tuple[str, str]:
+    """Run the primary request, hedging to the fallback when it lags or fails.
+
+    The fallback starts once the primary has taken longer than its recorded
+    p95 latency, or immediately if the primary fails with a retryable error.
+    The first success wins and the other call is cancelled; returns
+    (model, text) for it. Non-retryable primary errors are raised as-is.
+    """
+    primary_model = primary[0]
+    delay = _latency_percentile(primary_model, 95) or _DEFAULT_HEDGE_DELAY
+    primary_failed = anyio.Event()
+    winner: tuple[str, str] | None = None
+    hedged = False
+    errors: dict[str, Exception] = {}
+
+    async def _attempt(full_model: str, kwargs: dict[str, Any], retries: bool = True) -> None:
+        nonlocal winner
+        try:
+            text = await _run_completion(full_model, kwargs, retries=retries)
+        except Exception as exc:
+            errors[full_model] = exc
+            if full_model == primary_model:
+                if _is_retryable(exc):
+                    primary_failed.set()
+                elif not hedged:
+                    tg.cancel_scope.cancel()
+            return
+        if winner is None:
+            winner = (full_model, text)
+            tg.cancel_scope.cancel()
+
+    async def _hedge() -> None:
+        nonlocal hedged
+        with anyio.move_on_after(delay):
+            await primary_failed.wait()
+        hedged = True
+        reason = "failed" if primary_failed.is_set() else f"exceeded {delay:.1f}s"
+        logger.info("Primary %s %s, hedging to %s", primary_model, reason, fallback[0])
+        await _attempt(*fallback)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_attempt, *primary, False)
+        tg.start_soon(_hedge)
+
+    if winner is not None:
+        if winner[0] != primary_model:
+            logger.info("Hedged request for %s answered by %s", primary_model, winner[0])
+        return winner
+    raise errors.get(primary_model) or errors[fallback[0]]
+
+
 # ---------------------------------------------------------------------------
 # Image generation helpers
 # ---------------------------------------------------------------------------
@@ -1446,6 +4351,23 @@ def _make_inline_preview(b64_data: str, mime_type: str) -> tuple[str, str, bool]
     return out_b64, "image/jpeg", True
 
 
+def _process_image(
+    b64_json: str | None,
+    url: str | None,
+    prompt: str,
+) -> tuple[Path, bool, str, str, bool]:
+    """Decode, save, open and preview one generated image (blocking).
+
+    Returns (filepath, opened, preview_b64, preview_mime, resized).
+    """
+    b64_data, mime_type = _extract_image_b64(b64_json, url)
+    filepath = _save_image(b64_data, mime_type, prompt)
+    logger.debug("Image saved to %s (raw_b64=%d, mime=%s)", filepath, len(b64_data), mime_type)
+    opened = _open_image_externally(filepath)
+    preview_b64, preview_mime, resized = _make_inline_preview(b64_data, mime_type)
+    return filepath, opened, preview_b64, preview_mime, resized
+
+
 def _save_image(b64_data: str, mime_type: str, prompt: str) -> Path:
     """Save base64 image data to disk and return the file path.
 
@@ -1530,7 +4452,7 @@ def _run_research_completion_sync(job: ResearchJob, api_key: str) -> None:
         "model": job.model,
         "messages": [{"role": "user", "content": job.query}],
         "api_key": api_key,
-        "timeout": 1800,
+        "timeout": _adaptive_timeout(job.model, "research", job.model_timeout),
     }
 
     # OpenAI deep research models need web_search_preview tool
@@ -1538,12 +4460,17 @@ def _run_research_completion_sync(job: ResearchJob, api_key: str) -> None:
         kwargs["tools"] = [{"type": "web_search_preview"}]
 
     logger.info("Research job %d starting: model=%s", job.job_id, job.model)
+    started = time.monotonic()
     try:
-        response = cast(ModelResponse, litellm.completion(**kwargs))
+        response = cast(ModelResponse, _retrying_sync(
+            lambda: litellm.completion(**kwargs), _RESEARCH_RETRY, f"Research job {job.job_id}",
+        ))
         choice = cast(Choices, response.choices[0])
         job.result = choice.message.content
         job.citations = getattr(response, "citations", []) or []
         job.status = "completed"
+        _record_latency(job.model, time.monotonic() - started)
+        _save_annotations(_annotations)
         logger.info("Research job %d completed", job.job_id)
     except AuthenticationError as exc:
         provider = job.model.split("/")[0]
@@ -1561,8 +4488,9 @@ def _run_research_completion_sync(job: ResearchJob, api_key: str) -> None:
 
 
 async def _run_research_completion(job: ResearchJob, api_key: str) -> None:
-    """Run the blocking completion in a thread to avoid blocking the event loop."""
-    await anyio.to_thread.run_sync(lambda: _run_research_completion_sync(job, api_key))
+    """Run the blocking completion in a research worker thread."""
+    async with _throttled(job.model, [{"role": "user", "content": job.query}]):
+        await _run_blocking("research", _run_research_completion_sync, job, api_key)
 
 
 def _run_research_gemini_sync(job: ResearchJob, api_key: str) -> None:
@@ -1628,8 +4556,9 @@ def _run_research_gemini_sync(job: ResearchJob, api_key: str) -> None:
 
 
 async def _run_research_gemini(job: ResearchJob, api_key: str) -> None:
-    """Run the Gemini Interactions API polling in a thread."""
-    await anyio.to_thread.run_sync(lambda: _run_research_gemini_sync(job, api_key))
+    """Run the Gemini Interactions API polling in a research worker thread."""
+    async with _throttled(job.model):
+        await _run_blocking("research", _run_research_gemini_sync, job, api_key)
 
 
 def _is_gemini_deep_research(model: str) -> bool:
@@ -1642,6 +4571,7 @@ async def start_research(
     model: str,
     query: str,
     timeout: int = 300,
+    model_timeout: float | None = None,
     ctx: Context | None = None,
 ) -> str:
     """Start a deep research task. This submits a research query to a model
@@ -1658,10 +4588,18 @@ async def start_research(
         query: The research question or topic to investigate.
         timeout: Max seconds to wait for results (default 300). If exceeded,
                  the task continues in the background.
+        model_timeout: Max seconds the research call itself may run before
+                       it is abandoned. Omit to derive it from the model's
+                       past research durations (30 minutes until enough are
+                       recorded).
     """
+    _reject_auto(model, "a research")
     full_model, api_key = _resolve_model(model)
+    if model_timeout is not None and model_timeout <= 0:
+        raise ValueError("model_timeout must be positive")
     job_store = _get_job_store(ctx)
     job = job_store.create_job(model=full_model, query=query)
+    job.model_timeout = model_timeout
 
     # Pick the right research path
     if _is_gemini_deep_research(full_model):
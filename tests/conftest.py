@@ -2,9 +2,73 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Callable, Iterable
+
+import pytest
+
+import ask_another.server as server
 
 
 def pytest_configure(config) -> None:  # noqa: ANN001 — pytest plugin signature
     """Disable image-viewer opening during tests so generate_image flows
     don't actually launch Preview / xdg-open during unit runs."""
     os.environ.setdefault("OPEN_GENERATED_IMAGES", "false")
+
+
+@pytest.fixture(autouse=True)
+def _isolated_annotations(request, monkeypatch, tmp_path) -> None:  # noqa: ANN001
+    """Keep unit tests away from the real annotations file.
+
+    Calls record latency and usage, which saves annotations; without this a
+    test run would write fake entries into ~/.ask-another-annotations.json.
+    Live integration tests keep their session-wide configuration.
+    """
+    if request.node.get_closest_marker("integration"):
+        return
+    monkeypatch.setenv("ANNOTATIONS_FILE", str(tmp_path / "annotations.json"))
+    monkeypatch.setattr(server, "_annotations", {})
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Run async tests on asyncio only — FastMCP serves on asyncio."""
+    return "asyncio"
+
+
+class FakeLlmResponse:
+    """Mock for litellm.acompletion responses."""
+
+    def __init__(self, content: str = "ok") -> None:
+        message = type("Message", (), {"content": content})()
+        self.choices = [type("Choice", (), {"message": message})()]
+
+
+@pytest.fixture
+def llm_response() -> type[FakeLlmResponse]:
+    """The fake response class, for tests that stub litellm.acompletion."""
+    return FakeLlmResponse
+
+
+@pytest.fixture
+def provider_catalog(monkeypatch) -> Callable[..., None]:  # noqa: ANN001
+    """Install providers and their discovered models without the network.
+
+    Returns install(keys, models, annotations=None): keys maps each provider
+    to its API key, and models (full IDs) become the providers' catalogs.
+    Annotations start empty unless given.
+    """
+    monkeypatch.setattr(server, "_invalid_models", {})
+
+    def _install(
+        keys: dict[str, str],
+        models: Iterable[str],
+        annotations: dict | None = None,
+    ) -> None:
+        catalog: dict[str, set[str]] = {}
+        for model_id in models:
+            catalog.setdefault(model_id.split("/")[0], set()).add(model_id)
+        monkeypatch.setattr(server, "_provider_registry", keys)
+        monkeypatch.setattr(server, "_catalog", catalog)
+        monkeypatch.setattr(server, "_annotations", annotations or {})
+
+    return _install
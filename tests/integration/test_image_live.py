@@ -34,9 +34,10 @@ def _assert_image_block(blocks: list, tmp_dir: Path) -> None:
     assert saved[0].stat().st_size > 0, "Saved image file is empty"
 
 
-def test_generate_image_dedicated_path(openai_key: str, image_tmp_dir: Path) -> None:
+@pytest.mark.anyio
+async def test_generate_image_dedicated_path(openai_key: str, image_tmp_dir: Path) -> None:
     """gpt-image-1 routes through litellm.image_generation()."""
-    blocks = server.generate_image(
+    blocks = await server.generate_image(
         model="openai/gpt-image-1",
         prompt="a single red dot on white background, minimal",
         size="1024x1024",
@@ -45,9 +46,10 @@ def test_generate_image_dedicated_path(openai_key: str, image_tmp_dir: Path) ->
     _assert_image_block(blocks, image_tmp_dir)
 
 
-def test_generate_image_native_path(gemini_key: str, image_tmp_dir: Path) -> None:
-    """gemini-2.5-flash-image routes through litellm.completion(modalities=...)."""
-    blocks = server.generate_image(
+@pytest.mark.anyio
+async def test_generate_image_native_path(gemini_key: str, image_tmp_dir: Path) -> None:
+    """gemini-2.5-flash-image routes through litellm.acompletion(modalities=...)."""
+    blocks = await server.generate_image(
         model="gemini/gemini-2.5-flash-image",
         prompt="a single red dot on white background, minimal",
     )
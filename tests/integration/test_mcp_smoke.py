@@ -77,6 +77,13 @@ async def test_server_registers_all_tools(tmp_path: Path) -> None:
         "search_families",
         "search_models",
         "completion",
+        "completion_many",
+        "register_context",
+        "map_reduce",
+        "ensemble",
+        "start_session",
+        "continue_session",
+        "end_session",
         "annotate_models",
         "refresh_models",
         "feedback",
@@ -44,8 +44,9 @@ def test_no_provider_errors_after_clean_refresh(configured_providers: list[str])
     assert not unhealthy, f"Providers unhealthy after refresh: {unhealthy}"
 
 
+@pytest.mark.anyio
 @pytest.mark.parametrize("provider", ["openai", "gemini", "openrouter"])
-def test_completion_returns_text(provider: str, request: pytest.FixtureRequest) -> None:
+async def test_completion_returns_text(provider: str, request: pytest.FixtureRequest) -> None:
     """A minimal completion returns non-empty text.
 
     Don't pass temperature — gpt-5 family rejects anything other than 1, and
@@ -53,7 +54,7 @@ def test_completion_returns_text(provider: str, request: pytest.FixtureRequest)
     """
     request.getfixturevalue(f"{provider}_key")
     model = CHEAP_MODEL[provider]
-    out = server.completion(
+    out = await server.completion(
         model=model,
         prompt="Reply with exactly the word: pong",
     )
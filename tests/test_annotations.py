@@ -28,7 +28,7 @@ class _FakeChoice:
 
 
 class FakeLlmResponse:
-    """Mock for litellm.completion responses."""
+    """Mock for litellm.acompletion responses."""
     choices = [_FakeChoice()]
 
 
@@ -72,29 +72,92 @@ def test_save_annotations(tmp_path, monkeypatch):
     assert loaded == data
 
 
-def test_completion_tracks_usage(tmp_path, monkeypatch):
+def test_record_latency_is_memory_only_and_thread_safe(tmp_path, monkeypatch):
+    """Latency samples from research/image threads update memory under the
+    annotations lock; persisting is left to the caller."""
+    import threading
+
+    ann_file = tmp_path / "annotations.json"
+    monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_annotations", {})
+
+    def _worker(n):
+        for i in range(40):
+            server._record_latency(f"openai/model-{n}", float(i))
+            server._save_annotations(server._annotations)
+
+    threads = [threading.Thread(target=_worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    saved = json.loads(ann_file.read_text())
+    assert saved["openai/model-0"]["usage"]["latencies"][-1] == 39.0
+
+    ann_file.unlink()
+    server._record_latency("openai/model-0", 1.0)
+    assert not ann_file.exists()
+
+
+def test_concurrent_saves_and_usage_updates_dont_race(tmp_path, monkeypatch):
+    """Saves from several threads, interleaved with usage updates, neither
+    collide on the temp file nor serialise a dict that is changing size."""
+    import threading
+
+    ann_file = tmp_path / "annotations.json"
+    monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_annotations", {})
+    errors = []
+
+    def _worker(n):
+        try:
+            for i in range(30):
+                server._track_usage(f"openai/model-{n}-{i}", latency=1.0)
+                server._save_annotations(server._annotations)
+        except Exception as exc:  # pragma: no cover - the failure being tested
+            errors.append(exc)
+
+    threads = [threading.Thread(target=_worker, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(json.loads(ann_file.read_text())) == 180
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+@pytest.mark.anyio
+async def test_completion_tracks_usage(tmp_path, monkeypatch):
     """completion() increments call_count and updates last_used."""
     ann_file = tmp_path / "annotations.json"
     ann_file.write_text("{}")
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
     monkeypatch.setenv("PROVIDER_TEST", "openai;sk-test")
     server._load_config()
     server._annotations = server._load_annotations()
 
     # Mock _resolve_model and litellm.completion
     monkeypatch.setattr(server, "_resolve_model", lambda m: ("openai/gpt-5.2", "sk-test"))
-    monkeypatch.setattr(server, "_get_models", lambda provider=None, *, zdr=None: ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_catalog", {"openai": {"openai/gpt-5.2"}})
 
     import litellm
-    monkeypatch.setattr(litellm, "completion", lambda **kw: FakeLlmResponse())
 
-    server.completion(model="openai/gpt-5.2", prompt="hi")
+    async def _fake_acompletion(**kw):
+        return FakeLlmResponse()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    await server.completion(model="openai/gpt-5.2", prompt="hi")
 
     loaded = json.loads(ann_file.read_text())
     assert loaded["openai/gpt-5.2"]["usage"]["call_count"] == 1
 
     # Call again
-    server.completion(model="openai/gpt-5.2", prompt="hi again")
+    await server.completion(model="openai/gpt-5.2", prompt="hi again")
     loaded = json.loads(ann_file.read_text())
     assert loaded["openai/gpt-5.2"]["usage"]["call_count"] == 2
 
@@ -164,6 +227,8 @@ def test_resolve_model_shorthand_from_usage(monkeypatch):
         },
     })
     monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+    monkeypatch.setattr(server, "_catalog", {})
+    server._rebuild_resolution_table()
     full_id, api_key = server._resolve_model("openai")
     assert full_id == "openai/gpt-5.2"
     assert api_key == "sk-test"
@@ -204,6 +269,7 @@ def test_refresh_provider_models(tmp_path, monkeypatch):
     ann_file = tmp_path / "annotations.json"
     ann_file.write_text("{}")
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
     monkeypatch.setenv("PROVIDER_TEST", "openai;sk-test")
     monkeypatch.setenv("CACHE_TTL_MINUTES", "360")
 
@@ -221,14 +287,16 @@ def test_refresh_provider_models(tmp_path, monkeypatch):
     assert "openai/gpt-4o" in all_cached
 
 
-def test_annotate_models_adds_note(tmp_path, monkeypatch):
+@pytest.mark.anyio
+async def test_annotate_models_adds_note(tmp_path, monkeypatch):
     """annotate_models writes a note to the annotations file."""
     ann_file = tmp_path / "annotations.json"
     ann_file.write_text("{}")
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
     server._annotations = server._load_annotations()
 
-    result = server.annotate_models(
+    result = await server.annotate_models(
         model="openai/gpt-5.2",
         note="Great for code review",
     )
@@ -238,7 +306,8 @@ def test_annotate_models_adds_note(tmp_path, monkeypatch):
     assert loaded["openai/gpt-5.2"]["annotations"]["note"] == "Great for code review"
 
 
-def test_annotate_models_updates_note(tmp_path, monkeypatch):
+@pytest.mark.anyio
+async def test_annotate_models_updates_note(tmp_path, monkeypatch):
     """annotate_models overwrites an existing note without touching other fields."""
     ann_file = tmp_path / "annotations.json"
     data = {
@@ -252,7 +321,7 @@ def test_annotate_models_updates_note(tmp_path, monkeypatch):
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
     server._annotations = server._load_annotations()
 
-    server.annotate_models(model="openai/gpt-5.2", note="new note")
+    await server.annotate_models(model="openai/gpt-5.2", note="new note")
 
     loaded = json.loads(ann_file.read_text())
     assert loaded["openai/gpt-5.2"]["annotations"]["note"] == "new note"
@@ -348,6 +417,7 @@ def test_fetch_enrichment_merges_data(tmp_path, monkeypatch):
     ann_file = tmp_path / "annotations.json"
     ann_file.write_text("{}")
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
 
     # Pre-populate model cache with two providers for same model
     server._model_cache["openai"] = (["openai/gpt-5.2"], 0)
@@ -402,6 +472,7 @@ def test_fetch_enrichment_removes_stale_livebench(tmp_path, monkeypatch):
     ann_file = tmp_path / "annotations.json"
     ann_file.write_text("{}")
     monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
 
     server._model_cache["openai"] = (["openai/gpt-5.2"], 0)
     server._annotations = {
@@ -429,6 +500,64 @@ def test_fetch_enrichment_removes_stale_livebench(tmp_path, monkeypatch):
     server._model_cache.pop("openai", None)
 
 
+def test_fetch_enrichment_only_touches_changed_models(tmp_path, monkeypatch):
+    """A second enrichment pass with unchanged sources writes nothing; a
+    changed Elo restamps only the affected model."""
+    ann_file = tmp_path / "annotations.json"
+    ann_file.write_text("{}")
+    monkeypatch.setenv("ANNOTATIONS_FILE", str(ann_file))
+    monkeypatch.setattr(server, "_last_refreshed", None)
+    monkeypatch.setattr(server, "_model_cache", {
+        "openai": (["openai/gpt-5.2", "openai/gpt-4o"], 0),
+    })
+    monkeypatch.setattr(server, "_annotations", {})
+
+    ratings = {"gpt-5.2": 1486.0, "gpt-4o": 1300.0}
+
+    import urllib.request
+
+    def mock_urlopen(req, timeout=None):
+        url = req.full_url if hasattr(req, "full_url") else str(req)
+        if "arena-catalog" in url:
+            return FakeUrlResponse(json.dumps({
+                "full": {name: {"rating": r} for name, r in ratings.items()},
+            }))
+        if "tree/main" in url:
+            return FakeUrlResponse("[]")
+        return FakeUrlResponse("")
+
+    monkeypatch.setattr(urllib.request, "urlopen", mock_urlopen)
+
+    saves = []
+    real_save = server._save_annotations
+    monkeypatch.setattr(
+        server, "_save_annotations", lambda data: (saves.append(1), real_save(data))
+    )
+
+    server._fetch_enrichment()
+    assert len(saves) == 1
+    stamp_4o = server._annotations["openai/gpt-4o"]["metadata"]["last_updated"]
+
+    # Steady state: nothing changed, nothing written
+    server._fetch_enrichment()
+    assert len(saves) == 1
+
+    # ...but the refresh is still recorded, so stable data doesn't look stale
+    monkeypatch.setattr(server, "_cache_ttl_minutes", 60)
+    for entry in server._annotations.values():
+        entry["metadata"]["last_updated"] = "2020-01-01T00:00:00+00:00"
+    assert server._needs_refresh(server._annotations) is False
+    assert server._load_last_refreshed() == server._last_refreshed
+    stamp_4o = server._annotations["openai/gpt-4o"]["metadata"]["last_updated"]
+
+    # One rating moves: only that model is restamped
+    ratings["gpt-5.2"] = 1490.0
+    server._fetch_enrichment()
+    assert len(saves) == 2
+    assert server._annotations["openai/gpt-5.2"]["metadata"]["arena_elo"] == 1490.0
+    assert server._annotations["openai/gpt-4o"]["metadata"]["last_updated"] == stamp_4o
+
+
 def test_refresh_provider_models_merges_openrouter_metadata(monkeypatch):
     """_refresh_provider_models merges OpenRouter metadata into annotations."""
     monkeypatch.setattr(server, "_provider_registry", {"openrouter": "fake-key"})
@@ -464,6 +593,78 @@ def test_refresh_provider_models_merges_openrouter_metadata(monkeypatch):
     server._annotations.clear()
 
 
+def test_litellm_uses_bundled_cost_map():
+    """Importing the server points litellm at its bundled cost map, so the
+    first litellm import never fetches over the network."""
+    import os
+
+    assert os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] == "True"
+
+
+@pytest.mark.anyio
+async def test_cache_models_merges_litellm_cost_metadata(monkeypatch):
+    """Direct-provider models get pricing/context from litellm.model_cost."""
+    import litellm
+
+    monkeypatch.setattr(litellm, "model_cost", {
+        "gpt-5.2": {
+            "litellm_provider": "openai",
+            "max_input_tokens": 400000,
+            "input_cost_per_token": 1.25e-06,
+            "output_cost_per_token": 1e-05,
+            "supports_vision": True,
+        },
+        "gemini-3-pro": {"litellm_provider": "vertex_ai", "max_input_tokens": 1},
+        "openrouter/openai/gpt-5.2": {"max_input_tokens": 1},
+    })
+    monkeypatch.setattr(server, "_annotations", {})
+    monkeypatch.setattr(server, "_model_cache", {})
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_cache_ttl_minutes", 360)
+
+    server._cache_models("openai", ["openai/gpt-5.2"])
+    server._cache_models("gemini", ["gemini/gemini-3-pro"])
+    server._cache_models("openrouter:zdr=True", ["openrouter/openai/gpt-5.2"])
+
+    meta = server._annotations["openai/gpt-5.2"]["metadata"]
+    assert meta["context_length"] == 400000
+    assert meta["pricing_in"] == "0.00000125"
+    assert meta["pricing_out"] == "0.00001"
+    assert meta["modalities"] == ["text", "image"]
+    # Bare names listed under another provider, and OpenRouter IDs, are skipped
+    assert "gemini/gemini-3-pro" not in server._annotations
+    assert "openrouter/openai/gpt-5.2" not in server._annotations
+
+    result = await server.search_models(search="gpt-5.2")
+    assert "openai/gpt-5.2 — 400k ctx, $0.00000125/tok in, image input" in result
+
+
+@pytest.mark.anyio
+async def test_search_models_not_starved_by_research_threads(monkeypatch):
+    """Saturating the research limiter leaves interactive threads free."""
+    import anyio
+
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_model_cache", {"openai": (["openai/gpt-5.2"], 9999999999.0)})
+    monkeypatch.setattr(server, "_cache_ttl_minutes", 360)
+    monkeypatch.setattr(server, "_annotations", {})
+
+    research = server._limiter("research")
+    holders = [object() for _ in range(int(research.total_tokens))]
+    for holder in holders:
+        await research.acquire_on_behalf_of(holder)
+    try:
+        with anyio.fail_after(5):
+            result = await server.search_models(search="gpt")
+    finally:
+        for holder in holders:
+            research.release_on_behalf_of(holder)
+    assert "openai/gpt-5.2" in result
+    assert server._limiter("research") is not server._limiter("interactive")
+
+
 def test_needs_refresh_no_annotations():
     """Empty annotations means refresh is needed."""
     assert server._needs_refresh({}) is True
@@ -505,6 +706,18 @@ def test_needs_refresh_ignores_usage_only(monkeypatch):
     assert server._needs_refresh(annotations) is False
 
 
+def test_needs_refresh_uses_newest_stamp(monkeypatch):
+    """Unchanged entries keep old stamps; one recent stamp means fresh."""
+    monkeypatch.setattr(server, "_cache_ttl_minutes", 60)
+    annotations = {
+        "openai/gpt-4o": {"metadata": {"last_updated": "2020-01-01T00:00:00+00:00"}},
+        "openai/gpt-5.2": {
+            "metadata": {"last_updated": datetime.now(timezone.utc).isoformat()}
+        },
+    }
+    assert server._needs_refresh(annotations) is False
+
+
 def test_fetch_openrouter_models_returns_metadata(monkeypatch):
     """_fetch_openrouter_models returns model IDs and metadata dict."""
     import urllib.request
@@ -600,6 +813,19 @@ def test_normalize_model_name(input_name, expected):
     assert server._normalize_model_name(input_name) == expected
 
 
+def test_equivalent_models_from_canonical_index(monkeypatch):
+    """Caching a provider's models indexes them by canonical name."""
+    monkeypatch.setattr(server, "_model_cache", {})
+    monkeypatch.setattr(server, "_canonical_index", {})
+    server._cache_models("openrouter:zdr=True", ["openrouter/openai/gpt-5.2-preview"])
+    server._cache_models("openai", ["openai/gpt-5.2", "openai/gpt-4o"])
+
+    assert server._equivalent_models("openai/gpt-5.2") == [
+        "openai/gpt-5.2", "openrouter/openai/gpt-5.2-preview",
+    ]
+    assert server._equivalent_models("gemini/unknown") == ["gemini/unknown"]
+
+
 def test_resolve_model_discovery_fallback_by_elo(monkeypatch):
     """Shorthand falls back to discovered models, picking highest Elo."""
     monkeypatch.setattr(server, "_annotations", {
@@ -608,12 +834,12 @@ def test_resolve_model_discovery_fallback_by_elo(monkeypatch):
         "openai/gpt-5.4": {"metadata": {"arena_elo": 1510}},
     })
     monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
-    monkeypatch.setattr(
-        server, "_get_models",
-        lambda provider=None, *, zdr=None: [
-            "openai/gpt-4o", "openai/gpt-5.2", "openai/gpt-5.4",
-        ],
-    )
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_model_cache", {
+        "openai": (["openai/gpt-4o", "openai/gpt-5.2", "openai/gpt-5.4"], 0),
+    })
+    monkeypatch.setattr(server, "_catalog", {})
+    server._rebuild_resolution_table()
     # No favourites — empty usage
     full_id, api_key = server._resolve_model("openai")
     assert full_id == "openai/gpt-5.4"
@@ -627,12 +853,12 @@ def test_resolve_model_discovery_fallback_elo_tiebreak(monkeypatch):
         "openai/model-a": {"metadata": {"arena_elo": 1400}},
     })
     monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
-    monkeypatch.setattr(
-        server, "_get_models",
-        lambda provider=None, *, zdr=None: [
-            "openai/model-a", "openai/model-b",
-        ],
-    )
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_model_cache", {
+        "openai": (["openai/model-a", "openai/model-b"], 0),
+    })
+    monkeypatch.setattr(server, "_catalog", {})
+    server._rebuild_resolution_table()
     full_id, _ = server._resolve_model("openai")
     assert full_id == "openai/model-a"
 
@@ -641,14 +867,38 @@ def test_resolve_model_no_match_raises(monkeypatch):
     """Unknown shorthand raises ValueError with helpful message."""
     monkeypatch.setattr(server, "_annotations", {})
     monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
-    monkeypatch.setattr(
-        server, "_get_models",
-        lambda provider=None, *, zdr=None: ["openai/gpt-5.2"],
-    )
+    monkeypatch.setattr(server, "_model_cache", {"openai": (["openai/gpt-5.2"], 0)})
+    monkeypatch.setattr(server, "_catalog", {})
+    server._rebuild_resolution_table()
     with pytest.raises(ValueError, match="No models found matching 'nonexistent'"):
         server._resolve_model("nonexistent")
 
 
+def test_resolve_model_table_tracks_usage_and_never_fetches(monkeypatch, tmp_path):
+    """Usage changes re-rank the shorthand without touching the network."""
+    monkeypatch.setenv("ANNOTATIONS_FILE", str(tmp_path / "annotations.json"))
+    monkeypatch.setattr(server, "_annotations", {
+        "openai/gpt-5.4": {"metadata": {"arena_elo": 1510}},
+    })
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_model_cache", {})
+    monkeypatch.setattr(server, "_zero_data_retention", True)
+
+    def _no_fetch(*a, **kw):
+        raise AssertionError("resolution must not fetch")
+
+    monkeypatch.setattr(server, "_get_models", _no_fetch)
+    monkeypatch.setattr(server, "_fetch_models", _no_fetch)
+    monkeypatch.setattr(server, "_catalog", {})
+    server._rebuild_resolution_table()
+    server._cache_models("openai", ["openai/gpt-4o", "openai/gpt-5.4"])
+
+    assert server._resolve_model("openai")[0] == "openai/gpt-5.4"
+    server._track_usage("openai/gpt-4o")
+    assert server._resolve_model("openai")[0] == "openai/gpt-4o"
+
+
 def test_resolve_model_full_id_direct(monkeypatch):
     """Full model ID routes directly without needing favourites or discovery."""
     monkeypatch.setattr(server, "_annotations", {})
@@ -658,6 +908,105 @@ def test_resolve_model_full_id_direct(monkeypatch):
     assert api_key == "sk-test"
 
 
+def _setup_auto(monkeypatch, policy=None):
+    """Catalog of rated models with recorded latency and pricing."""
+    monkeypatch.setattr(server, "_annotations", {
+        "openai/gpt-5.4": {
+            "metadata": {"arena_elo": 1510, "pricing_in": "0.00001", "pricing_out": "0.00004"},
+            "usage": {"latencies": [9.0, 9.5, 10.0]},
+        },
+        "openai/gpt-5.2-mini": {
+            "metadata": {"arena_elo": 1470, "pricing_in": "0.000001", "pricing_out": "0.000004"},
+            "usage": {"latencies": [4.0, 4.0, 4.5]},
+        },
+        "gemini/gemini-3-flash": {
+            "metadata": {"arena_elo": 1480, "pricing_in": "0.0000005", "pricing_out": "0.000002"},
+            "usage": {"latencies": [2.0, 2.5, 3.0]},
+        },
+        "openai/gpt-4o": {
+            "metadata": {"arena_elo": 1300, "pricing_in": "0", "pricing_out": "0"},
+            "usage": {"latencies": [0.5, 0.5, 0.5]},
+        },
+    })
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-o", "gemini": "sk-g"})
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_catalog", {
+        "openai": {"openai/gpt-5.4", "openai/gpt-5.2-mini", "openai/gpt-4o"},
+        "gemini": {"gemini/gemini-3-flash"},
+    })
+    monkeypatch.setattr(server, "_auto_policy", policy or server.AutoPolicy())
+    monkeypatch.setattr(server, "_auto_ranked", {})
+
+
+def test_resolve_auto_picks_fastest_model_above_elo_floor(monkeypatch):
+    """The default floor is 50 Elo below the best; gpt-4o is fast but below it."""
+    _setup_auto(monkeypatch)
+    assert server._resolve_model("auto") == ("gemini/gemini-3-flash", "sk-g")
+    assert server._resolve_model("auto:openai") == ("openai/gpt-5.2-mini", "sk-o")
+
+    monkeypatch.setattr(server, "_provider_errors", {"gemini": "down"})
+    assert server._resolve_model("auto")[0] == "openai/gpt-5.2-mini"
+
+
+def test_resolve_auto_policy_price_and_floor(monkeypatch):
+    _setup_auto(monkeypatch, server.AutoPolicy(prefer="price", min_elo=1200))
+    assert server._resolve_model("auto")[0] == "openai/gpt-4o"
+
+    _setup_auto(monkeypatch, server.AutoPolicy(min_elo=1600))
+    with pytest.raises(ValueError, match="Elo floor of 1600"):
+        server._resolve_model("auto")
+    with pytest.raises(ValueError, match="No Elo-rated models"):
+        server._resolve_model("auto:anthropic")
+
+
+def test_resolve_auto_ranks_unmeasured_models_last_by_elo(monkeypatch):
+    _setup_auto(monkeypatch)
+    for entry in server._annotations.values():
+        entry.pop("usage")
+    server._annotations["openai/gpt-5.2-mini"]["usage"] = {"latencies": [4.0, 4.0, 4.0]}
+    assert server._resolve_model("auto")[0] == "openai/gpt-5.2-mini"
+    del server._annotations["openai/gpt-5.2-mini"]["usage"]
+    assert server._resolve_model("auto")[0] == "openai/gpt-5.4"
+
+
+def test_resolve_auto_ranks_catalog_once_per_change(monkeypatch):
+    """The rated candidates are ranked once and reused until resolution is
+    invalidated; health is still checked on every call."""
+    _setup_auto(monkeypatch)
+    assert server._auto_candidates(None) == [
+        "openai/gpt-5.4", "gemini/gemini-3-flash", "openai/gpt-5.2-mini", "openai/gpt-4o",
+    ]
+    server._catalog["gemini"] = set()
+    assert "gemini/gemini-3-flash" in server._auto_candidates(None)
+
+    monkeypatch.setattr(server, "_provider_errors", {"openai": "down"})
+    assert server._auto_candidates(None) == ["gemini/gemini-3-flash"]
+
+    monkeypatch.setattr(server, "_provider_errors", {})
+    server._invalidate_resolution([])
+    assert server._resolve_model("auto")[0] == "openai/gpt-5.2-mini"
+
+
+@pytest.mark.anyio
+async def test_auto_is_rejected_for_image_and_research_tools(monkeypatch):
+    _setup_auto(monkeypatch)
+    with pytest.raises(ValueError, match="image model ID"):
+        await server.generate_image(model="auto", prompt="a cat")
+    with pytest.raises(ValueError, match="research model ID"):
+        await server.start_research(model="auto:openai", query="why")
+
+
+def test_parse_auto_policy():
+    assert server._parse_auto_policy("") == server.AutoPolicy()
+    assert server._parse_auto_policy("prefer=price, min_elo=1350") == server.AutoPolicy(
+        prefer="price", min_elo=1350.0,
+    )
+    assert server._parse_auto_policy("margin=20").margin == 20.0
+    for bad in ("prefer=fast", "min_elo=high", "speed=1"):
+        with pytest.raises(ValueError, match="Invalid AUTO_POLICY"):
+            server._parse_auto_policy(bad)
+
+
 def test_build_instructions_includes_elo_section(monkeypatch):
     """Instructions include top-rated models by Elo."""
     monkeypatch.setattr(server, "_annotations", {
@@ -0,0 +1,129 @@
+"""Tests for attaching local files to completion by path."""
+
+import base64
+import os
+
+import pytest
+
+import ask_another.server as server
+
+
+@pytest.fixture(autouse=True)
+def _allow_tmp_path(monkeypatch, tmp_path):
+    """Let tests attach files from their tmp_path."""
+    monkeypatch.setattr(server, "_attachment_roots", [tmp_path.resolve()])
+
+
+@pytest.mark.parametrize("mmap_threshold", [0, 1 << 30])
+def test_text_encodings_are_detected(tmp_path, monkeypatch, mmap_threshold):
+    """UTF-8 (with or without BOM), UTF-16 and legacy Windows-1252 all decode,
+    whether read normally or through a memory map."""
+    monkeypatch.setattr(server, "_MMAP_THRESHOLD", mmap_threshold)
+    files = {
+        "utf8.txt": "naïve café".encode("utf-8"),
+        "bom.txt": "﻿naïve café".encode("utf-8"),
+        "utf16.txt": "naïve café".encode("utf-16"),
+        "legacy.txt": "naïve café".encode("cp1252"),
+        "empty.txt": b"",
+    }
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+
+    result = server._read_attachments([str(tmp_path / name) for name in files])
+
+    assert result.text.count("naïve café") == 4
+    assert f'<file path="{tmp_path / "empty.txt"}">' in result.text
+    assert result.images == []
+
+
+def test_binary_and_oversized_files_are_rejected(tmp_path, monkeypatch):
+    (tmp_path / "blob.bin").write_bytes(b"\x7fELF\x00\x01")
+    with pytest.raises(ValueError, match="binary file"):
+        server._read_attachments([str(tmp_path / "blob.bin")])
+
+    with pytest.raises(ValueError, match="not found"):
+        server._read_attachments([str(tmp_path / "missing.txt")])
+
+    monkeypatch.setattr(server, "_ATTACHMENT_MAX_BYTES", 10)
+    (tmp_path / "big.txt").write_text("x" * 11)
+    with pytest.raises(ValueError, match="limit is"):
+        server._read_attachments([str(tmp_path / "big.txt")])
+
+
+def test_files_outside_the_attachment_roots_are_rejected(tmp_path, monkeypatch):
+    """Paths outside the roots are refused, including through a symlink
+    that points out of an allowed directory."""
+    allowed = tmp_path / "project"
+    outside = tmp_path / "secrets"
+    allowed.mkdir()
+    outside.mkdir()
+    (allowed / "notes.md").write_text("fine")
+    (outside / "id_rsa").write_text("PRIVATE KEY")
+    (allowed / "link").symlink_to(outside / "id_rsa")
+    monkeypatch.setattr(server, "_attachment_roots", [allowed.resolve()])
+
+    assert "fine" in server._read_attachments([str(allowed / "notes.md")]).text
+    with pytest.raises(ValueError, match="outside the directories"):
+        server._read_attachments([str(outside / "id_rsa")])
+    with pytest.raises(ValueError, match="outside the directories"):
+        server._read_attachments([str(allowed / "link")])
+    with pytest.raises(ValueError, match="outside the directories"):
+        server._read_attachments([str(allowed / ".." / "secrets" / "id_rsa")])
+
+    monkeypatch.setattr(server, "_attachment_roots", [])
+    monkeypatch.chdir(allowed)
+    assert "fine" in server._read_attachments(["notes.md"]).text
+    with pytest.raises(ValueError, match="ATTACHMENT_ROOTS"):
+        server._read_attachments([str(outside / "id_rsa")])
+
+
+def test_attachment_roots_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "_provider_registry", {})
+    monkeypatch.setenv("ATTACHMENT_ROOTS", f"{tmp_path / 'a'}{os.pathsep} {tmp_path / 'b'} ")
+    server._load_config()
+    assert server._attachment_roots == [(tmp_path / "a").resolve(), (tmp_path / "b").resolve()]
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("ATTACHMENT_ROOTS", "${HOME}/Documents")
+    server._load_config()
+    assert server._attachment_roots == [(tmp_path / "Documents").resolve()]
+
+
+@pytest.mark.anyio
+async def test_completion_sends_files_read_by_the_server(
+    monkeypatch, tmp_path, llm_response, provider_catalog
+):
+    """Text is inlined ahead of the prompt; images go only to vision models."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2", "openai/text-only"], {
+        "openai/gpt-5.2": {"metadata": {"modalities": ["text", "image"]}},
+        "openai/text-only": {"metadata": {"modalities": ["text"]}},
+    })
+    monkeypatch.setattr(server, "_response_cache", None)
+    (tmp_path / "notes.md").write_text("# Design\nUse a queue.")
+    (tmp_path / "diagram.png").write_bytes(b"\x89PNG fake")
+    sent = []
+
+    async def _fake_acompletion(**kw):
+        sent.append(kw["messages"])
+        return llm_response()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    await server.completion(
+        model="openai/gpt-5.2", prompt="Review this",
+        files=[str(tmp_path / "notes.md"), str(tmp_path / "diagram.png")],
+    )
+    text_part, image_part = sent[0][-1]["content"]
+    assert text_part["text"].startswith(f'<file path="{tmp_path / "notes.md"}">\n# Design')
+    assert text_part["text"].endswith("</file>\n\nReview this")
+    encoded = base64.b64encode(b"\x89PNG fake").decode()
+    assert image_part["image_url"]["url"] == f"data:image/png;base64,{encoded}"
+
+    with pytest.raises(ValueError, match="does not accept image input"):
+        await server.completion(
+            model="openai/text-only", prompt="Review this",
+            files=[str(tmp_path / "diagram.png")],
+        )
+    assert len(sent) == 1
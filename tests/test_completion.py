@@ -0,0 +1,755 @@
+"""Tests for the completion tool's model validation and call path."""
+
+import functools
+from types import SimpleNamespace
+
+import pytest
+
+import ask_another.server as server
+
+
+def _setup_catalog(monkeypatch, models):
+    """Install an openai catalog without touching the network."""
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+    monkeypatch.setattr(server, "_provider_errors", {})
+    monkeypatch.setattr(server, "_annotations", {})
+    monkeypatch.setattr(server, "_model_cache", {})
+    monkeypatch.setattr(server, "_zero_data_retention", True)
+    monkeypatch.setattr(server, "_catalog", {})
+    monkeypatch.setattr(server, "_suggestion_index", {})
+    monkeypatch.setattr(server, "_invalid_models", {})
+    server._cache_models("openai", models)
+
+
+def test_validate_model_suggests_neighbours_and_caches_rejection(monkeypatch):
+    """Unknown IDs get close suggestions; repeats hit the negative cache."""
+    _setup_catalog(monkeypatch, [
+        "openai/gpt-4o", "openai/gpt-5.2", "openai/gpt-5.2-pro", "openai/o3",
+    ])
+
+    with pytest.raises(ValueError) as exc:
+        server._validate_model("openai/gpt-5.3")
+    msg = str(exc.value)
+    assert "Similar models: openai/gpt-5.2, openai/gpt-5.2-pro" in msg
+    assert "openai/o3" not in msg
+    assert "openai/gpt-5.3" in server._invalid_models
+
+    def _no_suggest(*a, **kw):
+        raise AssertionError("negative cache should short-circuit")
+
+    monkeypatch.setattr(server, "_suggest_models", _no_suggest)
+    with pytest.raises(ValueError, match="not found in openai's model list"):
+        server._validate_model("openai/gpt-5.3")
+
+
+def test_validate_model_never_fetches_and_resets_on_catalog_change(monkeypatch):
+    """Validation is set membership only; a catalog update clears rejections."""
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+
+    def _no_fetch(*a, **kw):
+        raise AssertionError("validation must not fetch")
+
+    monkeypatch.setattr(server, "_get_models", _no_fetch)
+    monkeypatch.setattr(server, "_fetch_models", _no_fetch)
+
+    server._validate_model("openai/gpt-5.2")
+    server._validate_model("gemini/not-discovered-yet")  # no catalog: skipped
+    with pytest.raises(ValueError):
+        server._validate_model("openai/gpt-5.4")
+
+    server._cache_models("openai", ["openai/gpt-5.2", "openai/gpt-5.4"])
+    assert server._invalid_models == {}
+    server._validate_model("openai/gpt-5.4")
+
+
+@pytest.mark.anyio
+async def test_completions_run_concurrently(monkeypatch, llm_response):
+    """Two completions to different models are in flight at the same time."""
+    import anyio
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2", "openai/gpt-4o"])
+
+    in_flight = 0
+    peak = 0
+    both_started = anyio.Event()
+
+    async def _fake_acompletion(**kw):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        if in_flight == 2:
+            both_started.set()
+        with anyio.fail_after(5):
+            await both_started.wait()
+        in_flight -= 1
+        return llm_response(kw["model"])
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    results = {}
+
+    async def _call(model):
+        results[model] = await server.completion(model=model, prompt="hi")
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_call, "openai/gpt-5.2")
+        tg.start_soon(_call, "openai/gpt-4o")
+
+    assert peak == 2
+    assert results == {"openai/gpt-5.2": "openai/gpt-5.2", "openai/gpt-4o": "openai/gpt-4o"}
+
+
+class _FakeStreamChunk:
+    def __init__(self, content):
+        delta = type("Delta", (), {"content": content})()
+        self.choices = [type("StreamChoice", (), {"delta": delta})()]
+
+
+class _FakeCtx:
+    """Records the notifications a streaming completion sends."""
+
+    def __init__(self, progress_token=None):
+        meta = SimpleNamespace(progressToken=progress_token)
+        self.request_context = SimpleNamespace(meta=meta)
+        self.progress = []
+        self.logs = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.progress.append((progress, message))
+
+    async def info(self, message):
+        self.logs.append(message)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("progress_token,progress_messages", [
+    ("tok-1", True), (None, True), ("tok-1", False),
+])
+async def test_stream_forwards_partial_text_and_records_ttft(
+    monkeypatch, progress_token, progress_messages,
+):
+    """Streamed text reaches the client as it arrives; TTFT lands in usage.
+    Without progress-message support in mcp, text falls back to log messages."""
+    import litellm
+
+    monkeypatch.setattr(server, "_PROGRESS_MESSAGES", progress_messages)
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_STREAM_FLUSH_CHARS", 5)
+
+    async def _chunks():
+        for piece in ["Hello", "", " wor", "ld!"]:
+            yield _FakeStreamChunk(piece)
+
+    async def _fake_acompletion(**kw):
+        assert kw["stream"] is True
+        return _chunks()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    ctx = _FakeCtx(progress_token)
+
+    result = await server.completion(
+        model="openai/gpt-5.2", prompt="hi", stream=True, ctx=ctx,  # type: ignore[arg-type]
+    )
+
+    assert result == "Hello world!"
+    if progress_token and progress_messages:
+        assert ctx.progress == [(5, "Hello"), (12, " world!")]
+        assert ctx.logs == []
+    else:
+        assert ctx.logs == ["Hello", " world!"]
+    usage = server._annotations["openai/gpt-5.2"]["usage"]
+    assert usage["stream_count"] == 1
+    assert usage["ttft_ms"] >= 0
+    assert len(usage["latencies"]) == 1
+
+
+@pytest.mark.anyio
+async def test_completion_many_reports_each_outcome_with_latency(
+    monkeypatch, llm_response
+):
+    """Fan-out runs models concurrently; slow and failing models are reported
+    per model without sinking the others."""
+    import anyio
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2", "openai/gpt-4o", "openai/o3"])
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/o3":
+            await anyio.sleep(10)
+        if kw["model"] == "openai/gpt-4o":
+            raise RuntimeError("boom")
+        return llm_response("fast answer")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    with anyio.fail_after(5):
+        result = await server.completion_many(
+            models=["openai/gpt-5.2", "openai/gpt-4o", "openai/o3", "openai/nope"],
+            prompt="hi",
+            timeout=0.2,
+        )
+
+    sections = result.split("## ")[1:]
+    assert sections[0].startswith("openai/gpt-5.2 — ok (")
+    assert "fast answer" in sections[0]
+    assert sections[1].startswith("openai/gpt-4o — error (")
+    assert "RuntimeError: boom" in sections[1]
+    assert sections[2].startswith("openai/o3 — timeout (0.2s)")
+    assert sections[3].startswith("openai/nope — error (")
+    assert "not found" in sections[3]
+
+
+@pytest.mark.anyio
+async def test_completion_many_rejects_too_many_models():
+    with pytest.raises(ValueError, match="At most"):
+        await server.completion_many(models=[f"m{i}" for i in range(9)], prompt="hi")
+
+
+@pytest.mark.anyio
+async def test_ensemble_judges_successful_candidates_anonymously(
+    monkeypatch, llm_response
+):
+    """Candidates run concurrently; the judge sees lettered answers from the
+    ones that succeeded, and failures are still reported."""
+    import anyio
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2", "openai/gpt-4o", "openai/o3"])
+    judged = []
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/o3":
+            judged.append(kw["messages"])
+            return llm_response("synthesis")
+        if kw["model"] == "openai/gpt-4o":
+            raise RuntimeError("boom")
+        await anyio.sleep(0.05)
+        return llm_response("candidate answer")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    result = await server.ensemble(
+        models=["openai/gpt-5.2", "openai/gpt-4o"], prompt="What is 2+2?",
+        judge="openai/o3", judge_instructions="Be terse",
+    )
+
+    synthesis, details = result.split("\n\n---\n", 1)
+    assert synthesis == "synthesis"
+    assert "judge openai/o3" in details
+    assert "## openai/gpt-5.2 — ok" in details and "## openai/gpt-4o — error" in details
+    system, user = judged[0]
+    assert system["content"] == server._JUDGE_SYSTEM
+    assert '<candidate id="A">\ncandidate answer\n</candidate>' in user["content"]
+    assert 'id="B"' not in user["content"] and "gpt-5.2" not in user["content"]
+    assert user["content"].endswith("Be terse")
+
+
+@pytest.mark.anyio
+async def test_ensemble_rejects_unknown_judge_before_calling(monkeypatch):
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+
+    async def _fail(**kw):
+        raise AssertionError("candidates should not be called")
+
+    monkeypatch.setattr(litellm, "acompletion", _fail)
+    with pytest.raises(ValueError, match="not found"):
+        await server.ensemble(models=["openai/gpt-5.2"], prompt="hi", judge="openai/nope")
+
+
+@pytest.mark.anyio
+async def test_race_returns_first_answer_and_cancels_the_rest(monkeypatch, llm_response):
+    """Racing sends to the same model on every healthy provider, returns the
+    first success, cancels the loser and records the winner."""
+    import anyio
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+    monkeypatch.setattr(
+        server, "_provider_registry", {"openai": "sk-test", "openrouter": "sk-or"}
+    )
+    monkeypatch.setattr(server, "_canonical_index", {})
+    server._cache_models(
+        server._cache_key("openrouter", True), ["openrouter/openai/gpt-5.2"]
+    )
+    server._cache_models("openai", ["openai/gpt-5.2"])
+
+    cancelled = []
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/gpt-5.2":
+            try:
+                await anyio.sleep(10)
+            except anyio.get_cancelled_exc_class():
+                cancelled.append(kw["model"])
+                raise
+        return llm_response(f"from {kw['model']}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    with anyio.fail_after(5):
+        result = await server.completion(model="openai/gpt-5.2", prompt="hi", race=True)
+
+    assert result == "from openrouter/openai/gpt-5.2"
+    assert cancelled == ["openai/gpt-5.2"]
+    assert server._annotations["openrouter/openai/gpt-5.2"]["usage"]["race_wins"] == 1
+    assert "race_wins" not in server._annotations.get("openai/gpt-5.2", {}).get("usage", {})
+
+
+@pytest.mark.anyio
+async def test_race_explicit_alternates_survives_failures(monkeypatch, llm_response):
+    """A failing contender doesn't end the race; all failing raises."""
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2", "openai/gpt-4o"])
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/gpt-5.2":
+            raise RuntimeError("overloaded")
+        return llm_response("steady")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    result = await server.completion(
+        model="openai/gpt-5.2", prompt="hi", race=True, alternates=["openai/gpt-4o"],
+    )
+    assert result == "steady"
+
+    async def _all_fail(**kw):
+        raise RuntimeError("down")
+
+    monkeypatch.setattr(litellm, "acompletion", _all_fail)
+    with pytest.raises(RuntimeError, match="Every raced model failed"):
+        await server.completion(
+            model="openai/gpt-5.2", prompt="hi", race=True, alternates=["openai/gpt-4o"],
+        )
+
+
+def _setup_two_routes(monkeypatch):
+    """openai/gpt-5.2 reachable directly and via OpenRouter."""
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2", "openai/gpt-4o"])
+    monkeypatch.setattr(
+        server, "_provider_registry", {"openai": "sk-test", "openrouter": "sk-or"}
+    )
+    monkeypatch.setattr(server, "_canonical_index", {})
+    monkeypatch.setattr(server, "_hedge_alternates", {})
+    server._cache_models(
+        server._cache_key("openrouter", True), ["openrouter/openai/gpt-5.2"]
+    )
+    server._cache_models("openai", ["openai/gpt-5.2", "openai/gpt-4o"])
+
+
+def test_latency_percentile_needs_enough_samples(monkeypatch):
+    monkeypatch.setattr(server, "_annotations", {})
+    server._annotations["m"] = {"usage": {"latencies": [3.0, 1.0, 4.0, 2.0]}}
+    assert server._latency_percentile("m", 95) is None
+    server._annotations["m"]["usage"]["latencies"].append(10.0)
+    assert server._latency_percentile("m", 95) == 10.0
+    assert server._latency_percentile("m", 50) == 3.0
+
+
+def test_parse_hedge_alternates():
+    assert server._parse_hedge_alternates(
+        "openai/gpt-5.2=gemini/gemini-3-pro, openai/o3 = openai/gpt-5.2,"
+    ) == {"openai/gpt-5.2": "gemini/gemini-3-pro", "openai/o3": "openai/gpt-5.2"}
+    with pytest.raises(ValueError, match="HEDGE_ALTERNATES"):
+        server._parse_hedge_alternates("openai/gpt-5.2")
+
+
+@pytest.mark.anyio
+async def test_hedge_fires_after_p95_and_cancels_slow_primary(monkeypatch, llm_response):
+    """A primary slower than its recorded p95 is hedged via another provider."""
+    import anyio
+    import litellm
+
+    _setup_two_routes(monkeypatch)
+    server._annotations["openai/gpt-5.2"] = {"usage": {"latencies": [0.05] * 5}}
+    cancelled = []
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/gpt-5.2":
+            try:
+                await anyio.sleep(10)
+            except anyio.get_cancelled_exc_class():
+                cancelled.append(kw["model"])
+                raise
+        return llm_response(f"from {kw['model']}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    with anyio.fail_after(5):
+        result = await server.completion(model="openai/gpt-5.2", prompt="hi", hedge=True)
+
+    assert result == "from openrouter/openai/gpt-5.2"
+    assert cancelled == ["openai/gpt-5.2"]
+
+
+@pytest.mark.anyio
+async def test_hedge_fails_over_immediately_on_rate_limit(monkeypatch, llm_response):
+    """A 429 from the primary triggers the configured alternate at once."""
+    import anyio
+    import litellm
+    from litellm.exceptions import RateLimitError
+
+    _setup_two_routes(monkeypatch)
+    monkeypatch.setattr(server, "_hedging_enabled", True)
+    monkeypatch.setattr(server, "_hedge_alternates", {"openai/gpt-5.2": "openai/gpt-4o"})
+    monkeypatch.setattr(server, "_DEFAULT_HEDGE_DELAY", 30.0)
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["model"])
+        if kw["model"] == "openai/gpt-5.2":
+            raise RateLimitError("slow down", llm_provider="openai", model="gpt-5.2")
+        return llm_response("alternate answer")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    with anyio.fail_after(5):
+        result = await server.completion(model="openai/gpt-5.2", prompt="hi")
+
+    assert result == "alternate answer"
+    assert calls == ["openai/gpt-5.2", "openai/gpt-4o"]
+
+
+@pytest.mark.anyio
+async def test_hedge_raises_non_retryable_primary_errors(monkeypatch):
+    """Errors another route can't fix (bad request) are raised, not hedged."""
+    import litellm
+
+    _setup_two_routes(monkeypatch)
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["model"])
+        raise ValueError("bad request")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    with pytest.raises(ValueError, match="bad request"):
+        await server.completion(model="openai/gpt-5.2", prompt="hi", hedge=True)
+    assert calls == ["openai/gpt-5.2"]
+
+
+@pytest.mark.anyio
+async def test_stream_rejects_hedge_and_race(monkeypatch, llm_response):
+    """Streamed calls can't be hedged or raced; asking for either is an error,
+    while the HEDGING default simply doesn't apply to them."""
+    import litellm
+
+    _setup_two_routes(monkeypatch)
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["model"])
+        return llm_response("ok")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    with pytest.raises(ValueError, match="stream and hedge"):
+        await server.completion(model="openai/gpt-5.2", prompt="hi", stream=True, hedge=True)
+    with pytest.raises(ValueError, match="stream and race"):
+        await server.completion(model="openai/gpt-5.2", prompt="hi", stream=True, race=True)
+    assert calls == []
+
+
+@pytest.mark.anyio
+async def test_routing_picks_provider_by_health_headroom_and_latency(monkeypatch):
+    """Equivalent routes are one model: the faster route wins, a route that
+    would queue for rate limits loses, and unhealthy providers are skipped."""
+    _setup_two_routes(monkeypatch)
+    monkeypatch.setattr(server, "_annotations", {
+        "openai/gpt-5.2": {"usage": {"latencies": [6.0, 6.0, 6.0]}},
+        "openrouter/openai/gpt-5.2": {"usage": {"latencies": [3.0, 3.0, 3.0]}},
+    })
+    monkeypatch.setattr(server, "_rate_limits", {})
+
+    async def _routed():
+        return await server._prepare_completion("openai/gpt-5.2", "hi", None, None, route=True)
+
+    assert (await _routed())[0] == "openrouter/openai/gpt-5.2"
+    assert (await _routed())[1]["api_key"] == "sk-or"
+    unrouted = await server._prepare_completion("openai/gpt-5.2", "hi", None, None)
+    assert unrouted[0] == "openai/gpt-5.2"
+
+    monkeypatch.setattr(server, "_rate_limits", {"openrouter": server.RateLimit(rpm=60)})
+    server._throttles_for("openrouter/openai/gpt-5.2")[0].requests.tokens = 0
+    assert (await _routed())[0] == "openai/gpt-5.2"
+
+    monkeypatch.setattr(server, "_rate_limits", {})
+    monkeypatch.setattr(server, "_provider_errors", {"openrouter": "down"})
+    assert (await _routed())[0] == "openai/gpt-5.2"
+    monkeypatch.setattr(server, "_provider_errors", {"openai": "down"})
+    assert (await _routed())[0] == "openrouter/openai/gpt-5.2"
+
+
+@pytest.mark.anyio
+async def test_routing_prefers_race_winners_until_latency_is_measured(monkeypatch):
+    """Without enough recorded calls, the route that has won more races goes first."""
+    _setup_two_routes(monkeypatch)
+    monkeypatch.setattr(server, "_rate_limits", {})
+    monkeypatch.setattr(server, "_annotations", {
+        "openrouter/openai/gpt-5.2": {"usage": {"race_wins": 2}},
+    })
+    assert await server._choose_route("openai/gpt-5.2", []) == "openrouter/openai/gpt-5.2"
+
+    server._annotations["openai/gpt-5.2"] = {"usage": {"race_wins": 3}}
+    assert await server._choose_route("openai/gpt-5.2", []) == "openai/gpt-5.2"
+
+    server._annotations["openrouter/openai/gpt-5.2"]["usage"]["latencies"] = [9.0, 9.0, 9.0]
+    server._annotations["openai/gpt-5.2"]["usage"]["race_wins"] = 0
+    assert await server._choose_route("openai/gpt-5.2", []) == "openrouter/openai/gpt-5.2"
+
+
+@pytest.mark.anyio
+async def test_routing_enabled_by_default_routes_only_the_primary(
+    monkeypatch, llm_response
+):
+    """With PROVIDER_ROUTING on, completion routes its primary request but
+    race contenders keep the provider they name."""
+    import litellm
+
+    _setup_two_routes(monkeypatch)
+    monkeypatch.setattr(server, "_annotations", {
+        "openrouter/openai/gpt-5.2": {"usage": {"latencies": [1.0, 1.0, 1.0]}},
+    })
+    monkeypatch.setattr(server, "_provider_routing", True)
+    monkeypatch.setattr(server, "_response_cache", None)
+    called = []
+
+    async def _fake_acompletion(**kw):
+        called.append(kw["model"])
+        return llm_response("ok")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    await server.completion(model="openai/gpt-5.2", prompt="hi")
+    assert called == ["openrouter/openai/gpt-5.2"]
+    await server.completion(model="openai/gpt-5.2", prompt="hi again", route=False)
+    assert called[-1] == "openai/gpt-5.2"
+
+
+def test_adaptive_timeout_from_recorded_latency(monkeypatch):
+    """p99 × factor, clamped per call kind; defaults until enough samples."""
+    monkeypatch.setattr(server, "_annotations", {})
+    assert server._adaptive_timeout("openai/gpt-5.2", "completion") == 60.0
+
+    server._annotations["openai/gpt-5.2"] = {"usage": {"latencies": [2.0] * 9 + [12.0]}}
+    assert server._adaptive_timeout("openai/gpt-5.2", "completion") == 24.0
+
+    server._annotations["openai/gpt-5.2"]["usage"]["latencies"] = [1.0] * 10
+    assert server._adaptive_timeout("openai/gpt-5.2", "completion") == 15.0  # floor
+
+    server._annotations["openai/o3-pro"] = {"usage": {"latencies": [500.0] * 10}}
+    assert server._adaptive_timeout("openai/o3-pro", "completion") == 600.0  # ceiling
+    assert server._adaptive_timeout("openai/o3-pro", "research") == 1000.0
+
+    assert server._adaptive_timeout("openai/o3-pro", "completion", 900) == 900
+    with pytest.raises(ValueError, match="positive"):
+        server._adaptive_timeout("openai/o3-pro", "completion", 0)
+
+
+@pytest.mark.anyio
+async def test_completion_uses_adaptive_timeout_unless_overridden(
+    monkeypatch, llm_response
+):
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+    server._annotations["openai/gpt-5.2"] = {"usage": {"latencies": [10.0] * 5}}
+    timeouts = []
+
+    async def _fake_acompletion(**kw):
+        timeouts.append(kw["timeout"])
+        return llm_response()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    await server.completion(model="openai/gpt-5.2", prompt="hi")
+    await server.completion(model="openai/gpt-5.2", prompt="hi", timeout=5)
+    assert timeouts == [20.0, 5]
+
+
+@pytest.mark.anyio
+async def test_identical_in_flight_completions_are_coalesced(monkeypatch, llm_response):
+    """Concurrent identical requests share one model call; others don't."""
+    import anyio
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_response_cache", None)
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["messages"][-1]["content"])
+        await anyio.sleep(0.05)
+        return llm_response(f"answer to {kw['messages'][-1]['content']}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    results = []
+
+    async def _ask(prompt, **options):
+        results.append(await server.completion(model="openai/gpt-5.2", prompt=prompt, **options))
+
+    async with anyio.create_task_group() as tg:
+        for prompt in ["same", "same", "same", "other"]:
+            tg.start_soon(_ask, prompt)
+        # Same prompt, different call semantics: not attached to the others
+        tg.start_soon(functools.partial(_ask, "same", timeout=5))
+        tg.start_soon(functools.partial(_ask, "same", cache=False))
+
+    assert sorted(calls) == ["other", "same", "same", "same"]
+    assert sorted(results) == ["answer to other"] + ["answer to same"] * 5
+    assert server._in_flight == {}
+
+
+@pytest.mark.anyio
+async def test_coalesced_followers_share_errors_and_survive_leader_cancel():
+    import anyio
+
+    async def _fail():
+        await anyio.sleep(0.05)
+        raise RuntimeError("provider down")
+
+    async def _follow(results, call):
+        try:
+            results.append(await server._coalesced("k", call))
+        except RuntimeError as exc:
+            results.append(str(exc))
+
+    results = []
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_follow, results, _fail)
+        tg.start_soon(_follow, results, _fail)
+    assert results == ["provider down", "provider down"]
+
+    calls = 0
+
+    async def _slow():
+        nonlocal calls
+        calls += 1
+        await anyio.sleep(0.05)
+        return f"call {calls}"
+
+    async with anyio.create_task_group() as tg:
+        leader = anyio.CancelScope()
+
+        async def _lead():
+            with leader:
+                await server._coalesced("k", _slow)
+
+        tg.start_soon(_lead)
+        await anyio.sleep(0.01)
+        tg.start_soon(_follow, results, _slow)
+        await anyio.sleep(0.01)
+        leader.cancel()
+
+    assert results[-1] == "call 2"
+
+
+@pytest.mark.anyio
+async def test_context_preflight_rejects_or_switches_before_calling(
+    monkeypatch, llm_response
+):
+    """A prompt over the known context window fails fast with alternatives,
+    or moves to a larger-context sibling with fit_context."""
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-4o", "openai/gpt-5.2", "openai/gpt-5.2-mini"])
+    server._annotations.update({
+        "openai/gpt-4o": {"metadata": {"context_length": 100}},
+        "openai/gpt-5.2": {"metadata": {"context_length": 400_000}},
+        "openai/gpt-5.2-mini": {"metadata": {"context_length": 50}},
+    })
+    monkeypatch.setattr(server, "_estimate_tokens", lambda model, messages: 5_000)
+    long = "word " * 100
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["model"])
+        return llm_response(kw["model"])
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    with pytest.raises(ValueError) as exc:
+        await server.completion(model="openai/gpt-4o", prompt=long)
+    msg = str(exc.value)
+    assert "~5,000 tokens" in msg and "100-token context window" in msg
+    assert "Models that fit: openai/gpt-5.2." in msg
+    assert calls == []
+
+    result = await server.completion(model="openai/gpt-4o", prompt=long, fit_context=True)
+    assert result == "openai/gpt-5.2"
+
+    server._annotations["openai/gpt-5.2"]["metadata"]["context_length"] = 1_000
+    with pytest.raises(ValueError, match="Shorten the prompt"):
+        await server.completion(model="openai/gpt-4o", prompt=long, fit_context=True)
+
+
+def test_larger_context_models_are_rated_chat_models_first(monkeypatch):
+    """fit_context never switches a chat prompt to a realtime, speech,
+    image or responses-only sibling; rated models rank before unrated ones."""
+    _setup_catalog(monkeypatch, [
+        "openai/gpt-4o", "openai/gpt-4o-realtime-preview", "openai/tts-1-hd",
+        "openai/gpt-5-codex", "openai/gpt-image-1", "openai/aaa-unrated", "openai/gpt-5.2",
+    ])
+    for model_id in server._catalog["openai"]:
+        server._annotations[model_id] = {"metadata": {"context_length": 400_000}}
+    server._annotations["openai/gpt-4o"]["metadata"]["context_length"] = 100
+    server._annotations["openai/gpt-5.2"]["metadata"]["arena_elo"] = 1480
+
+    assert server._larger_context_models("openai/gpt-4o", 5_000) == [
+        "openai/gpt-5.2", "openai/aaa-unrated",
+    ]
+
+
+@pytest.mark.anyio
+async def test_context_preflight_reserves_room_for_the_response(monkeypatch):
+    """A prompt that only just fits the window is rejected: the response
+    needs room too."""
+    _setup_catalog(monkeypatch, ["openai/gpt-4o"])
+    server._annotations.update({
+        "openai/gpt-4o": {"metadata": {"context_length": 10_000}},
+    })
+    reserve = server._output_reserve("openai/gpt-4o")
+    assert 0 < reserve <= 2_500
+    messages = [{"role": "user", "content": "word " * 3_000}]
+
+    monkeypatch.setattr(server, "_estimate_tokens", lambda model, messages: 10_000 - reserve)
+    assert await server._preflight_context("openai/gpt-4o", messages, fit=False) == "openai/gpt-4o"
+
+    monkeypatch.setattr(server, "_estimate_tokens", lambda model, messages: 9_999)
+    with pytest.raises(ValueError, match="kept for the response"):
+        await server._preflight_context("openai/gpt-4o", messages, fit=False)
+
+
+@pytest.mark.anyio
+async def test_prompt_is_tokenised_at_most_once_and_off_the_event_loop(
+    monkeypatch, llm_response
+):
+    """Prompts whose byte count fits skip tokenising; larger ones are counted
+    once in a worker thread and the count is shared with rate limiting."""
+    import threading
+
+    import litellm
+
+    _setup_catalog(monkeypatch, ["openai/gpt-4o"])
+    server._annotations["openai/gpt-4o"] = {"metadata": {"context_length": 10_000}}
+    monkeypatch.setattr(server, "_rate_limits", {"openai": server.RateLimit(tpm=1_000_000)})
+    monkeypatch.setattr(server, "_response_cache", None)
+    server._count_text_tokens.cache_clear()
+    counted = []
+
+    def _token_counter(model, messages):
+        counted.append(threading.current_thread() is threading.main_thread())
+        return 3_000
+
+    async def _fake_acompletion(**kw):
+        return llm_response("ok")
+
+    monkeypatch.setattr(litellm, "token_counter", _token_counter)
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    full_model, _ = await server._prepare_completion("openai/gpt-4o", "hi", None, None)
+    assert full_model == "openai/gpt-4o" and counted == []
+
+    await server.completion(model="openai/gpt-4o", prompt="word " * 3_000)
+    assert counted == [False]
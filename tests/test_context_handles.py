@@ -0,0 +1,75 @@
+"""Tests for reusable context handles and provider prompt caching."""
+
+from collections import OrderedDict
+
+import pytest
+
+import ask_another.server as server
+
+
+@pytest.fixture(autouse=True)
+def _isolated_contexts(monkeypatch):
+    monkeypatch.setattr(server, "_contexts", OrderedDict())
+
+
+@pytest.mark.anyio
+async def test_register_context_is_content_addressed(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "_attachment_roots", [tmp_path.resolve()])
+    first = await server.register_context(content="The spec.")
+    again = await server.register_context(content="The spec.", label="spec")
+    assert first == again
+    handle = first.split()[0].removeprefix("context=")
+    assert server._get_context(handle).text == "The spec."
+
+    (tmp_path / "spec.md").write_text("# Spec")
+    from_file = await server.register_context(files=[str(tmp_path / "spec.md")], content="Notes")
+    blob = server._get_context(from_file.split()[0].removeprefix("context="))
+    assert blob.text == f'<file path="{tmp_path / "spec.md"}">\n# Spec\n</file>\n\nNotes'
+
+    with pytest.raises(ValueError, match="Unknown context handle"):
+        server._get_context("ctx_missing")
+    with pytest.raises(ValueError, match="Provide content or files"):
+        await server.register_context()
+
+
+def test_contexts_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(server, "_CONTEXT_MAX_BYTES", 25)
+    a = server._register_context("a" * 10)
+    b = server._register_context("b" * 10)
+    server._get_context(a.handle)  # a is now most recent
+    c = server._register_context("c" * 10)
+    assert list(server._contexts) == [a.handle, c.handle]
+    with pytest.raises(ValueError):
+        server._get_context(b.handle)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("caching", [True, False])
+async def test_completion_sends_context_as_cacheable_prefix(
+    monkeypatch, caching, llm_response, provider_catalog
+):
+    import litellm
+
+    provider_catalog({"anthropic": "sk-ant"}, ["anthropic/claude-sonnet-4-5"])
+    monkeypatch.setattr(server, "_response_cache", None)
+    monkeypatch.setattr(server, "_supports_prompt_caching", lambda model: caching)
+    sent = []
+
+    async def _fake_acompletion(**kw):
+        sent.append(kw["messages"])
+        return llm_response()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    handle = server._register_context("Long shared document").handle
+
+    await server.completion(
+        model="anthropic/claude-sonnet-4-5", prompt="Summarise", system="Be brief",
+        context=handle,
+    )
+
+    system, user = sent[0]
+    context_block, system_block = system["content"]
+    assert context_block["text"] == "Long shared document"
+    assert ("cache_control" in context_block) is caching
+    assert system_block == {"type": "text", "text": "Be brief"}
+    assert user == {"role": "user", "content": "Summarise"}
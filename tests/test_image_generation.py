@@ -4,7 +4,9 @@ import base64
 import os
 from pathlib import Path
 from types import SimpleNamespace
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
 
 import ask_another.server as server
 
@@ -113,7 +115,8 @@ def test_save_image_creates_directory(tmp_path: Path, monkeypatch):
 # ---------------------------------------------------------------------------
 
 
-def test_generate_image_via_image_generation(tmp_path: Path, monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_via_image_generation(tmp_path: Path, monkeypatch):
     monkeypatch.setenv("IMAGE_OUTPUT_DIR", str(tmp_path))
 
     raw_bytes = b"fake-image-bytes"
@@ -124,7 +127,7 @@ def test_generate_image_via_image_generation(tmp_path: Path, monkeypatch):
 
     with patch.object(server, "_resolve_model", return_value=("openai/gpt-image-1", "sk-test")):
         with patch("litellm.image_generation", return_value=mock_response) as mock_call:
-            result = server.generate_image(
+            result = await server.generate_image(
                 model="openai/gpt-image-1",
                 prompt="a cat on a robot",
             )
@@ -143,7 +146,8 @@ def test_generate_image_via_image_generation(tmp_path: Path, monkeypatch):
     assert "Saved to:" in result[1].text
 
 
-def test_generate_image_with_revised_prompt(tmp_path: Path, monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_with_revised_prompt(tmp_path: Path, monkeypatch):
     monkeypatch.setenv("IMAGE_OUTPUT_DIR", str(tmp_path))
 
     raw_b64 = base64.b64encode(b"data").decode()
@@ -152,7 +156,7 @@ def test_generate_image_with_revised_prompt(tmp_path: Path, monkeypatch):
 
     with patch.object(server, "_resolve_model", return_value=("openai/gpt-image-1", "sk-test")):
         with patch("litellm.image_generation", return_value=mock_response):
-            result = server.generate_image(
+            result = await server.generate_image(
                 model="openai/gpt-image-1",
                 prompt="cat",
             )
@@ -164,7 +168,8 @@ def test_generate_image_with_revised_prompt(tmp_path: Path, monkeypatch):
     assert result[2].type == "text"
 
 
-def test_generate_image_passes_size_and_quality(tmp_path: Path, monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_passes_size_and_quality(tmp_path: Path, monkeypatch):
     monkeypatch.setenv("IMAGE_OUTPUT_DIR", str(tmp_path))
 
     raw_b64 = base64.b64encode(b"data").decode()
@@ -173,7 +178,7 @@ def test_generate_image_passes_size_and_quality(tmp_path: Path, monkeypatch):
 
     with patch.object(server, "_resolve_model", return_value=("openai/gpt-image-1", "sk-test")):
         with patch("litellm.image_generation", return_value=mock_response) as mock_call:
-            server.generate_image(
+            await server.generate_image(
                 model="openai/gpt-image-1",
                 prompt="cat",
                 size="1536x1024",
@@ -190,7 +195,8 @@ def test_generate_image_passes_size_and_quality(tmp_path: Path, monkeypatch):
 # ---------------------------------------------------------------------------
 
 
-def test_generate_image_via_completion(tmp_path: Path, monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_via_completion(tmp_path: Path, monkeypatch):
     monkeypatch.setenv("IMAGE_OUTPUT_DIR", str(tmp_path))
 
     raw_bytes = b"fake-image-bytes"
@@ -205,8 +211,8 @@ def test_generate_image_via_completion(tmp_path: Path, monkeypatch):
     mock_response = SimpleNamespace(choices=[mock_choice])
 
     with patch.object(server, "_resolve_model", return_value=("gemini/gemini-2.5-flash-image", "gk-test")):
-        with patch("litellm.completion", return_value=mock_response) as mock_call:
-            result = server.generate_image(
+        with patch("litellm.acompletion", new_callable=AsyncMock, return_value=mock_response) as mock_call:
+            result = await server.generate_image(
                 model="gemini/gemini-2.5-flash-image",
                 prompt="a sunset diagram",
             )
@@ -225,15 +231,16 @@ def test_generate_image_via_completion(tmp_path: Path, monkeypatch):
     assert "Saved to:" in result[2].text
 
 
-def test_generate_image_completion_no_images(monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_completion_no_images(monkeypatch):
     mock_message = SimpleNamespace(content="Sorry, I cannot generate images.", images=[])
     mock_choice = SimpleNamespace(message=mock_message)
     mock_response = SimpleNamespace(choices=[mock_choice])
 
     with patch.object(server, "_resolve_model", return_value=("gemini/gemini-2.5-flash-image", "gk-test")):
-        with patch("litellm.completion", return_value=mock_response):
+        with patch("litellm.acompletion", new_callable=AsyncMock, return_value=mock_response):
             try:
-                server.generate_image(
+                await server.generate_image(
                     model="gemini/gemini-2.5-flash-image",
                     prompt="test",
                 )
@@ -341,14 +348,15 @@ def test_open_image_externally_swallows_errors(tmp_path, monkeypatch):
     assert result is False
 
 
-def test_generate_image_completion_no_choices(monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_completion_no_choices(monkeypatch):
     """Empty choices list (e.g. safety filter) raises ValueError, not IndexError."""
     mock_response = SimpleNamespace(choices=[])
 
     with patch.object(server, "_resolve_model", return_value=("gemini/gemini-2.5-flash-image", "gk-test")):
-        with patch("litellm.completion", return_value=mock_response):
+        with patch("litellm.acompletion", new_callable=AsyncMock, return_value=mock_response):
             try:
-                server.generate_image(
+                await server.generate_image(
                     model="gemini/gemini-2.5-flash-image",
                     prompt="test",
                 )
@@ -0,0 +1,128 @@
+"""Tests for the map_reduce tool and chunking."""
+
+import anyio
+import pytest
+
+import ask_another.server as server
+
+
+@pytest.fixture
+def routed(provider_catalog):
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2", "openai/gpt-5.2-mini"])
+
+
+def _paragraphs(n):
+    return "\n\n".join(f"Paragraph {i} " + "word " * 25 for i in range(n))
+
+
+def test_split_chunks_respects_budget_and_paragraphs():
+    chunks = server._split_chunks("openai/gpt-5.2", _paragraphs(6), 100)
+    assert len(chunks) == 3
+    assert chunks[0].startswith("Paragraph 0") and "Paragraph 1" in chunks[0]
+    assert all(server._text_tokens("openai/gpt-5.2", c) <= 100 for c in chunks)
+
+
+def test_split_chunks_breaks_oversized_paragraphs():
+    chunks = server._split_chunks("openai/gpt-5.2", "x" * 2000, 100)
+    assert len(chunks) == 5
+    assert "".join(chunks) == "x" * 2000
+
+
+@pytest.mark.parametrize(
+    "text", ["漢字仮名交じり文" * 800, "aGVsbG8/+=" * 800], ids=["cjk", "base64"]
+)
+def test_split_chunks_cuts_dense_text_within_budget(text):
+    """Text denser than ~4 characters per token is sliced finer, not
+    re-split forever."""
+    chunks = server._split_chunks("openai/gpt-5.2", text, 100)
+    assert "".join(chunks) == text
+    assert all(server._text_tokens("openai/gpt-5.2", c) <= 100 for c in chunks)
+
+
+def test_chunk_budget_follows_context_length(monkeypatch):
+    monkeypatch.setattr(
+        server, "_annotations", {"openai/gpt-5.2": {"metadata": {"context_length": 40_000}}}
+    )
+    assert server._chunk_budget("openai/gpt-5.2", None) == 10_000
+    assert server._chunk_budget("openai/other", None) == server._DEFAULT_CHUNK_TOKENS
+    assert server._chunk_budget("openai/gpt-5.2", 500) == 500
+    with pytest.raises(ValueError):
+        server._chunk_budget("openai/gpt-5.2", 10)
+
+
+@pytest.mark.anyio
+async def test_map_reduce_maps_concurrently_then_reduces(monkeypatch, routed, llm_response):
+    """Map calls overlap in time; the reduce call sees every partial in order."""
+    import litellm
+
+    in_flight = peak = 0
+    reduce_prompts = []
+
+    async def _fake_acompletion(**kw):
+        nonlocal in_flight, peak
+        prompt = kw["messages"][-1]["content"]
+        if prompt.startswith("Merge"):
+            reduce_prompts.append((kw["model"], prompt))
+            return llm_response("merged")
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await anyio.sleep(0.05)
+        in_flight -= 1
+        index = prompt.split('index="')[1].split('"')[0]
+        return llm_response(f"summary {index}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    result = await server.map_reduce(
+        model="openai/gpt-5.2", map_prompt="Summarise", reduce_prompt="Merge",
+        content=_paragraphs(6), chunk_tokens=100, reduce_model="openai/gpt-5.2-mini",
+    )
+
+    assert result.startswith("merged\n\n---\nMap: 3 chunks of ≤100 tokens")
+    assert "- chunk 3 — ok" in result
+    assert "Reduce: openai/gpt-5.2-mini" in result
+    assert peak == 3
+    model, prompt = reduce_prompts[0]
+    assert model == "openai/gpt-5.2-mini"
+    assert prompt.index("summary 1") < prompt.index("summary 2") < prompt.index("summary 3")
+
+
+@pytest.mark.anyio
+async def test_map_reduce_reduces_despite_failed_chunks(monkeypatch, routed, llm_response):
+    import litellm
+
+    async def _fake_acompletion(**kw):
+        prompt = kw["messages"][-1]["content"]
+        if 'index="2"' in prompt:
+            raise ValueError("bad chunk")
+        return llm_response("partial" if "<chunk" in prompt else "merged")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    result = await server.map_reduce(
+        model="openai/gpt-5.2", map_prompt="Summarise", reduce_prompt="Merge",
+        content=_paragraphs(6), chunk_tokens=100,
+    )
+
+    assert result.startswith("merged")
+    assert "2 ok" in result
+    assert "- chunk 2 — error" in result and "bad chunk" in result
+
+
+@pytest.mark.anyio
+async def test_map_reduce_rejects_unknown_reduce_model_before_mapping(monkeypatch, routed):
+    import litellm
+
+    calls = []
+
+    async def _fake_acompletion(**kw):
+        calls.append(kw["model"])
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    with pytest.raises(ValueError, match="gpt-5.2-mimi"):
+        await server.map_reduce(
+            model="openai/gpt-5.2", map_prompt="Summarise", reduce_prompt="Merge",
+            content=_paragraphs(6), chunk_tokens=100, reduce_model="openai/gpt-5.2-mimi",
+        )
+    assert calls == []
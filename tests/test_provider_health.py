@@ -110,7 +110,8 @@ def test_build_instructions_shows_unavailable_providers(monkeypatch):
     assert "gemini: Google API key is required" in instructions
 
 
-def test_search_models_retries_unhealthy_provider(monkeypatch):
+@pytest.mark.anyio
+async def test_search_models_retries_unhealthy_provider(monkeypatch):
     """Searching for an unhealthy provider triggers a retry."""
     monkeypatch.setattr(server, "_provider_registry", {"gemini": "fixed-key"})
     monkeypatch.setattr(server, "_provider_errors", {
@@ -125,12 +126,13 @@ def test_search_models_retries_unhealthy_provider(monkeypatch):
     monkeypatch.setattr(
         server, "_fetch_models", lambda p, k, zdr=False: ["gemini/gemini-3.1-pro"]
     )
-    result = server.search_models(search="gemini")
+    result = await server.search_models(search="gemini")
     assert "gemini/gemini-3.1-pro" in result
     assert server._provider_errors.get("gemini") is None
 
 
-def test_search_models_shows_error_on_retry_failure(monkeypatch):
+@pytest.mark.anyio
+async def test_search_models_shows_error_on_retry_failure(monkeypatch):
     """If retry still fails, error message is shown in results."""
     monkeypatch.setattr(server, "_provider_registry", {"gemini": "bad-key"})
     monkeypatch.setattr(server, "_provider_errors", {
@@ -145,7 +147,7 @@ def test_search_models_shows_error_on_retry_failure(monkeypatch):
         raise Exception("Still broken")
 
     monkeypatch.setattr(server, "_fetch_models", _fail)
-    result = server.search_models(search="gemini")
+    result = await server.search_models(search="gemini")
     assert "gemini" in result
     assert "Still broken" in result
 
@@ -194,7 +196,8 @@ def test_full_flow_healthy_and_unhealthy(monkeypatch):
     assert "gemini: API key invalid" in instructions
 
 
-def test_generate_image_auth_error_marks_provider_unhealthy(monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_auth_error_marks_provider_unhealthy(monkeypatch):
     """An auth error during image generation marks the provider unhealthy."""
     monkeypatch.setattr(server, "_provider_registry", {"openai": "bad-key"})
     monkeypatch.setattr(server, "_provider_errors", {"openai": None})
@@ -225,13 +228,14 @@ def test_generate_image_auth_error_marks_provider_unhealthy(monkeypatch):
     monkeypatch.setattr(litellm, "image_generation", _fail_auth)
 
     with pytest.raises(AuthenticationError):
-        server.generate_image(model="openai/gpt-image-1", prompt="a cat")
+        await server.generate_image(model="openai/gpt-image-1", prompt="a cat")
 
     assert server._provider_errors["openai"] is not None
     assert "Authentication" in server._provider_errors["openai"]
 
 
-def test_generate_image_native_auth_error_marks_provider_unhealthy(monkeypatch):
+@pytest.mark.anyio
+async def test_generate_image_native_auth_error_marks_provider_unhealthy(monkeypatch):
     """An auth error on the native image model completion path marks provider unhealthy."""
     monkeypatch.setattr(server, "_provider_registry", {"gemini": "bad-key"})
     monkeypatch.setattr(server, "_provider_errors", {"gemini": None})
@@ -252,17 +256,17 @@ def test_generate_image_native_auth_error_marks_provider_unhealthy(monkeypatch):
 
     import litellm
 
-    def _fail_auth(**kwargs):
+    async def _fail_auth(**kwargs):
         raise AuthenticationError(
             message="API key invalid",
             llm_provider="gemini",
             model="gemini/gemini-2.5-flash-image",
         )
 
-    monkeypatch.setattr(litellm, "completion", _fail_auth)
+    monkeypatch.setattr(litellm, "acompletion", _fail_auth)
 
     with pytest.raises(AuthenticationError):
-        server.generate_image(model="gemini/gemini-2.5-flash-image", prompt="a cat")
+        await server.generate_image(model="gemini/gemini-2.5-flash-image", prompt="a cat")
 
     assert server._provider_errors["gemini"] is not None
     assert "Authentication" in server._provider_errors["gemini"]
@@ -329,7 +333,8 @@ def test_gemini_research_auth_error_marks_provider_unhealthy(monkeypatch):
     assert "Authentication" in server._provider_errors["gemini"]
 
 
-def test_completion_auth_error_marks_provider_unhealthy(monkeypatch):
+@pytest.mark.anyio
+async def test_completion_auth_error_marks_provider_unhealthy(monkeypatch):
     """An auth error during completion marks the provider unhealthy."""
     monkeypatch.setattr(server, "_provider_registry", {"openrouter": "bad-key"})
     monkeypatch.setattr(server, "_provider_errors", {"openrouter": None})
@@ -343,31 +348,31 @@ def test_completion_auth_error_marks_provider_unhealthy(monkeypatch):
         server, "_resolve_model",
         lambda m: ("openrouter/deepseek/deepseek-v3.2", "bad-key"),
     )
-    monkeypatch.setattr(
-        server, "_get_models",
-        lambda provider=None, *, zdr=None: ["openrouter/deepseek/deepseek-v3.2"],
-    )
+    monkeypatch.setattr(server, "_catalog", {
+        "openrouter": {"openrouter/deepseek/deepseek-v3.2"},
+    })
 
     import litellm
 
-    def _fail_auth(**kwargs):
+    async def _fail_auth(**kwargs):
         raise AuthenticationError(
             message="Missing Authentication header",
             llm_provider="openrouter",
             model="openrouter/deepseek/deepseek-v3.2",
         )
 
-    monkeypatch.setattr(litellm, "completion", _fail_auth)
+    monkeypatch.setattr(litellm, "acompletion", _fail_auth)
 
     with pytest.raises(AuthenticationError):
-        server.completion(model="openrouter/deepseek/deepseek-v3.2", prompt="hi")
+        await server.completion(model="openrouter/deepseek/deepseek-v3.2", prompt="hi")
 
     assert server._provider_errors["openrouter"] is not None
     assert "Authentication" in server._provider_errors["openrouter"]
     assert "openrouter" in server._provider_auth_errors
 
 
-def test_auth_error_prevents_retry_on_search(monkeypatch):
+@pytest.mark.anyio
+async def test_auth_error_prevents_retry_on_search(monkeypatch):
     """A provider marked with an auth error is not retried by search discovery."""
     monkeypatch.setattr(server, "_provider_registry", {"openrouter": "bad-key"})
     monkeypatch.setattr(server, "_provider_errors", {
@@ -385,7 +390,7 @@ def test_auth_error_prevents_retry_on_search(monkeypatch):
 
     monkeypatch.setattr(server, "_fetch_models", _should_not_be_called)
 
-    result = server.search_models(search="openrouter")
+    result = await server.search_models(search="openrouter")
     assert "openrouter" in result
     assert "unavailable" in result.lower()
     assert server._provider_errors["openrouter"] is not None
@@ -0,0 +1,76 @@
+"""Tests for client-side rate limiting of model calls."""
+
+import anyio
+import pytest
+
+import ask_another.server as server
+from ask_another.server import RateLimit, TokenBucket
+
+
+def test_parse_rate_limits():
+    limits = server._parse_rate_limits(
+        "openai:rpm=500,tpm=200000; openrouter/meta/llama-4:free:concurrent=2"
+    )
+    assert limits == {
+        "openai": RateLimit(rpm=500, tpm=200000),
+        "openrouter/meta/llama-4:free": RateLimit(concurrent=2),
+    }
+    assert server._parse_rate_limits("") == {}
+    for bad in ["openai", "openai:rpm=fast", "openai:burst=5"]:
+        with pytest.raises(ValueError, match="RATE_LIMITS"):
+            server._parse_rate_limits(bad)
+
+
+@pytest.mark.anyio
+async def test_token_bucket_queues_waiters_in_arrival_order():
+    """An empty bucket makes callers wait for refill, first come first served."""
+    bucket = TokenBucket(per_minute=600)  # 10 tokens/second
+    bucket.tokens = 0
+    order = []
+
+    async def _take(name, amount):
+        await bucket.acquire(amount)
+        order.append(name)
+
+    started = anyio.current_time()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_take, "big", 3)
+        await anyio.sleep(0.01)
+        tg.start_soon(_take, "small", 1)
+
+    assert order == ["big", "small"]
+    assert anyio.current_time() - started >= 0.35
+
+
+@pytest.mark.anyio
+async def test_concurrency_cap_queues_completions_and_records_wait(
+    monkeypatch, llm_response, provider_catalog
+):
+    """With concurrent=1 the second call queues behind the first; the wait
+    is recorded in usage instead of the call failing."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_rate_limits", {"openai": RateLimit(concurrent=1)})
+    monkeypatch.setattr(server, "_throttles", {})
+    in_flight = 0
+    peak = 0
+
+    async def _fake_acompletion(**kw):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await anyio.sleep(0.1)
+        in_flight -= 1
+        return llm_response()
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    async with anyio.create_task_group() as tg:
+        for i in range(2):
+            tg.start_soon(lambda i=i: server.completion(model="openai/gpt-5.2", prompt=f"hi {i}"))
+
+    assert peak == 1
+    usage = server._annotations["openai/gpt-5.2"]["usage"]
+    assert usage["queued_count"] == 2
+    assert usage["queue_wait_ms"] >= 40  # mean of ~0ms and ~100ms
@@ -0,0 +1,105 @@
+"""Tests for the background refresh scheduler and refresh_models tool."""
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import anyio
+import pytest
+
+import ask_another.server as server
+
+
+def _ctx(scheduler):
+    """Minimal stand-in for the FastMCP Context a tool receives."""
+    return SimpleNamespace(
+        request_context=SimpleNamespace(lifespan_context={"refresh_scheduler": scheduler})
+    )
+
+
+def test_due_sources_uses_per_source_cadence(monkeypatch):
+    """Each source becomes due when its own interval elapses."""
+    monkeypatch.setattr(server, "_cache_ttl_minutes", 10)
+    monkeypatch.setattr(server, "_enrichment_ttl_minutes", 60)
+    scheduler = server.RefreshScheduler(task_group=None)  # type: ignore[arg-type]
+    scheduler.mark_fresh(server._REFRESH_SOURCES)
+    now = scheduler._last_run["providers"]
+
+    assert scheduler.due_sources(now + 60) == []
+    assert scheduler.due_sources(now + 11 * 60) == ["providers"]
+    assert scheduler.due_sources(now + 61 * 60) == ["providers", "enrichment"]
+
+
+@pytest.mark.anyio
+async def test_trigger_runs_sources_in_order_and_coalesces(monkeypatch):
+    """A trigger runs sources in the background; a second trigger while
+    running returns the in-flight run instead of starting another."""
+    calls = []
+    release = anyio.Event()
+
+    def _fake_source(source):
+        calls.append(source)
+        anyio.from_thread.run(release.wait)
+
+    monkeypatch.setattr(server, "_refresh_source", _fake_source)
+
+    async with anyio.create_task_group() as tg:
+        scheduler = server.RefreshScheduler(tg)
+        run = scheduler.trigger(server._REFRESH_SOURCES, "manual")
+        assert scheduler.trigger(["enrichment"], "manual") is run
+        assert scheduler.due_sources() == []
+        release.set()
+
+    assert run.status == "completed"
+    assert calls == ["providers", "enrichment"]
+    assert scheduler.due_sources() == []
+
+
+@pytest.mark.anyio
+async def test_refresh_models_returns_handle_and_status(monkeypatch):
+    """refresh_models returns immediately with a refresh_id that can be polled."""
+    monkeypatch.setattr(server, "_refresh_source", lambda source: None)
+    monkeypatch.setattr(server, "_model_cache", {"openai": (["openai/gpt-5.2"], 0)})
+    monkeypatch.setattr(server, "_provider_registry", {"openai": "sk-test"})
+
+    async with anyio.create_task_group() as tg:
+        scheduler = server.RefreshScheduler(tg)
+        result = await server.refresh_models(ctx=_ctx(scheduler))
+        assert "refresh_id=1" in result
+
+    monkeypatch.setattr(server, "_response_cache", None)
+    status = await server.refresh_models(refresh_id=1, ctx=_ctx(scheduler))
+    assert "Refresh 1 completed" in status
+    assert "Response cache" not in status
+    assert "1 models across 1 providers" in status
+    assert "No refresh found" in await server.refresh_models(refresh_id=9, ctx=_ctx(scheduler))
+
+    cache = server.ResponseCache(Path("/nonexistent"), 60, 1000)
+    cache.hits, cache.misses = 3, 1
+    monkeypatch.setattr(server, "_response_cache", cache)
+    status = await server.refresh_models(refresh_id=1, ctx=_ctx(scheduler))
+    assert "Response cache: 3 hits, 1 misses (75% hit rate)" in status
+
+
+@pytest.mark.anyio
+async def test_refresh_models_reports_cancelled_and_overlapping_runs(monkeypatch):
+    """A cancelled run isn't reported as completed, and a manual refresh that
+    overlaps a running one names the run still covering each source."""
+    release = anyio.Event()
+
+    def _slow_source(source):
+        anyio.from_thread.run(release.wait)
+
+    monkeypatch.setattr(server, "_refresh_source", _slow_source)
+
+    async with anyio.create_task_group() as tg:
+        scheduler = server.RefreshScheduler(tg)
+        first = scheduler.trigger(["providers"], "scheduled")
+        result = await server.refresh_models(ctx=_ctx(scheduler))
+        assert "Refresh of enrichment running" in result
+        assert f"providers was already refreshing under refresh_id={first.refresh_id}" in result
+        await anyio.sleep(0.05)
+        scheduler.stop()
+        release.set()
+
+    status = await server.refresh_models(refresh_id=first.refresh_id, ctx=_ctx(scheduler))
+    assert f"Refresh {first.refresh_id} was cancelled" in status
@@ -0,0 +1,142 @@
+"""Tests for the on-disk completion response cache."""
+
+import os
+
+import pytest
+
+import ask_another.server as server
+from ask_another.server import ResponseCache
+
+
+def test_get_put_counts_hits_and_misses(tmp_path):
+    cache = ResponseCache(tmp_path / "cache", ttl_seconds=60, max_bytes=1_000_000)
+    messages = [{"role": "user", "content": "hi"}]
+    key = server._request_key("openai/gpt-5.2", messages, 0)
+
+    assert cache.get(key) is None
+    cache.put(key, "openai/gpt-5.2", "hello")
+    assert cache.get(key) == "hello"
+    assert server._request_key("openai/gpt-5.2", messages, 0.5) != key
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "50% hit rate" in cache.stats()
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path, ttl_seconds=60, max_bytes=1_000_000)
+    cache.put("k", "openai/gpt-5.2", "stale soon")
+    now = server.time.time()
+    monkeypatch.setattr(server.time, "time", lambda: now + 61)
+
+    assert cache.get("k") is None
+    assert not (tmp_path / "k.json").exists()
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_seconds=60, max_bytes=1_000_000)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, "m", "x" * 100)
+        os.utime(tmp_path / f"{key}.json", (1000 + i, 1000 + i))
+    cache.get("a")  # touched: now the most recently used
+
+    entry_size = (tmp_path / "b.json").stat().st_size
+    cache.max_bytes = entry_size * 3 + 10  # entry sizes vary by a few bytes
+    cache.put("d", "m", "x" * 100)
+
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["a", "c", "d"]
+    assert cache.evictions == 1
+
+
+@pytest.mark.anyio
+async def test_completion_caches_deterministic_requests_only(
+    monkeypatch, tmp_path, llm_response, provider_catalog
+):
+    """temperature=0 (or cache=True) is served from cache; default sampling
+    and cache=False always call the model."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    monkeypatch.setattr(
+        server, "_response_cache", ResponseCache(tmp_path / "cache", 60, 1_000_000)
+    )
+    calls = 0
+
+    async def _fake_acompletion(**kw):
+        nonlocal calls
+        calls += 1
+        return llm_response(f"answer {calls}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    async def _ask(**kw):
+        return await server.completion(model="openai/gpt-5.2", prompt="hi", **kw)
+
+    assert await _ask(temperature=0) == "answer 1"
+    assert await _ask(temperature=0) == "answer 1"
+    assert await _ask(temperature=0, cache=False) == "answer 2"
+    assert await _ask() == "answer 3"
+    assert await _ask() == "answer 4"
+    assert await _ask(cache=True) == "answer 5"
+    assert await _ask(cache=True) == "answer 5"
+    assert calls == 5
+    assert server._annotations["openai/gpt-5.2"]["usage"]["call_count"] == 5
+
+
+@pytest.mark.anyio
+async def test_race_answer_from_another_model_is_not_cached(
+    monkeypatch, tmp_path, llm_response, provider_catalog
+):
+    """A raced call won by an alternate must not be stored under the
+    requested model's key and served later as that model's answer."""
+    import anyio
+    import litellm
+
+    provider_catalog(
+        {"openai": "sk-test", "gemini": "sk-g"}, ["openai/gpt-5.2", "gemini/gemini-3-pro"]
+    )
+    monkeypatch.setattr(
+        server, "_response_cache", ResponseCache(tmp_path / "cache", 60, 1_000_000)
+    )
+
+    async def _fake_acompletion(**kw):
+        if kw["model"] == "openai/gpt-5.2":
+            await anyio.sleep(0.2)
+        return llm_response(f"answer from {kw['model']}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    raced = await server.completion(
+        model="openai/gpt-5.2", prompt="hi", temperature=0,
+        race=True, alternates=["gemini/gemini-3-pro"],
+    )
+    assert raced == "answer from gemini/gemini-3-pro"
+    plain = await server.completion(model="openai/gpt-5.2", prompt="hi", temperature=0)
+    assert plain == "answer from openai/gpt-5.2"
+    assert await server.completion(
+        model="openai/gpt-5.2", prompt="hi", temperature=0
+    ) == "answer from openai/gpt-5.2"
+
+
+@pytest.mark.anyio
+async def test_cache_write_failure_still_returns_answer(
+    monkeypatch, tmp_path, llm_response, provider_catalog
+):
+    """A cache directory that can't be written (full disk, read-only) is
+    logged, and the paid-for answer is still returned."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    cache = ResponseCache(tmp_path / "cache", 60, 1_000_000)
+    monkeypatch.setattr(server, "_response_cache", cache)
+
+    def _disk_full(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cache, "put", _disk_full)
+
+    async def _fake_acompletion(**kw):
+        return llm_response("paid for")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+
+    assert await server.completion(model="openai/gpt-5.2", prompt="hi", temperature=0) == "paid for"
+    assert "1 misses" in cache.stats()
@@ -0,0 +1,110 @@
+"""Tests for the shared retry policy on model calls."""
+
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import anyio
+import httpx
+import pytest
+from litellm.exceptions import (
+    APIConnectionError, AuthenticationError, RateLimitError, ServiceUnavailableError, Timeout,
+)
+
+import ask_another.server as server
+from ask_another.server import RetryPolicy
+
+
+def _rate_limited(headers=None):
+    response = httpx.Response(
+        429, headers=headers or {}, request=httpx.Request("POST", "https://api.example")
+    )
+    return RateLimitError("slow down", llm_provider="openai", model="gpt-5.2", response=response)
+
+
+def _unavailable():
+    return ServiceUnavailableError("overloaded", llm_provider="openai", model="gpt-5.2")
+
+
+def test_retry_after_header_forms():
+    assert server._retry_after(_rate_limited({"retry-after": "7"})) == 7.0
+    assert server._retry_after(_rate_limited({"retry-after-ms": "250"})) == 0.25
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = server._retry_after(_rate_limited({"retry-after": format_datetime(later)}))
+    assert delay is not None and 25 <= delay <= 30
+    assert server._retry_after(_rate_limited()) is None
+    assert server._retry_after(ValueError("no response")) is None
+
+
+def test_next_delay_classifies_and_respects_budget():
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=4.0, deadline=60)
+    auth = AuthenticationError("bad key", llm_provider="openai", model="gpt-5.2")
+
+    assert policy.next_delay(auth, 1, 0) is None
+    assert policy.next_delay(ValueError("bad request"), 1, 0) is None
+    assert 0 <= policy.next_delay(_unavailable(), 2, 0) <= 2.0  # type: ignore[operator]
+    assert policy.next_delay(_unavailable(), 3, 0) is None  # attempts exhausted
+    assert policy.next_delay(_rate_limited({"retry-after": "20"}), 1, 0) == 20.0
+    assert policy.next_delay(_rate_limited({"retry-after": "20"}), 1, 45) is None  # past deadline
+
+    # Our own timeout already spent the call's budget; a dropped connection didn't
+    assert policy.next_delay(Timeout("timed out", model="gpt-5.2", llm_provider="openai"), 1, 0) is None
+    assert policy.next_delay(TimeoutError(), 1, 0) is None
+    dropped = APIConnectionError("reset", llm_provider="openai", model="gpt-5.2")
+    assert policy.next_delay(dropped, 1, 0) is not None
+
+
+@pytest.mark.anyio
+async def test_completion_absorbs_transient_errors(monkeypatch, llm_response, provider_catalog):
+    """A 503 then a 429 with Retry-After are retried; the caller sees success."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_COMPLETION_RETRY", RetryPolicy(base_delay=0.01, deadline=5))
+    failures = [_unavailable(), _rate_limited({"retry-after": "0.1"})]
+    attempts = []
+
+    async def _fake_acompletion(**kw):
+        attempts.append(anyio.current_time())
+        if failures:
+            raise failures.pop(0)
+        return llm_response("recovered")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    result = await server.completion(model="openai/gpt-5.2", prompt="hi")
+
+    assert result == "recovered"
+    assert len(attempts) == 3
+    assert attempts[2] - attempts[1] >= 0.1  # waited as Retry-After asked
+
+
+@pytest.mark.anyio
+async def test_completion_timeout_is_not_retried(monkeypatch, provider_catalog):
+    """A call that hits its timeout fails once instead of re-running it."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_COMPLETION_RETRY", RetryPolicy(base_delay=0.01, deadline=5))
+    attempts = []
+
+    async def _fake_acompletion(**kw):
+        attempts.append(kw["timeout"])
+        raise Timeout("timed out", model="gpt-5.2", llm_provider="openai")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    with pytest.raises(Timeout):
+        await server.completion(model="openai/gpt-5.2", prompt="hi", timeout=15)
+    assert attempts == [15]
+
+
+def test_retrying_sync_gives_up_and_raises_last_error(monkeypatch):
+    """The blocking variant (research jobs) stops at max_attempts."""
+    monkeypatch.setattr(server.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def _always_unavailable():
+        calls.append(1)
+        raise _unavailable()
+
+    with pytest.raises(ServiceUnavailableError):
+        server._retrying_sync(_always_unavailable, RetryPolicy(max_attempts=3), "job")
+    assert len(calls) == 3
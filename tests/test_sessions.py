@@ -0,0 +1,127 @@
+"""Tests for server-side multi-turn sessions."""
+
+from collections import OrderedDict
+
+import pytest
+
+import ask_another.server as server
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, llm_response, provider_catalog):
+    """Route completions to a fake that records each request's messages."""
+    import litellm
+
+    provider_catalog({"openai": "sk-test"}, ["openai/gpt-5.2"])
+    monkeypatch.setattr(server, "_sessions", OrderedDict())
+    sent = []
+
+    async def _fake_acompletion(**kw):
+        sent.append(kw["messages"])
+        if kw["messages"][0]["content"] == server._SUMMARY_SYSTEM:
+            return llm_response("SUMMARY")
+        return llm_response(f"reply {len(sent)}")
+
+    monkeypatch.setattr(litellm, "acompletion", _fake_acompletion)
+    return sent
+
+
+def _session_id(result):
+    return result.split()[0].removeprefix("session_id=")
+
+
+@pytest.mark.anyio
+async def test_follow_ups_send_history_server_side(fake_llm):
+    """Each turn sends the stored history plus only the new prompt."""
+    session_id = _session_id(
+        await server.start_session(model="openai/gpt-5.2", system="Be brief")
+    )
+
+    assert await server.continue_session(session_id=session_id, prompt="Hi") == "reply 1"
+    assert await server.continue_session(session_id=session_id, prompt="And?") == "reply 2"
+
+    assert fake_llm[1] == [
+        {"role": "system", "content": "Be brief"},
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "reply 1"},
+        {"role": "user", "content": "And?"},
+    ]
+    assert "(2 turns kept)" in await server.end_session(session_id=session_id)
+    with pytest.raises(ValueError, match="Unknown session"):
+        await server.continue_session(session_id=session_id, prompt="Still there?")
+
+
+@pytest.mark.anyio
+async def test_history_over_budget_is_summarised(fake_llm, monkeypatch):
+    """The oldest turns are folded into a summary once history exceeds the budget."""
+    monkeypatch.setattr(server, "_DEFAULT_HISTORY_TOKENS", 60)
+    session_id = _session_id(await server.start_session(model="openai/gpt-5.2"))
+
+    await server.continue_session(session_id=session_id, prompt="first " * 80)
+    await server.continue_session(session_id=session_id, prompt="second")
+
+    summary_request, turn_request = fake_llm[1], fake_llm[2]
+    assert summary_request[0]["content"] == server._SUMMARY_SYSTEM
+    assert "first" in summary_request[1]["content"]
+    assert turn_request == [
+        {"role": "system", "content": "Summary of the earlier conversation:\nSUMMARY"},
+        {"role": "user", "content": "second"},
+    ]
+    ended = await server.end_session(session_id=session_id)
+    assert "(1 turn kept, 1 summarised)" in ended
+
+
+@pytest.mark.anyio
+async def test_failed_summary_drops_turns_without_counting_them(
+    fake_llm, monkeypatch, llm_response
+):
+    """Each turn is counted once, and turns only count as summarised when
+    the summary call succeeds."""
+    import litellm
+
+    monkeypatch.setattr(server, "_DEFAULT_HISTORY_TOKENS", 60)
+    session_id = _session_id(await server.start_session(model="openai/gpt-5.2"))
+    for n in range(3):
+        server._sessions[session_id].turns += [
+            {"role": "user", "content": f"q{n}"},
+            {"role": "assistant", "content": f"a{n} " * 40},
+        ]
+
+    async def _failing(**kw):
+        if kw["messages"][0]["content"] == server._SUMMARY_SYSTEM:
+            raise RuntimeError("summary model down")
+        return llm_response("reply")
+
+    counted = []
+    estimate = server._estimate_tokens
+
+    def _counting(model, messages):
+        counted.append(messages)
+        return estimate(model, messages)
+
+    monkeypatch.setattr(server, "_estimate_tokens", _counting)
+    monkeypatch.setattr(litellm, "acompletion", _failing)
+    await server.continue_session(session_id=session_id, prompt="next")
+
+    session = server._sessions[session_id]
+    assert session.turns == [{"role": "user", "content": "next"}, {"role": "assistant", "content": "reply"}]
+    assert session.summary == "" and session.summarised_turns == 0
+    history = [m for messages in counted for m in messages if m["content"].startswith(("q", "a"))]
+    assert len(history) == 6  # every stored message counted exactly once
+    assert "(1 turn kept)" in await server.end_session(session_id=session_id)
+
+
+def test_history_budget_follows_context_length(monkeypatch):
+    monkeypatch.setattr(
+        server, "_annotations", {"openai/gpt-5.2": {"metadata": {"context_length": 200_000}}}
+    )
+    assert server._history_budget("openai/gpt-5.2") == 100_000
+    assert server._history_budget("openai/unknown") == server._DEFAULT_HISTORY_TOKENS
+
+
+def test_sessions_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(server, "_sessions", OrderedDict())
+    monkeypatch.setattr(server, "_MAX_SESSIONS", 2)
+    for n in range(3):
+        server._add_session(server.Session(session_id=f"s{n}", model="openai/gpt-5.2"))
+    assert list(server._sessions) == ["s1", "s2"]